@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import os
+import pickle
+import time
+import tracemalloc
+from glob import glob
+
+from ucca import convert, evaluation, normalization, textutil
+
+desc = """Times common passage operations on the test files, scaled up by joining copies of each passage."""
+
+DEFAULT_PATTERN = os.path.join("test_files", "*.xml")
+
+
+def load_passages(pattern):
+    passages = []
+    for filename in sorted(glob(pattern)):
+        try:
+            passages.append(convert.file2passage(filename))
+        except IOError:  # Site XML or invalid file
+            try:
+                passages.append(convert.from_site(convert.ET.parse(filename).getroot()))
+            except Exception:
+                pass
+    return passages
+
+
+def scale(passages, copies):
+    return [convert.join_passages(copies * [p], passage_id="%s_x%d" % (p.ID, copies)) for p in passages]
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark_load(passages, repeat=1):
+    """Building passages from standard XML elements, as done when reading files"""
+    elems = [convert.to_standard(p) for p in passages]
+    return sum(timed(convert.from_standard, elem, repeat=repeat) for elem in elems)
+
+
+def _standard_xml_strings(passages):
+    return [convert.ET.tostring(convert.to_standard(p)).decode() for p in passages]
+
+
+def benchmark_parse(passages, repeat=1):
+    """Reading passages from standard XML text by parsing the whole tree first, as xml2passage did"""
+    return sum(timed(lambda: convert.from_standard(convert.ET.ElementTree().parse(io.StringIO(xml))), repeat=repeat)
+               for xml in _standard_xml_strings(passages))
+
+
+def benchmark_stream(passages, repeat=1):
+    """Reading passages from standard XML text by streaming, as xml2passage does"""
+    return sum(timed(lambda: list(convert.iter_standard(io.StringIO(xml))), repeat=repeat)
+               for xml in _standard_xml_strings(passages))
+
+
+def benchmark_serialize(passages, repeat=1):
+    """Writing passages as indented standard XML text by building the element tree first, as passage2file did"""
+    return sum(timed(lambda: io.StringIO().write(textutil.indent_xml(convert.ET.tostring(convert.to_standard(p)).decode())),
+                     repeat=repeat) for p in passages)
+
+
+def benchmark_write(passages, repeat=1):
+    """Writing passages as indented standard XML text directly, as passage2file does"""
+    return sum(timed(convert.write_standard, p, io.StringIO(), repeat=repeat) for p in passages)
+
+
+def benchmark_unpickle(passages, repeat=1):
+    """Reading passages from pickle bytes, as pickle2passage does"""
+    return sum(timed(pickle.loads, data, repeat=repeat) for data in map(pickle.dumps, passages))
+
+
+def benchmark_binary(passages, repeat=1):
+    """Reading passages from the compact binary format, as binary2passage does"""
+    return sum(timed(convert.from_binary, data, repeat=repeat) for data in map(convert.to_binary, passages))
+
+
+def benchmark_evaluate(passages, repeat=1):
+    """Evaluating passages against themselves for all evaluation types in one pass, as evaluate does"""
+    return sum(timed(evaluation.evaluate, p, p, normalize=False, repeat=repeat) for p in passages)
+
+
+def benchmark_evaluate_types(passages, repeat=1):
+    """Evaluating passages against themselves separately for each evaluation type, as evaluate did"""
+    return sum(timed(lambda: [evaluation.evaluate(p, p, normalize=False, eval_type=eval_type)
+                              for eval_type in evaluation.EVAL_TYPES], repeat=repeat) for p in passages)
+
+
+def benchmark_normalize(passages, repeat=1):
+    """Normalizing passages, as done before evaluation"""
+    data = [convert.to_binary(p) for p in passages]
+    total = 0
+    for _ in range(repeat):
+        copies = [convert.from_binary(d) for d in data]
+        total += sum(timed(normalization.normalize, p) for p in copies)
+    return total / repeat
+
+
+def benchmark_diff(passages, repeat=1):
+    """Finding the nodes missing between passages and copies of them in both directions, as diff_passages does"""
+    pairs = [(p, convert.from_binary(convert.to_binary(p))) for p in passages]
+    return sum(timed(lambda: (p.missing_nodes(q), q.missing_nodes(p)), repeat=repeat) for p, q in pairs)
+
+
+def benchmark_memory(passages, repeat=1):
+    """Memory (in MiB) taken by passages built from standard XML elements, as measured by tracemalloc"""
+    del repeat
+    elems = [convert.to_standard(p) for p in passages]
+    tracemalloc.start()
+    try:
+        loaded = [convert.from_standard(elem) for elem in elems]
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del loaded
+    return size / 2 ** 20
+
+
+BENCHMARKS = {  # name: (function, unit)
+    "binary": (benchmark_binary, "s"),
+    "diff": (benchmark_diff, "s"),
+    "evaluate": (benchmark_evaluate, "s"),
+    "evaluate_types": (benchmark_evaluate_types, "s"),
+    "load": (benchmark_load, "s"),
+    "memory": (benchmark_memory, "MiB"),
+    "normalize": (benchmark_normalize, "s"),
+    "parse": (benchmark_parse, "s"),
+    "serialize": (benchmark_serialize, "s"),
+    "stream": (benchmark_stream, "s"),
+    "unpickle": (benchmark_unpickle, "s"),
+    "write": (benchmark_write, "s"),
+}
+
+
+def main(args):
+    passages = load_passages(args.pattern)
+    print("%d passages loaded from '%s'" % (len(passages), args.pattern))
+    for copies in args.copies:
+        scaled = scale(passages, copies) if copies > 1 else passages
+        terminals = sum(len(p.layer("0").all) for p in scaled)
+        for name in args.benchmarks or BENCHMARKS:
+            fn, unit = BENCHMARKS[name]
+            print("%-14s x%-4d %8d terminals %10.4f%s" % (name, copies, terminals, fn(scaled, repeat=args.repeat), unit))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description=desc)
+    argparser.add_argument("benchmarks", nargs="*", help="benchmarks to run, out of %s (default: all)" %
+                           ", ".join(sorted(BENCHMARKS)))
+    argparser.add_argument("-p", "--pattern", default=DEFAULT_PATTERN, help="passage files to use")
+    argparser.add_argument("-c", "--copies", type=int, nargs="+", default=[1, 10, 50],
+                           help="numbers of copies to join each passage from")
+    argparser.add_argument("-r", "--repeat", type=int, default=1, help="number of times to repeat each measurement")
+    args = argparser.parse_args()
+    for benchmark in args.benchmarks:
+        if benchmark not in BENCHMARKS:
+            argparser.error("unknown benchmark: '%s'" % benchmark)
+    main(args)
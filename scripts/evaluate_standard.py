@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 """The evaluation script for UCCA layer 1."""
+import sys
+import time
 from argparse import ArgumentParser
-from itertools import repeat
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+from io import StringIO
+from itertools import repeat, islice
 
-from ucca import evaluation, constructions, ioutil
+from ucca import evaluation, constructions, ioutil, significance
 
 
 def main(args):
@@ -15,22 +22,92 @@ def main(args):
     results = []
     eval_type = evaluation.UNLABELED if args.unlabeled else evaluation.LABELED
     verbose = args.verbose or len(guessed) == 1
-    for g, r, ryt in zip(guessed, ref, ref_yield_tags or repeat(None)):
+    cache = evaluation.EvaluationCache(args.cache_dir) if args.cache_dir and not args.units else None
+    start = time.perf_counter()
+    for g, get_result in evaluate_pairs(zip(guessed, ref, ref_yield_tags or repeat(None)), jobs=args.jobs, cache=cache,
+                                        constructions=args.constructions, units=args.units, fscore=args.fscore,
+                                        errors=args.errors, verbose=verbose, normalize=args.normalize,
+                                        eval_type=evaluation.UNLABELED if args.unlabeled else None):
         if len(guessed) > 1:
             print("Evaluating %s%s" % (g.ID, ":" if args.verbose else "..."), end="\r", flush=True)
         if args.verbose:
             print()
-        result = evaluation.evaluate(g, r, constructions=args.constructions, units=args.units, fscore=args.fscore,
-                                     errors=args.errors, verbose=verbose,
-                                     normalize=args.normalize, ref_yield_tags=ryt,
-                                     eval_type=evaluation.UNLABELED if args.unlabeled else None)
+        result = get_result()
         if verbose:
             if args.errors:
                 result.print_confusion_matrix(as_table=args.as_table)
             if not args.quiet:
                 print_f1(result, eval_type)
         results.append(result)
-    summarize(args, results, eval_type=eval_type)
+    summarize(args, results, eval_type=eval_type, elapsed=time.perf_counter() - start)
+    if args.compare_to and not args.quiet:
+        other = ioutil.read_files_and_dirs((args.compare_to,))
+        if args.match_by_id:
+            other = match_by_id(other, ref)
+        other_results = [get_result() for _, get_result in evaluate_pairs(
+            zip(other, ref, ref_yield_tags or repeat(None)), jobs=args.jobs, cache=cache, constructions=args.constructions,
+            normalize=args.normalize, eval_type=evaluation.UNLABELED if args.unlabeled else None)]
+        print_significance(args, results, other_results, eval_type=eval_type)
+
+
+def evaluate_pairs(pairs, jobs=None, cache=None, **kwargs):
+    """
+    Evaluate passage pairs, possibly in parallel, keeping their order
+    :param pairs: iterable of (guessed, ref, ref_yield_tags) tuples
+    :param jobs: number of processes to evaluate in (None or 0 to evaluate in this process when results are requested)
+    :param cache: evaluation.EvaluationCache to take results of unchanged pairs from, and to store new results in
+    :param kwargs: keyword arguments to evaluation.evaluate
+    :return: generator of (guessed, function returning evaluation.Scores) pairs; when run in parallel,
+             output printed by evaluation.evaluate is printed when the function is called
+    """
+    if not jobs:
+        for g, r, ryt in pairs:
+            yield g, partial(evaluate_cached, g, r, ref_yield_tags=ryt, cache=cache, **kwargs)
+        return
+    pairs = iter(pairs)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        while True:
+            for g, r, ryt in islice(pairs, 2 * jobs - len(pending)):  # read ahead as long as workers may be idle
+                key = None if cache is None else cache.key(g, r, ref_yield_tags=ryt, **kwargs)
+                cached = None if key is None else cache.get(key)
+                if cached is None:
+                    future = executor.submit(evaluate_captured, g, r, ref_yield_tags=ryt, **kwargs)
+                else:
+                    future = Future()
+                    future.set_result(cached)
+                pending.append((g, future, key))
+            if not pending:
+                break
+            g, future, key = pending.popleft()
+            yield g, partial(print_captured, future, cache=cache, key=key)
+
+
+def evaluate_cached(*args, cache=None, **kwargs):
+    if cache is None:
+        return evaluation.evaluate(*args, **kwargs)
+    key = cache.key(*args, **kwargs)  # before evaluation, which may modify the passages
+    cached = cache.get(key)
+    if cached is None:
+        cached = evaluate_captured(*args, **kwargs)
+        cache.put(key, *cached)
+    result, output = cached
+    print(output, end="")  # as printed by evaluation.evaluate
+    return result
+
+
+def evaluate_captured(*args, **kwargs):
+    with redirect_stdout(StringIO()) as output:
+        result = evaluation.evaluate(*args, **kwargs)
+    return result, output.getvalue()
+
+
+def print_captured(future, cache=None, key=None):
+    result, output = future.result()
+    print(output, end="")
+    if key is not None and key not in cache:
+        cache.put(key, result, output)
+    return result
 
 
 def match_by_id(guessed, ref):
@@ -55,7 +132,16 @@ def print_f1(result, eval_type):
     print("Average %s F1 score: %.3f" % (eval_type, result.average_f1(eval_type)))
 
 
-def summarize(args, results, eval_type):
+def print_significance(args, results, other_results, eval_type):
+    test = significance.TESTS[args.significance]
+    res = test(*[significance.passage_counts(r, eval_type=eval_type) for r in (results, other_results)],
+               samples=args.samples, seed=args.seed)
+    print("Average %s F1 score: %.3f (%s) vs. %.3f (%s), difference %.3f, p-value %.4g (%s, %d samples)" % (
+        eval_type, res.f1, args.guessed, res.other_f1, args.compare_to, res.difference, res.p_value,
+        args.significance, res.samples))
+
+
+def summarize(args, results, eval_type, elapsed=None):
     summary = evaluation.Scores.aggregate(results)
     if len(results) > 1:
         if args.verbose:
@@ -69,6 +155,9 @@ def summarize(args, results, eval_type):
                     summary.print_confusion_matrix(as_table=args.as_table)
         if not args.quiet:
             print_f1(summary, eval_type=eval_type)
+            if elapsed is not None:
+                print("Evaluated %d passage pairs in %.3fs (%.3fs per pair, jobs: %d)" % (
+                    len(results), elapsed, elapsed / len(results), args.jobs or 1), file=sys.stderr)
     if args.out_file:
         with open(args.out_file, "w", encoding="utf-8") as f:
             print(*summary.titles(eval_type=eval_type), sep=",", file=f)
@@ -85,12 +174,15 @@ def summarize(args, results, eval_type):
         with open(args.errors_file, "w", encoding="utf-8") as f:
             summary.print_confusion_matrix(sep=",", as_table=args.as_table, file=f)
         print("Wrote '%s'" % args.errors_file)
+    if args.errors_npz:
+        summary.save_confusion_matrices(args.errors_npz)
+        print("Wrote '%s'" % args.errors_npz)
 
 
 def check_args(args):
     if args.out_file or args.summary_file or not (args.units or args.fscore or args.errors):
         args.fscore = True
-    if args.errors_file:
+    if args.errors_file or args.errors_npz:
         args.errors = True
     return args
 
@@ -118,6 +210,17 @@ if __name__ == "__main__":
     argparser.add_argument("--summary-file", help="file to write aggregated scores to, in CSV format")
     argparser.add_argument("--counts-file", help="file to write aggregated counts to, in CSV format")
     argparser.add_argument("--errors-file", help="file to write aggregated confusion matrix to, in CSV format")
+    argparser.add_argument("--errors-npz", help="file to write aggregated confusion matrices to, in NumPy NPZ format")
+    argparser.add_argument("--compare-to", help="file name or directory for another guessed annotation of the same "
+                                                "passages, to test the significance of the difference in F1 from")
+    argparser.add_argument("--significance", choices=significance.TESTS, default="bootstrap",
+                           help="significance test to use with --compare-to")
+    argparser.add_argument("--samples", type=int, default=10000, help="number of samples for the significance test")
+    argparser.add_argument("--seed", type=int, help="random seed for the significance test")
+    argparser.add_argument("--cache-dir", help="directory to store the result for each passage pair in, keyed by the "
+                                               "contents of the passages, to skip unchanged pairs when evaluating again "
+                                               "(not used with --units)")
+    argparser.add_argument("-j", "--jobs", type=int, help="number of processes to evaluate passage pairs in parallel")
     group = argparser.add_mutually_exclusive_group()
     group.add_argument("-v", "--verbose", action="store_true",
                        help="prints the results for every single pair (always true if there is only one pair)")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import argparse
+import os
+
+from ucca.convert import write_corpus_archive, BINARY_EXTENSION, CORPUS_ARCHIVE_EXTENSION
+from ucca.ioutil import get_passages_with_progress_bar, write_passage
+
+desc = """Packs passage files (or directories of them) into a single corpus archive file, which can be read
+sequentially or by passage index or ID without opening any other file, or unpacks corpus archives to passage files.
+"""
+
+
+def pack(filenames, outfile):
+    return write_corpus_archive(get_passages_with_progress_bar(filenames, desc="Packing", converters={}), outfile)
+
+
+def unpack(filenames, outdir, output_format=None, binary=False):
+    for passage in get_passages_with_progress_bar(filenames, desc="Unpacking", converters={}):
+        write_passage(passage, output_format=output_format, binary=binary, outdir=outdir, verbose=False)
+
+
+def main(args):
+    if args.unpack:
+        unpack(args.filenames, args.outdir, output_format=args.format, binary=args.binary)
+    else:
+        outfile = args.outfile if args.outfile.endswith(CORPUS_ARCHIVE_EXTENSION) else \
+            args.outfile + CORPUS_ARCHIVE_EXTENSION
+        print("Wrote %d passages to '%s'" % (pack(args.filenames, outfile), outfile))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description=desc)
+    argparser.add_argument("filenames", nargs="+", help="passage files or directories to pack, or archives to unpack")
+    argparser.add_argument("-o", "--outfile", default="corpus" + CORPUS_ARCHIVE_EXTENSION,
+                           help="archive file to write (default: corpus%s)" % CORPUS_ARCHIVE_EXTENSION)
+    argparser.add_argument("-u", "--unpack", action="store_true", help="unpack archives instead of packing")
+    argparser.add_argument("-d", "--outdir", default=".", help="output directory when unpacking")
+    argparser.add_argument("-f", "--format", choices=("xml", "pickle", BINARY_EXTENSION.lstrip(".")),
+                           help="output format when unpacking (default: xml, or pickle with --binary)")
+    argparser.add_argument("-b", "--binary", action="store_true", help="write in pickle binary format (.pickle)")
+    main(argparser.parse_args())
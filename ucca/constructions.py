@@ -31,6 +31,9 @@ class Construction:
         if self.criterion(candidate):
             yield self
 
+    def __reduce__(self):  # criteria may be lambdas, so constructions are pickled by name
+        return _unpickle_construction, (self.name, self.description, self.default)
+
     @property
     def is_punct(self):
         return self.name in (EdgeTags.Punctuation, layer0.NodeTags.Punct, "punct")
@@ -57,25 +60,73 @@ def create_category_construction(tag):
     return Construction(tag, CATEGORY_DESCRIPTIONS.get(tag, tag), criterion=None)
 
 
+class Yield(int):
+    """
+    Set of terminal positions, as a bitmask where bit i is set if position i is included.
+    Hashing and equality are those of int, taking time linear in the number of words / 64.
+    """
+    __slots__ = ()
+
+    def __contains__(self, position):
+        return position >= 0 and bool(self >> position & 1)
+
+    def __iter__(self):  # positions in ascending order
+        mask = int(self)
+        while mask:
+            lowest = mask & -mask
+            yield lowest.bit_length() - 1
+            mask ^= lowest
+
+    def __len__(self):
+        return bin(self).count("1")
+
+    def issubset(self, other):
+        return not self & ~other
+
+    def issuperset(self, other):
+        return not other & ~self
+
+    def overlaps(self, other):
+        return bool(self & other)
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, sorted(self))
+
+
 def positions(terminals):
-    return frozenset(t.position for t in terminals)
+    return Yield(layer1.terminal_mask(terminals))
+
+
+def get_node_yield(node, punct=True):
+    """
+    :param node: Node to get the terminal yield of (excluding remotes)
+    :param punct: whether to include punctuation terminals
+    :return: Yield of the terminals under the node
+    """
+    if isinstance(node, layer1.FoundationalNode):
+        return Yield(node.get_terminal_mask(punct=punct))
+    return positions(node.get_terminals(punct=punct))
 
 
 class Candidate:
-    def __init__(self, edge, reference=None, reference_yield_tags=None, verbose=False):
+    def __init__(self, edge, reference=None, reference_yield_tags=None, verbose=False, view=None):
+        def terminal_yield(node, punct=True):
+            return get_node_yield(node, punct=punct) if view is None else view.get_yield(node, punct=punct)
+
         self.edge = edge
-        self.out_tags = {t for e in edge.child for t in e.tags}
+        self.out_tags = {t for e in (edge.child if view is None else view.outgoing(edge.child)) for t in e.tags}
         self.reference = reference
         self.reference_yield_tags = reference_yield_tags
         self.verbose = verbose
-        self.terminals = self.edge.child.get_terminals()
-        self._terminal_yield = positions(self.terminals)
-        self._terminal_yield_no_punct = positions((self.edge.parent if self.is_implicit() else self.edge.child).get_terminals(punct=False))
+        self.terminals = edge.child.get_terminals() if view is None else view.get_terminals(edge.child)
+        self._terminal_yield = terminal_yield(self.edge.child)
+        self._terminal_yield_no_punct = terminal_yield(self.edge.parent if self.is_implicit() else self.edge.child,
+                                                       punct=False)
         if self.reference is not None:
             self.terminals = [self.reference.by_id(t.ID) for t in self.terminals]
         self.extra = {}
         self.is_unary_child = self.edge.parent.incoming and (
-                self._terminal_yield_no_punct == positions(self.edge.parent.get_terminals(punct=False)))
+                self._terminal_yield_no_punct == terminal_yield(self.edge.parent, punct=False))
 
     def _annotate(self, attr=None):
         passage = self.edge.parent.root
@@ -198,6 +249,11 @@ def add_argument(argparser, default=True):
                            help="construction types to include, out of {%s}" % ",".join(CONSTRUCTION_BY_NAME))
 
 
+def _unpickle_construction(name, description, default):
+    construction = ALL_EDGES if name == ALL_EDGES.name else CONSTRUCTION_BY_NAME.get(name)
+    return Construction(name, description, criterion=None, default=default) if construction is None else construction
+
+
 def get_by_name(name):
     return name if isinstance(name, Construction) else CATEGORY_DESCRIPTIONS.get(name) or CONSTRUCTION_BY_NAME[name]
 
@@ -223,7 +279,8 @@ def verify_terminals_match(passage, reference):
                           "\n".join(map(str, diff_terminals(passage, reference))))
 
 
-def extract_candidates(passage, constructions=None, reference=None, reference_yield_tags=None, verbose=False):
+def extract_candidates(passage, constructions=None, reference=None, reference_yield_tags=None, verbose=False,
+                       view=None):
     """
     Find candidate edges by constructions in UCCA passage.
     :param passage: Passage object to find constructions in
@@ -233,6 +290,7 @@ def extract_candidates(passage, constructions=None, reference=None, reference_yi
                    dict: set of terminal indices (excluding punctuation) ->
                    list of edges of the Construction whose yield (excluding remotes and punctuation) is that set
     :param verbose: whether to print tagged text
+    :param view: evaluation.PassageView of `passage' to take edges and yields from, instead of the passage itself
     :return: dict of Construction -> list of corresponding Candidates
     """
     constructions = get_by_names(constructions)
@@ -247,8 +305,8 @@ def extract_candidates(passage, constructions=None, reference=None, reference_yi
             keys.append(construction)
     extracted = OrderedDict((c, []) for c in keys)
     for node in passage.layer(layer1.LAYER_ID).all:
-        for edge in node:
-            candidate = Candidate(edge, reference or passage, reference_yield_tags, verbose=verbose)
+        for edge in node if view is None else view.outgoing(node):
+            candidate = Candidate(edge, reference or passage, reference_yield_tags, verbose=verbose, view=view)
             if not candidate.excluded:
                 for construction in candidate.constructions(constructions):
                     extracted.setdefault(construction, []).append(candidate)
@@ -11,6 +11,7 @@ The possible other formats are:
     sdp (SemEval 2015 semantic dependency parsing shared task)
 """
 
+import mmap
 import os
 import pickle
 import re
@@ -18,9 +19,11 @@ import sys
 import xml.etree.ElementTree as ET
 import xml.sax.saxutils
 from collections import defaultdict
-from itertools import repeat, groupby
+from itertools import repeat, groupby, chain
 from operator import attrgetter, itemgetter
 
+import numpy as np
+
 from ucca import textutil, core, layer0, layer1
 from ucca.layer1 import EdgeTags
 from ucca.normalization import attach_punct, COORDINATED_MAIN_REL
@@ -372,8 +375,9 @@ def from_site(elem):
     attrib = elem.find(SiteCfg.Paths.Attrib)
     passage = core.Passage(pid, attrib=None if attrib is None else attrib.attrib)
     elem2node = {}
-    _from_site_terminals(elem, passage, elem2node)
-    _from_site_annotation(elem, passage, elem2node)
+    with core.PassageBuilder(passage):
+        _from_site_terminals(elem, passage, elem2node)
+        _from_site_annotation(elem, passage, elem2node)
     return passage
 
 
@@ -592,6 +596,98 @@ def to_site(passage):
     return root
 
 
+# This utility stringifies the Unit's attributes for proper XML
+def _dumps_standard_attrib(dic):
+    return {str(k): str(v) if type(v) in (str, bool) else json.dumps(v) for k, v in dic.items()}
+
+
+_ATTRIB_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}  # besides &, < and >
+
+
+def _standard_tag(name, attrib, empty=True):
+    """Serializes an element start tag (or an empty element) the way ET.tostring does with its default encoding."""
+    tag = "<" + name + "".join(' %s="%s"' % (k, xml.sax.saxutils.escape(v, _ATTRIB_ENTITIES))
+                               for k, v in attrib.items()) + (" />" if empty else ">")
+    try:
+        tag.encode("ascii")
+        return tag
+    except UnicodeEncodeError:
+        return tag.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+
+def _iter_standard_tags(passage):
+    """Yields the tags of the standard XML of a passage, identical to serializing :func:`to_standard` output."""
+
+    def _attrib_and_extra(obj):
+        attrib = obj.attrib
+        yield _standard_tag('attributes', _dumps_standard_attrib(attrib)) if attrib else "<attributes />"
+        if obj.extra:
+            yield _standard_tag('extra', _dumps_standard_attrib(obj.extra))
+
+    yield _standard_tag('root', {'passageID': str(passage.ID), 'annotationID': '0'}, empty=False)
+    yield from _attrib_and_extra(passage)
+    for layer in sorted(passage.layers, key=attrgetter('ID')):
+        yield _standard_tag('layer', {'layerID': layer.ID}, empty=False)
+        yield from _attrib_and_extra(layer)
+        for node in layer.all:
+            yield _standard_tag('node', {'ID': node.ID, 'type': node.tag}, empty=False)
+            yield from _attrib_and_extra(node)
+            for edge in node:
+                yield _standard_tag('edge', {'toID': edge.child.ID, 'type': edge.tag}, empty=False)
+                yield from _attrib_and_extra(edge)
+                for category in edge:
+                    attrs = {}
+                    if category.tag:
+                        attrs["tag"] = category.tag
+                    if category.slot:
+                        attrs["slot"] = str(category.slot)
+                    if category.layer:
+                        attrs["layer_name"] = category.layer
+                    if category.parent:
+                        attrs["parent_name"] = category.parent
+                    if category.extra:
+                        yield _standard_tag('category', attrs, empty=False)
+                        yield _standard_tag('extra', _dumps_standard_attrib(category.extra))
+                        yield "</category>"
+                    else:
+                        yield _standard_tag('category', attrs)
+                yield "</edge>"
+            yield "</node>"
+        yield "</layer>"
+    yield "</root>"
+
+
+def write_standard(passage, f, indent=True):
+    """Writes a Passage as standard XML directly to a file, without building the XML tree.
+
+    The output is identical to that of serializing :func:`to_standard` with ``ET.tostring``
+    and indenting it with :func:`textutil.indent_xml`.
+
+    :param passage: the passage to write
+    :param f: text file object to write to
+    :param indent: whether to write each element in its own indented line
+    """
+    tags = _iter_standard_tags(passage)
+    if not indent:
+        f.write("".join(tags))
+        return
+
+    def _indented():  # same as textutil.indent_xml, but tag by tag
+        tabs = 0
+        for tag in tags:
+            # attribute values are escaped, so tags only contain line breaks if they have control characters
+            for line in (tag,) if tag.isprintable() else tag.splitlines():
+                if line[:2] == "</":
+                    tabs -= 1
+                    yield "  " * tabs + line + "\n"
+                else:
+                    yield "  " * tabs + line + "\n"
+                    if line[-2:] != "/>":
+                        tabs += 1
+
+    f.writelines(_indented())
+
+
 def to_standard(passage):
     """Converts a Passage object to a standard XML root element.
 
@@ -603,11 +699,9 @@ def to_standard(passage):
     :return: the root element of the standard XML structure
     """
 
-    # This utility stringifies the Unit's attributes for proper XML
     # we don't need to escape the character - the serializer of the XML element
     # will do it (e.g. tostring())
-    def _dumps(dic):
-        return {str(k): str(v) if type(v) in (str, bool) else json.dumps(v) for k, v in dic.items()}
+    _dumps = _dumps_standard_attrib
 
     # Utility to add an extra element if exists in the object
     def _add_extra(obj, elem):
@@ -650,90 +744,562 @@ def to_standard(passage):
     return root
 
 
+def _str2bool(x):
+    return x == "True"
+
+
+STANDARD_ATTRIBUTE_CONVERTERS = {
+    'paragraph': int,
+    'paragraph_position': int,
+    'remote': _str2bool,
+    'implicit': _str2bool,
+    'uncertain': _str2bool,
+    'suggest': _str2bool,
+    None: str,
+}
+
+STANDARD_LAYER_CLASSES = {layer0.LAYER_ID: layer0.Layer0,
+                          layer1.LAYER_ID: layer1.Layer1}
+
+STANDARD_NODE_CLASSES = {layer0.NodeTags.Word: layer0.Terminal,
+                         layer0.NodeTags.Punct: layer0.Terminal,
+                         layer1.NodeTags.Foundational: layer1.FoundationalNode,
+                         layer1.NodeTags.Linkage: layer1.Linkage,
+                         layer1.NodeTags.Punctuation: layer1.PunctNode}
+
+
+def _loads(x):
+    try:
+        return False if x == "False" else x == "True" or json.loads(x)
+    except JSONDecodeError:
+        return x
+
+
+def _get_standard_attrib(elem):
+    attributes = elem.find('attributes')
+    if attributes is None:
+        raise core.UCCAError("Element %s has no attributes" % elem.get("ID"))
+    return {k: STANDARD_ATTRIBUTE_CONVERTERS.get(k, str)(v) for k, v in attributes.items()}
+
+
+def _get_standard_extra(elem, extra_funcs=None):
+    extra = elem.find('extra')
+    return {} if extra is None else {k: (extra_funcs or {}).get(k, _loads)(v) for k, v in extra.items()}
+
+
+def _get_standard_categories(edge_elem):
+    categories = [(c.get('tag'), c.get('slot'), c.get('layer_name'), c.get('parent_name'))
+                  for c in edge_elem.findall('category')]
+    return categories or [(edge_elem.get('type'), "", "", "")]  # an old xml format
+
+
+def _create_standard_node(node_elem, passage, created_nodes, extra_funcs=None):
+    # some nodes are created automatically, skip creating them when found
+    # in the XML (they should have 'constant' IDs) but take their edges
+    # and attributes/extra from the XML (may have changed from the default)
+    node_id = node_elem.get('ID')
+    tag = node_elem.get('type')
+    node = created_nodes.get(node_id)
+    if node is None:
+        node = STANDARD_NODE_CLASSES[tag](root=passage, ID=node_id, tag=tag, attrib=_get_standard_attrib(node_elem))
+    else:
+        for key, value in _get_standard_attrib(node_elem).items():
+            node.attrib[key] = value
+    node.extra.update(_get_standard_extra(node_elem, extra_funcs))
+    return node
+
+
+def _get_standard_edges(from_node, node_elem, extra_funcs=None):
+    return [(from_node, edge_elem.get('toID'), _get_standard_categories(edge_elem),
+             _get_standard_attrib(edge_elem), _get_standard_extra(edge_elem, extra_funcs))
+            for edge_elem in node_elem.findall('edge')]
+
+
+def _add_standard_edges(builder, edges):
+    """Adds the Edges in the given (parent, child ID, categories, attributes, extra) tuples.
+
+    Must be called after all Nodes have been created.
+    """
+    for from_node, to_id, categories, attrib, extra in edges:
+        edge = builder.add_edge(from_node, builder.passage.by_id(to_id), categories, attrib=attrib)
+        edge.extra.update(extra)
+
+
 def from_standard(root, extra_funcs=None):
-    def _str2bool(x):
-        return x == "True"
-
-    attribute_converters = {
-        'paragraph': int,
-        'paragraph_position': int,
-        'remote': _str2bool,
-        'implicit': _str2bool,
-        'uncertain': _str2bool,
-        'suggest': _str2bool,
-        None: str,
-    }
-
-    def _loads(x):
-        try:
-            return False if x == "False" else x == "True" or json.loads(x)
-        except JSONDecodeError:
-            return x
+    passage = core.Passage(root.get('passageID'), attrib=_get_standard_attrib(root))
+    with core.PassageBuilder(passage) as builder:
+        passage.extra.update(_get_standard_extra(root, extra_funcs))
+        edges = []
+        for layer_elem in root.findall('layer'):
+            layer = STANDARD_LAYER_CLASSES[layer_elem.get('layerID')](passage,
+                                                                      attrib=_get_standard_attrib(layer_elem))
+            layer.extra.update(_get_standard_extra(layer_elem, extra_funcs))
+            created_nodes = {x.ID: x for x in layer.all}
+            for node_elem in layer_elem.findall('node'):
+                node = _create_standard_node(node_elem, passage, created_nodes, extra_funcs)
+                edges += _get_standard_edges(node, node_elem, extra_funcs)
+        _add_standard_edges(builder, edges)  # must have all nodes before doing so
+    return passage
 
-    layer_objs = {layer0.LAYER_ID: layer0.Layer0,
-                  layer1.LAYER_ID: layer1.Layer1}
 
-    node_objs = {layer0.NodeTags.Word: layer0.Terminal,
-                 layer0.NodeTags.Punct: layer0.Terminal,
-                 layer1.NodeTags.Foundational: layer1.FoundationalNode,
-                 layer1.NodeTags.Linkage: layer1.Linkage,
-                 layer1.NodeTags.Punctuation: layer1.PunctNode}
+# Matches XML declarations, which are removed when streaming standard XML, as it may contain several documents
+XML_DECLARATION = re.compile(r"<\?xml\s[^>]*\?>")
 
-    def _get_attrib(elem):
-        try:
-            return {k: attribute_converters.get(k, str)(v)
-                    for k, v in elem.find('attributes').items()}
-        except AttributeError as e:
-            raise core.UCCAError("Element %s has no attributes" % elem.get("ID")) from e
+STREAM_CHUNK_SIZE = 2 ** 16
 
-    def _add_extra(obj, elem):
-        if elem.find('extra') is not None:
-            for k, v in elem.find('extra').items():
-                obj.extra[k] = (extra_funcs or {}).get(k, _loads)(v)
 
-    passage = core.Passage(root.get('passageID'), attrib=_get_attrib(root))
-    _add_extra(passage, root)
-    edge_elems = []
-    for layer_elem in root.findall('layer'):
-        layer_id = layer_elem.get('layerID')
-        layer = layer_objs[layer_id](passage, attrib=_get_attrib(layer_elem))
-        _add_extra(layer, layer_elem)
-        # some nodes are created automatically, skip creating them when found
-        # in the XML (they should have 'constant' IDs) but take their edges
-        # and attributes/extra from the XML (may have changed from the default)
+def _read_xml_chunks(f):
+    """Reads a text file in chunks with any XML declarations removed."""
+    pending = ""
+    for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), ""):
+        chunk = pending + chunk
+        start = chunk.rfind("<")
+        if start >= 0 and chunk.find(">", start) < 0:  # may be a declaration cut by the end of the chunk
+            chunk, pending = chunk[:start], chunk[start:]
+        else:
+            pending = ""
+        yield XML_DECLARATION.sub("", chunk)
+    yield pending
+
+
+def iter_standard(source, extra_funcs=None):
+    """Reads Passages from standard XML as it is being parsed.
+
+    Unlike :func:`from_standard`, the XML tree is never held in memory as a whole:
+    each Node is created as soon as its element is closed, and the element is then discarded.
+    The source may contain several standard XML root elements (e.g., concatenated files),
+    and a Passage is yielded for each one.
+
+    :param source: file name or text file object to read from
+    :param extra_funcs: dictionary from extra keys to functions converting their string values
+    :return: generator of Passage objects
+    """
+    if isinstance(source, str):
+        with open(source, encoding="utf-8") as f:
+            yield from iter_standard(f, extra_funcs=extra_funcs)
+        return
+    # Only start events are requested, as they are enough to know when an element is complete:
+    # each element is handled once the next node, layer or root element starts, or at the end
+    parser = ET.XMLPullParser(events=("start",))
+    parser.feed("<passages>")  # allows for several root elements
+    top = root = layer_elem = node_elem = None
+    passage = layer = created_nodes = builder = None
+    edges = []
+
+    def _create_passage():
+        nonlocal passage, builder
+        passage = core.Passage(root.get('passageID'), attrib=_get_standard_attrib(root))
+        builder = core.PassageBuilder(passage)
+        builder.__enter__()  # exited when the passage is finished, before yielding it
+        passage.extra.update(_get_standard_extra(root, extra_funcs))
+
+    def _create_layer():
+        nonlocal layer, created_nodes
+        layer = STANDARD_LAYER_CLASSES[layer_elem.get('layerID')](passage, attrib=_get_standard_attrib(layer_elem))
+        layer.extra.update(_get_standard_extra(layer_elem, extra_funcs))
         created_nodes = {x.ID: x for x in layer.all}
-        for node_elem in layer_elem.findall('node'):
-            node_id = node_elem.get('ID')
-            tag = node_elem.get('type')
-            node = created_nodes.get(node_id)
-            if node is None:
-                node = node_objs[tag](root=passage, ID=node_id, tag=tag, attrib=_get_attrib(node_elem))
-            else:
-                for key, value in _get_attrib(node_elem).items():
-                    node.attrib[key] = value
-            _add_extra(node, node_elem)
-            edge_elems += [(node, x) for x in node_elem.findall('edge')]
-
-    # Adding edges (must have all nodes before doing so)
-    for from_node, edge_elem in edge_elems:
-        to_node = passage.nodes[edge_elem.get('toID')]
-        categories_elems = edge_elem.findall('category')
-        categories = []
-        for c in categories_elems:
-            tag = c.get('tag')
-            slot = c.get('slot')
-            layer = c.get('layer_name')
-            parent = c.get('parent_name')
-            categories.append((tag, slot, layer, parent))
-        if not categories:  # an old xml format
-            tag = edge_elem.get('type')
-            categories.append((tag, "", "", ""))
-        edge = from_node.add_multiple(categories, to_node, edge_attrib=_get_attrib(edge_elem))
-        _add_extra(edge, edge_elem)
 
+    def _create_node():
+        nonlocal node_elem
+        if node_elem is not None:
+            node = _create_standard_node(node_elem, passage, created_nodes, extra_funcs)
+            edges.extend(_get_standard_edges(node, node_elem, extra_funcs))
+            layer_elem.remove(node_elem)
+            node_elem = None
+
+    def _finish_layer():
+        _create_node()
+        if layer_elem is not None and layer is None:  # a layer with no nodes
+            _create_layer()
+
+    def _finish_passage():
+        nonlocal root, layer_elem, layer, passage, builder
+        _finish_layer()
+        if passage is None:  # a passage with no layers
+            _create_passage()
+        _add_standard_edges(builder, edges)
+        builder.__exit__(None, None, None)
+        finished = passage
+        top.remove(root)
+        root = layer_elem = layer = passage = builder = None
+        edges.clear()
+        return finished
+
+    try:
+        for chunk in chain(_read_xml_chunks(source), ["</passages>"]):
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                tag = elem.tag
+                if tag == 'node':
+                    _create_node()
+                    if layer is None:
+                        _create_layer()
+                    node_elem = elem
+                elif tag == 'layer':
+                    _finish_layer()
+                    if passage is None:
+                        _create_passage()
+                    layer_elem, layer = elem, None
+                elif tag == 'root':
+                    if root is not None:
+                        yield _finish_passage()
+                    root = elem
+                elif top is None:
+                    top = elem
+        parser.close()
+        if root is not None:
+            yield _finish_passage()
+    finally:
+        if builder is not None:  # failed while building a passage
+            builder.__exit__(*sys.exc_info())
+
+
+# Compact binary format: a header and a table of sections, each an array of fixed-size little-endian records.
+# Strings (including JSON-encoded attributes and extra) are stored once, in a string table, and referred to by index.
+BINARY_MAGIC = b"UCCABIN\0"
+BINARY_VERSION = 1
+BINARY_EXTENSION = ".ucb"
+_BINARY_NO_STRING = 0xFFFFFFFF  # string index standing for None
+_BINARY_HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("sections", "<u4")])
+_BINARY_SECTION = np.dtype([("offset", "<u8"), ("count", "<u8")])
+_BINARY_ALIGNMENT = 8
+_BINARY_RECORDS = {  # section name: record type; sections are written in this order
+    "passage": np.dtype([("ID", "<u4"), ("attrib", "<u4"), ("extra", "<u4")]),
+    "layers": np.dtype([("ID", "<u4"), ("attrib", "<u4"), ("extra", "<u4"), ("end", "<u4")]),  # end: of its nodes
+    "nodes": np.dtype([("ID", "<u4"), ("tag", "<u4"), ("attrib", "<u4"), ("extra", "<u4"), ("end", "<u4")]),
+    "edges": np.dtype([("child", "<u4"), ("attrib", "<u4"), ("extra", "<u4"), ("end", "<u4")]),
+    "categories": np.dtype([("tag", "<u4"), ("slot", "<u4"), ("layer", "<u4"), ("parent", "<u4"),
+                            ("extra", "<u4")]),
+    # Fields of the Terminals, in the order of the layer 0 nodes; when "split" is set, the text, paragraph and
+    # paragraph_position attributes are only kept here, and the node's attributes contain just the rest
+    "terminals": np.dtype([("position", "<i8"), ("paragraph", "<i8"), ("para_pos", "<i8"), ("text", "<u4"),
+                           ("punct", "?"), ("split", "?")]),
+    "string_ends": np.dtype("<u8"),  # byte offset of the end of each string in "strings"
+    "strings": np.dtype("u1"),  # UTF-8 encoded
+}
+_TERMINAL_ATTRIB_KEYS = ["text", "paragraph", "paragraph_position"]
+
+
+def _split_terminal_attrib(attrib):
+    """Returns the Terminal's (text, paragraph, paragraph_position) if these are its first attributes, else None."""
+    if list(attrib)[:3] == _TERMINAL_ATTRIB_KEYS:
+        text, paragraph, para_pos = map(attrib.get, _TERMINAL_ATTRIB_KEYS)
+        if type(text) is str and type(paragraph) is int and type(para_pos) is int:
+            return text, paragraph, para_pos
+    return None
+
+
+def to_binary(passage):
+    """Converts a Passage object to the compact binary format.
+
+    Everything kept by :func:`to_standard` is kept, but the records are of fixed size,
+    so that a Passage's Terminals can be read without decoding the rest (see :func:`binary2terminals`).
+
+    :param passage: the passage to convert
+
+    :return: bytes of the binary format
+    """
+    string_ids = {}
+
+    def _s(x):  # index of string in the string table
+        if x is None:
+            return _BINARY_NO_STRING
+        i = string_ids.get(x)
+        if i is None:
+            i = string_ids[x] = len(string_ids)
+        return i
+
+    def _j(dic):  # index of JSON-encoded dictionary in the string table
+        return _s(json.dumps(dict(dic.items())) if dic else "{}")
+
+    records = {name: [] for name in _BINARY_RECORDS}
+    records["passage"].append((_s(str(passage.ID)), _j(passage.attrib), _j(passage.extra)))
+    node_ids = {}
+    layers = sorted(passage.layers, key=attrgetter('ID'))
+    for layer in layers:
+        for node in layer.all:
+            node_ids[node.ID] = len(node_ids)
+    for layer in layers:
+        for node in layer.all:
+            attrib = dict(node.attrib.items())
+            if layer.ID == layer0.LAYER_ID:
+                split = _split_terminal_attrib(attrib)
+                if split is None:
+                    text, paragraph, para_pos = attrib.get("text"), attrib.get("paragraph"), \
+                                                attrib.get("paragraph_position")
+                else:
+                    text, paragraph, para_pos = split
+                    attrib = dict(list(attrib.items())[3:])
+                records["terminals"].append((
+                    node.position if isinstance(node, layer0.Terminal) else -1,
+                    paragraph if type(paragraph) is int else -1, para_pos if type(para_pos) is int else -1,
+                    _s(text if type(text) is str else None), node.tag == layer0.NodeTags.Punct, split is not None))
+            for edge in node:
+                for category in edge:
+                    records["categories"].append((
+                        _s(category.tag), _s(json.dumps(category.slot)), _s(category.layer), _s(category.parent),
+                        _j(category.extra)))
+                records["edges"].append((node_ids[edge.child.ID], _j(edge.attrib), _j(edge.extra),
+                                         len(records["categories"])))
+            records["nodes"].append((_s(node.ID), _s(node.tag), _j(attrib), _j(node.extra), len(records["edges"])))
+        records["layers"].append((_s(layer.ID), _j(layer.attrib), _j(layer.extra), len(records["nodes"])))
+    strings = [s.encode("utf-8") for s in string_ids]
+    records["string_ends"] = np.cumsum([len(s) for s in strings], dtype=np.uint64)
+    records["strings"] = np.frombuffer(b"".join(strings), dtype=np.uint8)
+
+    arrays = [np.array(records[name], dtype=dtype) for name, dtype in _BINARY_RECORDS.items()]
+    header = np.array([(BINARY_MAGIC, BINARY_VERSION, len(arrays))], dtype=_BINARY_HEADER)
+    sections = np.zeros(len(arrays), dtype=_BINARY_SECTION)
+    offset = header.nbytes + sections.nbytes
+    chunks = [header, sections]
+    for i, array in enumerate(arrays):
+        padding = -offset % _BINARY_ALIGNMENT
+        chunks.append(bytes(padding))
+        offset += padding
+        sections[i] = (offset, len(array))
+        chunks.append(array)
+        offset += array.nbytes
+    return b"".join(chunk if isinstance(chunk, bytes) else chunk.tobytes() for chunk in chunks)
+
+
+def _binary_sections(buffer):
+    """Returns a dict of the section arrays in a buffer with the binary format, without copying them."""
+    header = np.frombuffer(buffer, dtype=_BINARY_HEADER, count=1)[0]
+    if header["magic"] != BINARY_MAGIC.rstrip(b"\0"):
+        raise core.UCCAError("Not a binary UCCA passage")
+    if header["version"] != BINARY_VERSION:
+        raise core.UCCAError("Unsupported binary UCCA passage version: %d (expected %d)" %
+                             (header["version"], BINARY_VERSION))
+    sections = np.frombuffer(buffer, dtype=_BINARY_SECTION, count=header["sections"], offset=_BINARY_HEADER.itemsize)
+    return {name: np.frombuffer(buffer, dtype=dtype, count=int(count), offset=int(offset))
+            for (name, dtype), (offset, count) in zip(_BINARY_RECORDS.items(), sections.tolist())}
+
+
+class _BinaryStrings:
+    """Decodes strings from the string table of the binary format, as they are requested."""
+
+    def __init__(self, sections):
+        self._ends = sections["string_ends"]
+        self._bytes = memoryview(sections["strings"])  # not copied, so that only requested strings are read
+        self._decoded = {}
+
+    def __getitem__(self, i):
+        if i == _BINARY_NO_STRING:
+            return None
+        s = self._decoded.get(i)
+        if s is None:
+            s = self._decoded[i] = str(self._bytes[int(self._ends[i - 1]) if i else 0:int(self._ends[i])], "utf-8")
+        return s
+
+
+def from_binary(data):
+    """Converts bytes of the compact binary format (see :func:`to_binary`) to a Passage object.
+
+    :param data: bytes (or another buffer) of the binary format
+
+    :return: a Passage object
+    """
+    sections = _binary_sections(data)
+    strings = _BinaryStrings(sections)
+    parsed = {}
+
+    def _json(i):  # the same string may stand for attributes of several objects, so only flat ones are reused
+        value = parsed.get(i)
+        if value is None:
+            value = json.loads(strings[i])
+            if all(isinstance(v, (str, int, float, type(None))) for v in value.values()):
+                parsed[i] = value
+            else:
+                return value
+        return dict(value)
+
+    def _slot(i):  # slots are ints or strings, so they can always be reused
+        value = parsed.get(i)
+        if value is None:
+            value = parsed[i] = json.loads(strings[i])
+        return value
+
+    passage_id, attrib, extra = sections["passage"][0].tolist()
+    passage = core.Passage(strings[passage_id], attrib=_json(attrib))
+    with core.PassageBuilder(passage) as builder:
+        passage.extra.update(_json(extra))
+        nodes = []
+        node_records = sections["nodes"].tolist()
+        terminals = iter(sections["terminals"].tolist())
+        start = 0
+        for layer_id, attrib, extra, end in sections["layers"].tolist():
+            layer_id = strings[layer_id]
+            layer = STANDARD_LAYER_CLASSES[layer_id](passage, attrib=_json(attrib))
+            layer.extra.update(_json(extra))
+            created_nodes = {x.ID: x for x in layer.all}
+            for node_id, tag, attrib, extra, _ in node_records[start:end]:
+                node_id, tag, attrib = strings[node_id], strings[tag], _json(attrib)
+                if layer_id == layer0.LAYER_ID:
+                    _, paragraph, para_pos, text, _, split = next(terminals)
+                    if split:
+                        attrib = dict(zip(_TERMINAL_ATTRIB_KEYS, (strings[text], paragraph, para_pos)), **attrib)
+                node = created_nodes.get(node_id)
+                if node is None:
+                    node = STANDARD_NODE_CLASSES[tag](root=passage, ID=node_id, tag=tag, attrib=attrib)
+                else:
+                    for key, value in attrib.items():
+                        node.attrib[key] = value
+                node.extra.update(_json(extra))
+                nodes.append(node)
+            start = end
+        category_records = sections["categories"].tolist()
+        edge_records = sections["edges"].tolist()
+        start = category_start = 0
+        for node, (_, _, _, _, end) in zip(nodes, node_records):
+            for child, attrib, extra, category_end in edge_records[start:end]:
+                categories = category_records[category_start:category_end]
+                edge = builder.add_edge(node, nodes[child], [
+                    (strings[tag], _slot(slot), strings[layer], strings[parent])
+                    for tag, slot, layer, parent, _ in categories], attrib=_json(attrib))
+                edge.extra.update(_json(extra))
+                for category, (_, _, _, _, extra) in zip(edge, categories):
+                    category.extra.update(_json(extra))
+                category_start = category_end
+            start = end
     return passage
 
 
+def binary2passage(filename):
+    with open(filename, "rb") as h:
+        return from_binary(h.read())
+
+
+def binary2terminals(filename, start=0, stop=None):
+    """Reads the fields of some of the Terminals of a Passage in a binary format file, without reading the rest.
+
+    The file is memory-mapped, so only the requested Terminals' records and texts are read from it.
+
+    :param filename: file name to read from
+    :param start: index of the first Terminal to read
+    :param stop: index after the last Terminal to read, or None to read until the last one
+
+    :return: :class:`layer0.Columns` of the Terminals' fields
+    """
+    with open(filename, "rb") as h, mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        sections = _binary_sections(buffer)
+        terminals = sections["terminals"][start:stop]
+        strings = _BinaryStrings(sections)
+        text = tuple(None if t is None else sys.intern(t) for t in map(strings.__getitem__, terminals["text"].tolist()))
+        columns = layer0.Columns(position=terminals["position"].astype(int),
+                                 paragraph=terminals["paragraph"].astype(int),
+                                 para_pos=terminals["para_pos"].astype(int),
+                                 punct=terminals["punct"].copy(), text=text)
+        del sections, terminals, strings  # release the buffer before it is closed
+    return columns
+
+
+# Corpus archive: passages in the compact binary format, concatenated, followed by an index of their offsets and IDs
+CORPUS_ARCHIVE_MAGIC = b"UCCACRP\0"
+CORPUS_ARCHIVE_VERSION = 1
+CORPUS_ARCHIVE_EXTENSION = ".uca"
+_CORPUS_ARCHIVE_HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("count", "<u4"), ("index", "<u8")])
+_CORPUS_ARCHIVE_ENTRY = np.dtype([("offset", "<u8"), ("length", "<u8"), ("id_end", "<u8")])  # id_end: in ID bytes
+
+
+def write_corpus_archive(passages, filename):
+    """Writes Passages to a single corpus archive file, which can be read sequentially or by index/ID.
+
+    The passages are written one by one, so they do not have to be all in memory at once.
+
+    :param passages: iterable of Passage objects
+    :param filename: file name to write to
+
+    :return: number of passages written
+    """
+    entries = []
+    ids = []
+    with open(filename, "wb") as h:
+        offset = h.write(bytes(_CORPUS_ARCHIVE_HEADER.itemsize))
+        for passage in passages:
+            offset += h.write(bytes(-offset % _BINARY_ALIGNMENT))
+            data = to_binary(passage)
+            ids.append(str(passage.ID).encode("utf-8"))
+            entries.append((offset, len(data), sum(map(len, ids))))
+            offset += h.write(data)
+        offset += h.write(bytes(-offset % _BINARY_ALIGNMENT))
+        h.write(np.array(entries, dtype=_CORPUS_ARCHIVE_ENTRY).tobytes())
+        h.write(b"".join(ids))
+        h.seek(0)
+        h.write(np.array([(CORPUS_ARCHIVE_MAGIC, CORPUS_ARCHIVE_VERSION, len(entries), offset)],
+                         dtype=_CORPUS_ARCHIVE_HEADER).tobytes())
+    return len(entries)
+
+
+class CorpusArchive:
+    """Read access to a corpus archive file written by :func:`write_corpus_archive`.
+
+    The file is memory-mapped, and only its index is read when opened: each Passage is
+    read only when it is accessed, by position or by ID, in constant time.
+
+    Attributes:
+        filename: the archive file name
+        ids: list of the IDs of the Passages, in order
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as h:
+            self._buffer = mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = np.frombuffer(self._buffer, dtype=_CORPUS_ARCHIVE_HEADER, count=1)[0]
+            if header["magic"] != CORPUS_ARCHIVE_MAGIC.rstrip(b"\0"):
+                raise core.UCCAError("Not a UCCA corpus archive: '%s'" % filename)
+            if header["version"] != CORPUS_ARCHIVE_VERSION:
+                raise core.UCCAError("Unsupported UCCA corpus archive version: %d (expected %d)" %
+                                     (header["version"], CORPUS_ARCHIVE_VERSION))
+            count, index = int(header["count"]), int(header["index"])
+            del header
+            entries = np.frombuffer(self._buffer, dtype=_CORPUS_ARCHIVE_ENTRY, count=count, offset=index)
+            self._entries = entries[["offset", "length"]].tolist()
+            id_ends = [0] + entries["id_end"].tolist()
+            del entries
+            ids = self._buffer[index + count * _CORPUS_ARCHIVE_ENTRY.itemsize:]
+            self.ids = [ids[start:end].decode("utf-8") for start, end in zip(id_ends, id_ends[1:])]
+        except Exception:
+            self._buffer.close()
+            raise
+        self._positions = {}
+        for i, passage_id in enumerate(self.ids):
+            self._positions.setdefault(passage_id, i)
+
+    def index(self, passage_id):
+        """Returns the position of the (first) Passage with the given ID.
+
+        :raise KeyError: if there is no Passage with this ID in the archive
+        """
+        return self._positions[passage_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, passage_id):
+        return passage_id in self._positions
+
+    def __getitem__(self, key):
+        """Reads a Passage by its position (int) or by its ID (str)."""
+        offset, length = self._entries[self.index(key) if isinstance(key, str) else key]
+        return from_binary(self._buffer[offset:offset + length])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 def from_text(text, passage_id="1", tokenized=False, one_per_line=False, extra_format=None, lang="en",
               return_text=False, *args, **kwargs):
     """Converts from tokenized strings to a Passage object.
@@ -909,97 +1475,98 @@ def from_json(lines, *args, skip_category_mapping=False, by_external_id=False, *
         passage_id = external_id
     passage = core.Passage(str(passage_id), attrib=attrib)
 
-    # Create terminals
-    l0 = layer0.Layer0(passage)
-    token_id_to_terminal = {token["id"]: l0.add_terminal(
-        text=token["text"], punct=not token["require_annotation"], paragraph=1)
-        for token in sorted(d["tokens"], key=itemgetter("index_in_task"))}
-
-    # Create non-terminals
-    l1 = layer1.Layer1(passage)
-    tree_id_to_node = {}
-    token_id_to_preterminal = {}
-    category_name_to_edge_tag = {} if skip_category_mapping else EdgeTags.__dict__
-    # Assuming topological sort: parents always appear before children
-    for unit in sorted(d["annotation_units"], key=itemgetter("is_remote_copy")):  # Get non-remotes first
-        tree_id = unit["tree_id"]
-        remote = unit["is_remote_copy"]
-        cloned_from_tree_id = None
-        if remote:
-            cloned_from_tree_id = unit.get("cloned_from_tree_id")
-            if cloned_from_tree_id is None:
-                raise ValueError("Remote unit %s without cloned_from_tree_id" % tree_id)
-        elif tree_id in tree_id_to_node:
-            raise ValueError("Unit %s is repeated" % tree_id)
-        parent_tree_id = unit["parent_tree_id"]
-        if parent_tree_id is None:  # Root node: no need to create
-            tree_id_to_node[tree_id] = None
-            continue
-        try:
-            parent_node = tree_id_to_node[parent_tree_id]
-        except KeyError as e:
-            raise ValueError("Unit %s appears before its parent, %s" % (tree_id, parent_tree_id)) from e
-
-        unit_categories = []
-        for category in unit.get("categories", ()):
+    with core.PassageBuilder(passage):
+        # Create terminals
+        l0 = layer0.Layer0(passage)
+        token_id_to_terminal = {token["id"]: l0.add_terminal(
+            text=token["text"], punct=not token["require_annotation"], paragraph=1)
+            for token in sorted(d["tokens"], key=itemgetter("index_in_task"))}
+
+        # Create non-terminals
+        l1 = layer1.Layer1(passage)
+        tree_id_to_node = {}
+        token_id_to_preterminal = {}
+        category_name_to_edge_tag = {} if skip_category_mapping else EdgeTags.__dict__
+        # Assuming topological sort: parents always appear before children
+        for unit in sorted(d["annotation_units"], key=itemgetter("is_remote_copy")):  # Get non-remotes first
+            tree_id = unit["tree_id"]
+            remote = unit["is_remote_copy"]
+            cloned_from_tree_id = None
+            if remote:
+                cloned_from_tree_id = unit.get("cloned_from_tree_id")
+                if cloned_from_tree_id is None:
+                    raise ValueError("Remote unit %s without cloned_from_tree_id" % tree_id)
+            elif tree_id in tree_id_to_node:
+                raise ValueError("Unit %s is repeated" % tree_id)
+            parent_tree_id = unit["parent_tree_id"]
+            if parent_tree_id is None:  # Root node: no need to create
+                tree_id_to_node[tree_id] = None
+                continue
             try:
-                category_name = category.get("name") or categories[category["id"]]['name']
+                parent_node = tree_id_to_node[parent_tree_id]
             except KeyError as e:
-                raise ValueError("Category missing from layer: " + category["id"]) from e
-            c_tag = category_name_to_edge_tag.get(category_name.replace(" ", ""), category_name.replace(" ", "_"))
-            c_slot = category.get("slot", "")
-            c_data = categories[category["id"]]
-            c_layer = c_data['layer']
-            if c_layer == base_layer:
-                base_slot = c_slot
-            c_parent = c_data['parent']
-            if c_parent:   # make sure it is not empty
-                c_parent = category_name_to_edge_tag.get(c_parent['name'].replace(" ", ""),
-                                                         c_parent['name'].replace(" ", "_"))
-            unit_categories.append((c_tag, c_slot, c_layer, c_parent))
-
-        if not unit_categories:
-            raise ValueError("Unit %s has no categories" % tree_id)
-
-        edge_attrib = {}
-        for unit_category, *_ in unit_categories:
-            if unit_category == EdgeTags.Uncertain:
-                edge_attrib["uncertain"] = True
-            elif unit_category == COORDINATED_MAIN_REL:
-                edge_attrib[COORDINATED_MAIN_REL] = True
-        if not edge_attrib:
-            edge_attrib = None
-        unit_categories = [uc for uc in unit_categories if uc[0] not in IGNORED_ABBREVIATIONS]
-        children_tokens = [] if unit["type"] == "IMPLICIT" else unit["children_tokens"]
-        try:
-            terminal = token_id_to_terminal[children_tokens[0]["id"]] if len(children_tokens) == 1 else None
-        except (IndexError, KeyError):
-            terminal = None
-        if remote:
+                raise ValueError("Unit %s appears before its parent, %s" % (tree_id, parent_tree_id)) from e
+
+            unit_categories = []
+            for category in unit.get("categories", ()):
+                try:
+                    category_name = category.get("name") or categories[category["id"]]['name']
+                except KeyError as e:
+                    raise ValueError("Category missing from layer: " + category["id"]) from e
+                c_tag = category_name_to_edge_tag.get(category_name.replace(" ", ""), category_name.replace(" ", "_"))
+                c_slot = category.get("slot", "")
+                c_data = categories[category["id"]]
+                c_layer = c_data['layer']
+                if c_layer == base_layer:
+                    base_slot = c_slot
+                c_parent = c_data['parent']
+                if c_parent:   # make sure it is not empty
+                    c_parent = category_name_to_edge_tag.get(c_parent['name'].replace(" ", ""),
+                                                             c_parent['name'].replace(" ", "_"))
+                unit_categories.append((c_tag, c_slot, c_layer, c_parent))
+
+            if not unit_categories:
+                raise ValueError("Unit %s has no categories" % tree_id)
+
+            edge_attrib = {}
+            for unit_category, *_ in unit_categories:
+                if unit_category == EdgeTags.Uncertain:
+                    edge_attrib["uncertain"] = True
+                elif unit_category == COORDINATED_MAIN_REL:
+                    edge_attrib[COORDINATED_MAIN_REL] = True
+            if not edge_attrib:
+                edge_attrib = None
+            unit_categories = [uc for uc in unit_categories if uc[0] not in IGNORED_ABBREVIATIONS]
+            children_tokens = [] if unit["type"] == "IMPLICIT" else unit["children_tokens"]
             try:
-                node = tree_id_to_node[cloned_from_tree_id]
-            except KeyError as e:
-                raise ValueError("Remote copy %s refers to nonexistent unit: %s" %
-                                 (tree_id, cloned_from_tree_id)) from e
-            l1.add_remote_multiple(parent_node, unit_categories, node, edge_attrib=edge_attrib)
-        elif not skip_category_mapping and terminal and layer0.is_punct(terminal):
-            tree_id_to_node[tree_id] = l1.add_punct(None, terminal, base_layer, base_slot, edge_attrib=edge_attrib)
-        elif tree_id not in tree_id_to_node:
-            node = tree_id_to_node[tree_id] = l1.add_fnode_multiple(parent_node, unit_categories,
-                                                                    implicit=unit["type"] == "IMPLICIT",
-                                                                    edge_attrib=edge_attrib)
-            node.extra['tree_id'] = tree_id
-            comment = unit.get("comment")
-            if comment:
-                node.extra['remarks'] = comment
-            for token in children_tokens:
-                token_id_to_preterminal[token["id"]] = node
-
-    # Attach terminals to non-terminals
-    for token_id, node in token_id_to_preterminal.items():
-        terminal = token_id_to_terminal[token_id]
-        if skip_category_mapping or not layer0.is_punct(terminal):
-            node.add(EdgeTags.Terminal, terminal)
+                terminal = token_id_to_terminal[children_tokens[0]["id"]] if len(children_tokens) == 1 else None
+            except (IndexError, KeyError):
+                terminal = None
+            if remote:
+                try:
+                    node = tree_id_to_node[cloned_from_tree_id]
+                except KeyError as e:
+                    raise ValueError("Remote copy %s refers to nonexistent unit: %s" %
+                                     (tree_id, cloned_from_tree_id)) from e
+                l1.add_remote_multiple(parent_node, unit_categories, node, edge_attrib=edge_attrib)
+            elif not skip_category_mapping and terminal and layer0.is_punct(terminal):
+                tree_id_to_node[tree_id] = l1.add_punct(None, terminal, base_layer, base_slot, edge_attrib=edge_attrib)
+            elif tree_id not in tree_id_to_node:
+                node = tree_id_to_node[tree_id] = l1.add_fnode_multiple(parent_node, unit_categories,
+                                                                        implicit=unit["type"] == "IMPLICIT",
+                                                                        edge_attrib=edge_attrib)
+                node.extra['tree_id'] = tree_id
+                comment = unit.get("comment")
+                if comment:
+                    node.extra['remarks'] = comment
+                for token in children_tokens:
+                    token_id_to_preterminal[token["id"]] = node
+
+        # Attach terminals to non-terminals
+        for token_id, node in token_id_to_preterminal.items():
+            terminal = token_id_to_terminal[token_id]
+            if skip_category_mapping or not layer0.is_punct(terminal):
+                node.add(EdgeTags.Terminal, terminal)
 
     yield passage
 
@@ -1131,7 +1698,7 @@ def to_json(passage, *args, return_dict=False, tok_task=None, all_categories=Non
 
 def file2passage(filename):
     """Opens a file and returns its parsed Passage object
-    Tries to read both as a standard XML file and as a binary pickle
+    Tries to read both as a standard XML file and as a binary pickle, or in the compact binary format by extension
     :param filename: file name to write to
     """
     methods = [pickle2passage, xml2passage]
@@ -1141,8 +1708,10 @@ def file2passage(filename):
         del methods[0]
     elif ext == ".pickle":
         del methods[1]
+    elif ext == BINARY_EXTENSION:
+        methods = [binary2passage]
     else:
-        raise IOError("file2passage accepts only 'xml' and 'pickle' files.")
+        raise IOError("file2passage accepts only 'xml', 'pickle' and '%s' files." % BINARY_EXTENSION.lstrip("."))
     exception = None
     for method in methods:
         try:
@@ -1153,6 +1722,27 @@ def file2passage(filename):
         raise IOError("Failed reading '%s'" % filename) from exception
 
 
+def file2passages(filename):
+    """Opens a file and yields all Passage objects in it
+    Like file2passage, but a standard XML file may contain several passages, and is read by streaming,
+    and a corpus archive may also be read
+    :param filename: file name to read from
+    """
+    _, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext not in (".xml", CORPUS_ARCHIVE_EXTENSION):
+        yield file2passage(filename)
+        return
+    try:
+        if ext == CORPUS_ARCHIVE_EXTENSION:
+            with CorpusArchive(filename) as archive:
+                yield from archive
+        else:
+            yield from iter_standard(filename)
+    except Exception as e:
+        raise IOError("Failed reading '%s'" % filename) from e
+
+
 def xml2passage(filename):
     with open(filename, encoding="utf-8") as f:
         return from_standard(ET.ElementTree().parse(f))
@@ -1164,21 +1754,21 @@ def pickle2passage(filename):
 
 
 def passage2file(passage, filename, indent=True, binary=False):
-    """Writes a UCCA passage as a standard XML file or a binary pickle
+    """Writes a UCCA passage as a standard XML file or a binary pickle, or in the compact binary format by extension
     :param passage: passage object to write
     :param filename: file name to write to
     :param indent: whether to indent each line
     :param binary: whether to write pickle format (or XML)
     """
-    if binary:
+    if os.path.splitext(filename)[1].lower() == BINARY_EXTENSION:
+        with open(filename, "wb") as h:
+            h.write(to_binary(passage))
+    elif binary:
         with open(filename, "wb") as h:
             pickle.dump(passage, h)
     else:  # xml
-        root = to_standard(passage)
-        xml_string = ET.tostring(root).decode()
-        output = textutil.indent_xml(xml_string) if indent else xml_string
         with open(filename, "w", encoding="utf-8") as h:
-            h.write(output)
+            write_standard(passage, h, indent=indent)
 
 
 def split2sentences(passage, remarks=False, lang="en", ids=None):
@@ -1220,33 +1810,34 @@ def split_passage(passage, ends, remarks=False, ids=None, suffix_format="%03d",
             continue
         other = core.Passage(ID=index or ("%s" + suffix_format) % (passage.ID, i), attrib=passage.attrib.copy())
         other.extra = passage.extra.copy()
-        # Create terminals and find layer 1 nodes to be included
-        l0 = passage.layer(layer0.LAYER_ID)
-        other_l0 = layer0.Layer0(root=other, attrib=l0.attrib.copy())
-        other_l0.extra = l0.extra.copy()
-        level = set()
-        nodes = set()
-        id_to_other = {}
-        paragraphs = []
-        for terminal in l0.all[start:end]:
-            other_terminal = other_l0.add_terminal(terminal.text, terminal.punct, 1)
-            _copy_extra(terminal, other_terminal, remarks)
-            other_terminal.extra["orig_paragraph"] = terminal.paragraph
-            if terminal.paragraph not in paragraphs:
-                paragraphs.append(terminal.paragraph)
-            id_to_other[terminal.ID] = other_terminal
-            level.update(terminal.parents)
-            nodes.add(terminal)
-        while level:
-            nodes.update(level)
-            level = set(e.parent for n in level for e in n.incoming if not e.attrib.get("remote") and
-                        e.tag != layer1.EdgeTags.Punctuation and e.parent not in nodes)
-
-        other_l1 = layer1.Layer1(root=other, attrib=passage.layer(layer1.LAYER_ID).attrib.copy())
-        _copy_l1_nodes(passage, other, id_to_other, set(nodes), remarks=remarks)
-        attach_punct(other_l0, other_l1)
-        for j, paragraph in enumerate(paragraphs, start=1):
-            other_l0.doc(j)[:] = l0.doc(paragraph)
+        with core.PassageBuilder(other):
+            # Create terminals and find layer 1 nodes to be included
+            l0 = passage.layer(layer0.LAYER_ID)
+            other_l0 = layer0.Layer0(root=other, attrib=l0.attrib.copy())
+            other_l0.extra = l0.extra.copy()
+            level = set()
+            nodes = set()
+            id_to_other = {}
+            paragraphs = []
+            for terminal in l0.all[start:end]:
+                other_terminal = other_l0.add_terminal(terminal.text, terminal.punct, 1)
+                _copy_extra(terminal, other_terminal, remarks)
+                other_terminal.extra["orig_paragraph"] = terminal.paragraph
+                if terminal.paragraph not in paragraphs:
+                    paragraphs.append(terminal.paragraph)
+                id_to_other[terminal.ID] = other_terminal
+                level.update(terminal.parents)
+                nodes.add(terminal)
+            while level:
+                nodes.update(level)
+                level = set(e.parent for n in level for e in n.incoming if not e.attrib.get("remote") and
+                            e.tag != layer1.EdgeTags.Punctuation and e.parent not in nodes)
+
+            other_l1 = layer1.Layer1(root=other, attrib=passage.layer(layer1.LAYER_ID).attrib.copy())
+            _copy_l1_nodes(passage, other, id_to_other, set(nodes), remarks=remarks)
+            attach_punct(other_l0, other_l1)
+            for j, paragraph in enumerate(paragraphs, start=1):
+                other_l0.doc(j)[:] = l0.doc(paragraph)
         other.frozen = passage.frozen
         passages.append(other)
     return passages
@@ -1264,28 +1855,29 @@ def join_passages(passages, passage_id=None, remarks=False):
         raise ValueError("Cannot join empty list of passages")
     other = core.Passage(ID=passage_id or passages[0].ID, attrib=passages[0].attrib.copy())
     other.extra = passages[0].extra.copy()
-    l0 = passages[0].layer(layer0.LAYER_ID)
-    l1 = passages[0].layer(layer1.LAYER_ID)
-    other_l0 = layer0.Layer0(root=other, attrib=l0.attrib.copy())
-    layer1.Layer1(root=other, attrib=l1.attrib.copy())
-    id_to_other = {}
-    paragraph = 0
-    for passage in passages:
-        l0 = passage.layer(layer0.LAYER_ID)
-        paragraphs = set()
-        for terminal in l0.all:
-            if terminal.para_pos == 1:
-                paragraph += 1
-            orig_paragraph = terminal.extra.get("orig_paragraph")
-            if orig_paragraph is not None:
-                paragraph = orig_paragraph
-            paragraphs.add(paragraph)
-            other_terminal = other_l0.add_terminal(terminal.text, terminal.punct, paragraph)
-            _copy_extra(terminal, other_terminal, remarks)
-            id_to_other[terminal.ID] = other_terminal
-        for paragraph in paragraphs:
-            other_l0.doc(paragraph).extend(l0.doc(1))
-        _copy_l1_nodes(passage, other, id_to_other, remarks=remarks)
+    with core.PassageBuilder(other):
+        l0 = passages[0].layer(layer0.LAYER_ID)
+        l1 = passages[0].layer(layer1.LAYER_ID)
+        other_l0 = layer0.Layer0(root=other, attrib=l0.attrib.copy())
+        layer1.Layer1(root=other, attrib=l1.attrib.copy())
+        id_to_other = {}
+        paragraph = 0
+        for passage in passages:
+            l0 = passage.layer(layer0.LAYER_ID)
+            paragraphs = set()
+            for terminal in l0.all:
+                if terminal.para_pos == 1:
+                    paragraph += 1
+                orig_paragraph = terminal.extra.get("orig_paragraph")
+                if orig_paragraph is not None:
+                    paragraph = orig_paragraph
+                paragraphs.add(paragraph)
+                other_terminal = other_l0.add_terminal(terminal.text, terminal.punct, paragraph)
+                _copy_extra(terminal, other_terminal, remarks)
+                id_to_other[terminal.ID] = other_terminal
+            for paragraph in paragraphs:
+                other_l0.doc(paragraph).extend(l0.doc(1))
+            _copy_l1_nodes(passage, other, id_to_other, remarks=remarks)
     return other
 
 
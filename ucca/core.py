@@ -9,6 +9,10 @@ are connected between themselves and to Nodes in other layers using
 """
 
 import functools
+import gc
+import hashlib
+import types
+from collections import Counter
 
 # Max number of digits allowed for a unique ID
 UNIQUE_ID_MAX_DIGITS = 5
@@ -16,6 +20,12 @@ UNIQUE_ID_MAX_DIGITS = 5
 # Attribute to ignore when comparing entities
 IRRELEVANT_ATTRIBUTES = {"uncertain"}
 
+# Max number of node IDs whose ordering keys are cached
+ID_ORDERKEY_CACHE_SIZE = 2 ** 16
+
+# Shared by all elements with no attributes, until one is set
+_EMPTY_ATTRIB = types.MappingProxyType({})
+
 
 # Used as the default ordering key function for ordered objects, namely
 # :class:`Layer` and :class:`Node` .
@@ -30,7 +40,13 @@ def id_orderkey(node):
         first order lexicography the layer ID then numerically the unique ID.
 
     """
-    layer, unique = node.ID.split(Node.ID_SEPARATOR)
+    return _id_orderkey(node.ID)
+
+
+@functools.lru_cache(maxsize=ID_ORDERKEY_CACHE_SIZE)
+def _id_orderkey(ID):
+    # Node IDs are immutable and repeat across passages, so the key is computed once per ID
+    layer, unique = ID.split(Node.ID_SEPARATOR)
     return "{} {:>{}}".format(layer, unique, UNIQUE_ID_MAX_DIGITS)
 
 
@@ -50,6 +66,108 @@ def edge_id_orderkey(edge):
                                  id_orderkey(edge.child))
 
 
+def _insert_ordered(edges, edge, orderkey):
+    """Adds an Edge to a list of Edges ordered by the given key function.
+
+    With the default :func:`edge_id_orderkey`, the order depends only on IDs,
+    so the list is already ordered, and the Edge is inserted by binary search
+    (after any Edges with an equal key, as a stable sort would place it).
+    Other key functions may depend on mutable attributes, so the list is
+    always re-sorted.
+
+    """
+    if orderkey is not edge_id_orderkey:
+        edges.append(edge)
+        edges.sort(key=orderkey)
+        return
+    key = orderkey(edge)
+    low, high = 0, len(edges)
+    if high and key < orderkey(edges[-1]):
+        while low < high:
+            middle = (low + high) // 2
+            if key < orderkey(edges[middle]):
+                high = middle
+            else:
+                low = middle + 1
+    else:
+        low = high
+    edges.insert(low, edge)
+
+
+def canonical_value(value):
+    """Returns a form of an attribute value with the same repr as all values equal to it.
+
+    Numbers equal to an integer (e.g. 1.0 and True, which equal 1) become
+    that integer, and dicts and sets are sorted, recursively, so that
+    canonical hashes agree with comparison by ==.
+
+    :param value: attribute value
+    :return: canonical form of the value, to take the repr of
+
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, int, float)):
+        return int(value) if value == value and abs(value) != float("inf") and value == int(value) else value
+    if isinstance(value, (list, tuple)):
+        return type(value)(map(canonical_value, value))
+    if isinstance(value, dict):
+        return "dict", sorted(((canonical_value(k), canonical_value(v)) for k, v in value.items()), key=repr)
+    if isinstance(value, (set, frozenset)):
+        return "set", sorted(map(canonical_value, value), key=repr)
+    return value
+
+
+def canonical_hashes(nodes, *, ordered=False, ignore_node=None, ignore_edge=None, hashes=None):
+    """Computes canonical structural hashes of Nodes and of all their descendants.
+
+    The hashes are Merkle-style: the hash of a Node is computed from its own
+    tag and relevant attributes, together with the tag, attributes and child
+    hash of each of its outgoing Edges. Each Node is hashed once, bottom-up,
+    so two Nodes have the same hash iff they are recursively Node-equal with
+    the same arguments (see :meth:`Node.equals`), up to SHA-1 collisions.
+
+    :param nodes: iterable of Node objects to hash
+    :param ordered: whether the order of the outgoing Edges matters
+    :param ignore_node: function that returns whether to ignore a given node
+    :param ignore_edge: function that returns whether to ignore a given edge
+    :param hashes: dictionary returned by a previous call with the same
+            arguments, to add the new hashes to instead of computing them again
+
+    :return: dictionary from id() of each Node to its hash (bytes)
+
+    """
+    if hashes is None:
+        hashes = {}
+    for root in nodes:
+        if id(root) in hashes:
+            continue
+        waiting = [(root, False)]
+        on_path = set()  # hashed only after all their descendants, so a child on the path means a cycle
+        while waiting:
+            node, expanded = waiting.pop()
+            if expanded:
+                on_path.remove(id(node))
+                hashes[id(node)] = node._canonical_hash(
+                    [_edge_hash(edge, hashes.get(id(edge.child), b""))
+                     for edge in _relevant_edges(node, ignore_node, ignore_edge)], ordered)
+            elif id(node) not in hashes and id(node) not in on_path:
+                on_path.add(id(node))
+                waiting.append((node, True))
+                waiting += [(edge.child, False) for edge in _relevant_edges(node, ignore_node, ignore_edge)
+                            if id(edge.child) not in hashes and id(edge.child) not in on_path]
+    return hashes
+
+
+def _relevant_edges(node, ignore_node=None, ignore_edge=None):
+    return [edge for edge in node._outgoing if (ignore_node is None or not ignore_node(edge.child)) and (
+        ignore_edge is None or not ignore_edge(edge))]
+
+
+def _edge_hash(edge, child_hash):
+    return hashlib.sha1(repr((edge.tag, edge._attrib._relevant_items())).encode("utf-8") + child_hash).digest()
+
+
 class UCCAError(Exception):
     """Base class for all UCCA package exceptions."""
     pass
@@ -104,9 +222,18 @@ class ModifyPassage:
     def __init__(self, fn):
         self.fn = fn
 
+        # Created once here rather than on every call, as modifications are very frequent
+        @functools.wraps(fn)
+        def decorated(obj, *args, **kwargs):
+            if obj.root.frozen:
+                raise FrozenPassageError(obj.root.ID)
+            return fn(obj, *args, **kwargs)
+
+        self._decorated = decorated
+
     def __get__(self, obj, cls):
         """Used to bind the function to the instance (add 'self')."""
-        return functools.partial(self.__call__, obj)
+        return self if obj is None else types.MethodType(self._decorated, obj)
 
     def __call__(self, *args, **kwargs):
         """Decorating functions which modify :class:`Passage` elements.
@@ -119,14 +246,7 @@ class ModifyPassage:
         :raise FrozenPassageError: if the :class:`Passage` is frozen and can't be
                 modified.
         """
-
-        @functools.wraps(self.fn)
-        def decorated(*args, **kwargs):
-            if args[0].root.frozen:
-                raise FrozenPassageError(args[0].root.ID)
-            return self.fn(*args, **kwargs)
-
-        return decorated(*args, **kwargs)
+        return self._decorated(*args, **kwargs)
 
 
 class _AttributeDict:
@@ -137,14 +257,34 @@ class _AttributeDict:
     dictionary is adhering to :class:`Passage` frozen status and modification
     decorators.
 
+    The underlying dictionary is only allocated once an attribute is set.
+
     Attributes:
         root: the Passage this object is linked with
+        owner: optional object to notify (by calling its _attrib_changed
+            method) after the attributes are changed
 
     """
 
-    def __init__(self, root, mapping=None):
+    __slots__ = ("_root", "_dict", "_owner")
+
+    def __init__(self, root, mapping=None, owner=None):
         self._root = root
-        self._dict = mapping.copy() if mapping is not None else dict()
+        self._dict = mapping.copy() if mapping else _EMPTY_ATTRIB
+        self._owner = owner
+
+    def __getstate__(self):
+        return dict(_root=self._root, _dict=dict(self._dict))
+
+    def __setstate__(self, state):
+        self._root = state["_root"]
+        self._dict = state["_dict"] or _EMPTY_ATTRIB
+        self._owner = None  # linked again by the owner
+
+    def _writable(self):
+        if self._dict is _EMPTY_ATTRIB:
+            self._dict = {}
+        return self._dict
 
     def __getitem__(self, key):
         return self._dict[key]
@@ -164,6 +304,10 @@ class _AttributeDict:
 
         return omit_irrelevant(self._dict) == omit_irrelevant(other._dict)
 
+    def _relevant_items(self):
+        """Returns the items compared by :meth:`equals`, sorted by key, in canonical form for hashing."""
+        return sorted((k, canonical_value(v)) for k, v in self._dict.items() if k not in IRRELEVANT_ATTRIBUTES)
+
     @property
     def root(self):
         return self._root
@@ -171,17 +315,24 @@ class _AttributeDict:
     def copy(self):
         return self._dict.copy()
 
+    def _changed(self):
+        if self._owner is not None:
+            self._owner._attrib_changed()
+
     @ModifyPassage
     def __setitem__(self, key, value):
-        self._dict[key] = value
+        self._writable()[key] = value
+        self._changed()
 
     @ModifyPassage
     def update(self, values):
-        self._dict.update(values)
+        self._writable().update(values)
+        self._changed()
 
     @ModifyPassage
     def __delitem__(self, key):
-        del self._dict[key]
+        del self._writable()[key]
+        self._changed()
 
     def __len__(self):
         return len(self._dict)
@@ -190,18 +341,61 @@ class _AttributeDict:
         return self._dict.items()
 
 
-class Category:
+class _Slotted:
+    """Base class for the numerous, memory-compact elements of a :class:`Passage`.
+
+    Subclasses list their attributes in ``__slots__`` rather than keeping a
+    per-instance ``__dict__``, and allocate the ``extra`` dictionary only when
+    it is first accessed.
+    Pickled state is a dictionary as it was before ``__slots__`` were used,
+    so that existing pickle files can be loaded and vice versa.
+    Slots listed in ``_CACHE_SLOTS`` hold values computed from the others,
+    and are not pickled.
+
+    """
+
+    __slots__ = ("_extra",)
+    _CACHE_SLOTS = ()
+
+    @property
+    def extra(self):
+        if self._extra is None:
+            self._extra = {}
+        return self._extra
+
+    @extra.setter
+    def extra(self, value):
+        self._extra = value
+
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for key in cls.__dict__.get("__slots__", ()):
+                if key != "_extra" and key not in self._CACHE_SLOTS and hasattr(self, key):
+                    state[key] = getattr(self, key)
+        state["extra"] = self.extra
+        return state
+
+    def __setstate__(self, state):
+        self._extra = None
+        for key, value in state.items():
+            setattr(self, key, value)
+
+
+class Category(_Slotted):
     """when considering refinement layers, each edge can have multiple tags sorted in a certain hierarchy.
     for this reason, a category must include not only the tag information but also the layer and hierarchy
     information.
     """
 
+    __slots__ = ("_tag", "_slot", "_layer", "_parent")
+
     def __init__(self, tag, slot=None, layer=None, parent=None):
         self._tag = tag
         self._slot = slot if slot else ""
         self._layer = layer if layer else ""
         self._parent = parent if parent else ""
-        self.extra = {}
+        self._extra = None
 
     @property
     def tag(self):
@@ -234,7 +428,7 @@ class Category:
         return iter((self.tag, self.slot, self.layer, self.parent))
 
 
-class Edge:
+class Edge(_Slotted):
     """Labeled edge between two :class:`Node` objects in UCCA annotation graph.
 
     An edge between Nodes in a :class:`Passage` is a simple object; it is a
@@ -260,6 +454,8 @@ class Edge:
 
     ID_FORMAT = "{}->{}"
 
+    __slots__ = ("_root", "_parent", "_child", "_attrib", "_categories")
+
     def __init__(self, root, parent, child, tag=None, attrib=None):
         """Creates a new :class:`Edge` object.
 
@@ -274,9 +470,17 @@ class Edge:
         self._root = root
         self._parent = parent
         self._child = child
-        self._attrib = _AttributeDict(root, attrib)
+        self._attrib = _AttributeDict(root, attrib, owner=self)
         self._categories = [Category(tag)] if tag else []
-        self.extra = {}
+        self._extra = None
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._attrib._owner = self
+
+    def _attrib_changed(self):
+        # Attributes such as "remote" determine which terminals are in the span of the parent
+        self._parent._invalidate_spans()
 
     @property
     def tag(self):
@@ -354,9 +558,12 @@ class Edge:
     @ModifyPassage
     def add(self, tag, slot="", layer="", parent=""):
         """ adds a new category to the edge"""
+        return self._add(tag, slot, layer, parent)
+
+    def _add(self, tag, slot="", layer="", parent=""):
         c = Category(tag, slot, layer, parent)
         self.categories.append(c)
-        if c.tag not in self.root.categories:
+        if c.tag not in self.root._categories:
             self.root._update_categories(c)
         if c.parent and c.parent not in self.root.refined_categories:
             self.root._update_refined_categories(c.parent)
@@ -369,7 +576,7 @@ class Edge:
         return self.categories[index]
 
 
-class Node:
+class Node(_Slotted):
     """Labeled Node in UCCA annotation graph.
 
     A Node in :class:`Passage` UCCA annotation is an vertex in the annotation
@@ -398,6 +605,8 @@ class Node:
 
     ID_SEPARATOR = '.'
 
+    __slots__ = ("_tag", "_root", "_ID", "_attrib", "_outgoing", "_incoming", "_orderkey")
+
     def __init__(self, ID, root, tag, attrib=None, *,
                  orderkey=edge_id_orderkey):
         """Creates a new :class:`Node` object.
@@ -413,8 +622,8 @@ class Node:
         self._tag = tag
         self._root = root
         self._ID = ID
-        self._attrib = _AttributeDict(root, attrib)
-        self.extra = {}
+        self._attrib = _AttributeDict(root, attrib, owner=self)
+        self._extra = None
         self._outgoing = []
         self._incoming = []
         self._orderkey = orderkey
@@ -426,6 +635,13 @@ class Node:
         except KeyError as e:
             raise ValueError("Invalid layer '%s' in node ID '%s'" % (self.layer.ID, self._ID)) from e
 
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._attrib._owner = self
+
+    def _attrib_changed(self):
+        pass
+
     @property
     def tag(self):
         return self._tag
@@ -501,10 +717,8 @@ class Node:
                     child=node, attrib=edge_attrib)
         for category in edge_categories:
             edge.add(*category)
-        self._outgoing.append(edge)
-        self._outgoing.sort(key=self._orderkey)
-        node._incoming.append(edge)
-        node._incoming.sort(key=node._orderkey)
+        _insert_ordered(self._outgoing, edge, self._orderkey)
+        _insert_ordered(node._incoming, edge, node._orderkey)
         self.root._add_edge(edge)
         return edge
 
@@ -606,31 +820,20 @@ class Node:
             return False
         if not recursive:
             return True
-        edges, other_edges = [[edge for edge in node
-                               if (ignore_node is None or
-                                   not ignore_node(edge.child)) and (
-                                       ignore_edge is None or
-                                       not ignore_edge(edge))]
-                              for node in (self, other)]
-        if len(edges) != len(other_edges):
-            return False  # not necessary, but gives better performance
-        if ordered:
-            return all(e1.equals(e2, ordered=True,
-                                 ignore_node=ignore_node, ignore_edge=ignore_edge)
-                       for e1, e2 in zip(edges, other_edges))
-        # For unordered equality, I try to find & remove an equivalent
-        # Edge + Node couple from other's Edges until exhausted.
-        # Because both Edge-equality and Node-equality are equivalence
-        # classes, I can just take the first I found and remove it w/o
-        # trying to iterate through possible orders.
-        try:
-            for e1 in edges:
-                other_edges.remove(next(e2 for e2 in other_edges
-                                        if e1.equals(e2, ignore_node=ignore_node,
-                                                     ignore_edge=ignore_edge)))
-        except StopIteration:
-            return False
-        return not other_edges
+        hashes = canonical_hashes((self, other), ordered=ordered, ignore_node=ignore_node, ignore_edge=ignore_edge)
+        return hashes[id(self)] == hashes[id(other)]
+
+    def _canonical_hash(self, edge_hashes, ordered=False):
+        """Returns the hash of this Node given the hashes of its outgoing Edges (see :func:`canonical_hashes`).
+
+        :param edge_hashes: list of hashes of the (relevant) outgoing Edges, in order
+        :param ordered: whether the order of the Edges matters
+
+        """
+        h = hashlib.sha1(repr((self.tag, self._attrib._relevant_items())).encode("utf-8"))
+        for edge_hash in edge_hashes if ordered else sorted(edge_hashes):
+            h.update(edge_hash)
+        return h.digest()
 
     def missing_edges(self, other, ignore_node=None):
         """Returns edges present in this node but missing in the other.
@@ -641,11 +844,10 @@ class Node:
         :return: List of edges present in this node but missing in the other.
 
         """
-        edges, other_edges = [[edge for edge in node
-                               if ignore_node is None or
-                               not ignore_node(edge.child)]
-                              for node in (self, other)]
-        return sorted([e1 for e1 in edges if not any(e1.equals(e2) for e2 in other_edges)],
+        edges, other_edges = [_relevant_edges(node, ignore_node) for node in (self, other)]
+        hashes = canonical_hashes(edge.child for edge in edges + other_edges)
+        other_hashes = {_edge_hash(e2, hashes[id(e2.child)]) for e2 in other_edges}
+        return sorted([e1 for e1 in edges if _edge_hash(e1, hashes[id(e1.child)]) not in other_hashes],
                       key=edge_id_orderkey)
 
     def iter(self, obj="nodes", method="dfs", duplicates=False, key=None):
@@ -690,6 +892,14 @@ class Node:
             else:
                 waiting = to_add + waiting
 
+    def _invalidate_spans(self):
+        """Called after the Nodes under this Node have changed, as anything cached about them may be stale.
+
+        Nodes do not cache anything about their span by default, but subclasses may override it.
+
+        """
+        pass
+
     def get_terminals(self, *args, **kwargs):
         """Returns a list of all terminals under the span of this Node."""
         return [t for e in self._outgoing for t in e.child.get_terminals(*args, **kwargs)]
@@ -720,6 +930,9 @@ class Layer:
 
     """
 
+    # Internal attributes for lazy ordering of the node lists, which are pickled as plain lists instead
+    _ORDER_STATE = ("_all_nodes", "_all_sorted", "_head_nodes", "_heads_sorted")
+
     def __init__(self, ID, root, attrib=None, *, orderkey=id_orderkey):
         """Creates a new :class:`Layer` object.
 
@@ -735,11 +948,23 @@ class Layer:
         self._root = root
         self._attrib = _AttributeDict(root, attrib)
         self.extra = {}
+        self._orderkey = orderkey
         self._all = []
         self._heads = []
-        self._orderkey = orderkey
         root._add_layer(self)
 
+    def __getstate__(self):
+        # Keep the pickled form of the node lists as it was before their lazy ordering
+        state = {k: v for k, v in self.__dict__.items() if k not in self._ORDER_STATE}
+        state.update(_all=self._all, _heads=self._heads)
+        return state
+
+    def __setstate__(self, state):
+        all_nodes, heads = state.pop("_all"), state.pop("_heads")
+        self.__dict__.update(state)
+        self._all = all_nodes
+        self._heads = heads
+
     @property
     def ID(self):
         return self._ID
@@ -760,6 +985,31 @@ class Layer:
     def heads(self):
         return self._heads[:]
 
+    @property
+    def _all(self):
+        """Nodes list, sorted only when accessed after a change that may have broken its order."""
+        if not self._all_sorted:
+            self._all_nodes.sort(key=self._orderkey)
+            self._all_sorted = True
+        return self._all_nodes
+
+    @_all.setter
+    def _all(self, nodes):
+        self._all_nodes = list(nodes)
+        self._all_sorted = False
+
+    @property
+    def _heads(self):
+        """Heads list, built from the unordered set of heads only when accessed after a change."""
+        if self._heads_sorted is None:
+            self._heads_sorted = sorted(self._head_nodes.values(), key=self._orderkey)
+        return self._heads_sorted
+
+    @_heads.setter
+    def _heads(self, nodes):
+        self._head_nodes = {id(node): node for node in nodes}  # by identity, to avoid calling Node.__hash__
+        self._heads_sorted = None
+
     @property
     def orderkey(self):
         return self._orderkey
@@ -767,8 +1017,12 @@ class Layer:
     @orderkey.setter
     def orderkey(self, value):
         self._orderkey = value
-        self._all.sort(key=value)
-        self._heads.sort(key=value)
+        self._all_sorted = False
+        self._heads_sorted = None
+
+    def _is_static_order(self):
+        """Whether the order relies only on the (immutable) node IDs, and so cannot change by adding edges."""
+        return self._orderkey is id_orderkey
 
     def equals(self, other, *, ordered=False, ignore_node=None, ignore_edge=None):
         """Returns whether two Layer objects are equal.
@@ -795,20 +1049,10 @@ class Layer:
                               for layer in (self, other)]
         if len(heads) != len(other_heads):
             return False  # can be removed, here for performance gain
-        if ordered:
-            return all(x1.equals(x2, ordered=True,
-                                 ignore_node=ignore_node, ignore_edge=ignore_edge)
-                       for x1, x2 in zip(heads, other_heads))
-        # I can just find the first equal head in unordered search, as
-        # Node-equality is an equivalence class (see their for details).
-        try:
-            for h1 in heads:
-                other_heads.remove(next(h2 for h2 in other_heads
-                                        if h1.equals(h2, ignore_node=ignore_node,
-                                                     ignore_edge=ignore_edge)))
-        except StopIteration:
-            return False
-        return not other_heads
+        hashes = canonical_hashes(heads + other_heads, ordered=ordered,
+                                  ignore_node=ignore_node, ignore_edge=ignore_edge)
+        heads, other_heads = [[hashes[id(head)] for head in layer_heads] for layer_heads in (heads, other_heads)]
+        return heads == other_heads if ordered else Counter(heads) == Counter(other_heads)
 
     def _add_edge(self, edge):
         """Alters self.heads if an :class:`Edge` has been added to the subgraph.
@@ -819,11 +1063,10 @@ class Layer:
         :param edge: the Edge added to the Layer subgraph
 
         """
-        if edge.child in self._heads:
-            self._heads.remove(edge.child)
-        # Order may depend on edges, so re-order
-        self._all.sort(key=self._orderkey)
-        self._heads.sort(key=self._orderkey)
+        if self._head_nodes.pop(id(edge.child), None) is not None:
+            self._heads_sorted = None
+        # Order may depend on edges, so re-order on next access
+        self._invalidate_order()
 
     def _remove_edge(self, edge):
         """Alters self.heads if an :class:`Edge` has been removed.
@@ -835,11 +1078,15 @@ class Layer:
 
         """
         if edge.child.layer == self and all(p.layer != self for p in edge.child.parents):
-            self._heads.append(edge.child)
-            self._heads.sort(key=self._orderkey)
-        # Order may depend on edges, so re-order
-        self._all.sort(key=self._orderkey)
-        self._heads.sort(key=self._orderkey)
+            self._head_nodes[id(edge.child)] = edge.child
+            self._heads_sorted = None
+        # Order may depend on edges, so re-order on next access
+        self._invalidate_order()
+
+    def _invalidate_order(self):
+        if not self._is_static_order():
+            self._all_sorted = False
+            self._heads_sorted = None
 
     def _add_node(self, node):
         """Adds a :class:`node` to the :class:`Layer`.
@@ -847,10 +1094,13 @@ class Layer:
         Assumes node has no incoming or outgoing :class:`Edge` objects.
 
         """
-        self._all.append(node)
-        self._all.sort(key=self._orderkey)
-        self._heads.append(node)
-        self._heads.sort(key=self._orderkey)
+        # Nodes are usually added in order, in which case no sorting is needed
+        if self._all_sorted and self._all_nodes and (
+                not self._is_static_order() or self._orderkey(node) < self._orderkey(self._all_nodes[-1])):
+            self._all_sorted = False
+        self._all_nodes.append(node)
+        self._head_nodes[id(node)] = node
+        self._heads_sorted = None
 
     def _remove_node(self, node):
         """Removes a :class:`node` from the :class:`Layer`.
@@ -858,8 +1108,19 @@ class Layer:
         Assumes node has no incoming or outgoing :class:`Edge` objects.
 
         """
-        self._all.remove(node)
-        self._heads.remove(node)
+        self._all_nodes.remove(node)
+        del self._head_nodes[id(node)]
+        self._heads_sorted = None
+
+    def _finalize(self):
+        """Updates anything whose maintenance was deferred while building in bulk.
+
+        Called once by :class:`PassageBuilder` when done building the Passage.
+        The order of Nodes is maintained lazily anyway, so there is nothing
+        to do here, but subclasses may override it.
+
+        """
+        pass
 
     def _change_edge_tag(self, edge, old_tag):
         """Updates the :class:`Layer` objects with the change.
@@ -898,6 +1159,9 @@ class Passage:
 
     """
 
+    # The PassageBuilder currently building this Passage in bulk, if any
+    _builder = None
+
     def __init__(self, ID, attrib=None):
         """Creates a new :class:`Passage` object.
 
@@ -997,11 +1261,31 @@ class Passage:
                                if ignore_node is None or
                                not ignore_node(node)]
                               for passage in (self, other)]
-        return sorted([n1 for n1 in nodes
-                       if not any(n1.equals(n2, ignore_node=ignore_node,
-                                            ignore_edge=ignore_edge)
-                                  for n2 in other_nodes)],
-                      key=id_orderkey)
+        hashes = canonical_hashes(nodes + other_nodes, ignore_node=ignore_node, ignore_edge=ignore_edge)
+        other_hashes = {hashes[id(n2)] for n2 in other_nodes}
+        return sorted([n1 for n1 in nodes if hashes[id(n1)] not in other_hashes], key=id_orderkey)
+
+    def fingerprint(self, *, ordered=False):
+        """Returns a canonical hash of the passage contents, e.g. for finding duplicates in a corpus.
+
+        Passages have the same fingerprint iff they are Passage-equivalent
+        (see :meth:`equals`), up to SHA-1 collisions. In particular, the
+        Passage ID is not included.
+
+        :param ordered: whether the order of heads and edges matters
+
+        :return: hex digest string
+
+        """
+        h = hashlib.sha1(repr(self._attrib._relevant_items()).encode("utf-8"))
+        for lid, layer in sorted(self._layers.items()):
+            heads = layer.heads
+            hashes = canonical_hashes(heads, ordered=ordered)
+            heads = [hashes[id(head)] for head in heads]
+            h.update(repr((lid, layer._attrib._relevant_items(), len(heads))).encode("utf-8"))
+            for head_hash in heads if ordered else sorted(heads):
+                h.update(head_hash)
+        return h.hexdigest()
 
     def copy(self, layers=None):
         """Copies the Passage and specified layers to a new object.
@@ -1145,3 +1429,82 @@ class Passage:
             return str(self._layers[max(self._layers)].heads[0])
         except (KeyError, ValueError, IndexError):
             return super().__str__()
+
+
+class PassageBuilder:
+    """Context manager for building a :class:`Passage` in bulk.
+
+    Loaders add all Nodes and Edges of a Passage at once, so there is no need
+    to keep structures derived from the whole graph up to date after each
+    addition. Inside the context, :class:`Layer` objects defer such
+    maintenance (e.g. the top-level scenes of layer 1), and update it once
+    when the context is exited. Nested contexts for the same Passage are
+    merged into the outermost one.
+
+    The Passage is checked for being frozen once when entering the context,
+    so :meth:`add_edge` and :meth:`add_edges` skip the per-call checks done
+    by :meth:`Node.add_multiple`. Any other modification is allowed too.
+
+    Garbage collection is paused inside the context: the many objects created
+    would otherwise trigger repeated collections, which find nothing to
+    collect as they are all still referenced by the Passage.
+
+    Attributes:
+        passage: the Passage being built
+
+    """
+
+    def __init__(self, passage):
+        self.passage = passage
+        self._outermost = False
+        self._gc_was_enabled = False
+
+    def __enter__(self):
+        if self.passage.frozen:
+            raise FrozenPassageError(self.passage.ID)
+        if self.passage._builder is None:
+            self.passage._builder = self
+            self._outermost = True
+            self._gc_was_enabled = gc.isenabled()
+            gc.disable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._outermost:
+            self.passage._builder = None
+            self._outermost = False
+            if self._gc_was_enabled:
+                gc.enable()
+            if exc_type is None:
+                for layer in self.passage.layers:
+                    layer._finalize()
+
+    def add_edge(self, parent, child, categories=(), attrib=None):
+        """Adds an :class:`Edge` from parent to child.
+
+        :param parent: the Node to add the Edge from
+        :param child: the Node to add the Edge to
+        :param categories: a list of 4-tuples representing the categories on the Edge
+        :param attrib: dictionary of attributes to be passed to the Edge initializer
+
+        :return: the newly created Edge object
+
+        """
+        edge = Edge(root=self.passage, parent=parent, child=child, attrib=attrib)
+        for category in categories:
+            edge._add(*category)
+        _insert_ordered(parent._outgoing, edge, parent._orderkey)
+        _insert_ordered(child._incoming, edge, child._orderkey)
+        parent.layer._add_edge(edge)
+        return edge
+
+    def add_edges(self, edges):
+        """Adds multiple Edges.
+
+        :param edges: iterable of (parent, child, categories, attrib) tuples,
+                as the arguments to :meth:`add_edge`
+
+        :return: list of the newly created Edge objects
+
+        """
+        return [self.add_edge(*edge) for edge in edges]
@@ -9,12 +9,17 @@ v1.4
 2019-01-22: support multiple categories per edge
 2019-11-29: evaluate implicit nodes too (by their parent's yield)
 """
-from collections import Counter, OrderedDict
-from itertools import groupby
+import hashlib
+import os
+import pickle
+import weakref
+from collections import OrderedDict
 from operator import attrgetter
 
-from ucca import layer0, layer1, normalization
-from ucca.constructions import get_by_names, create_passage_yields, PRIMARY, DEFAULT, ALL_EDGES
+import numpy as np
+
+from ucca import core, convert, layer0, layer1, normalization
+from ucca.constructions import get_by_names, get_node_yield, create_passage_yields, Yield, PRIMARY, DEFAULT, ALL_EDGES
 from ucca.layer1 import EdgeTags, NodeTags
 
 UNLABELED = "unlabeled"
@@ -32,23 +37,247 @@ EQUIV = ((EdgeTags.Process, EdgeTags.State),
 
 def get_yield(unit):
     try:
-        return frozenset(t.position for t in unit.get_terminals(punct=False))
+        return get_node_yield(unit, punct=False)
     except ValueError:
-        return frozenset()
+        return Yield()
+
+
+def function_units(p):
+    """
+    :return: dict of yield -> unit, for the units in the passage that are Fs
+    """
+    return {get_yield(u): u for u in p.layer(layer1.LAYER_ID).all
+            if u.tag == NodeTags.Foundational and u.ftag == EdgeTags.Function}
+
+
+def function_moves(p1, p2):
+    """
+    Find the common Fs, to be moved to the root
+    :return: pair of lists of units: the Fs in p1 and the corresponding Fs in p2
+    """
+    f1, f2 = map(function_units, (p1, p2))
+    common = f1.keys() & f2.keys()  # yields corresponding to a Function in both passages
+    return [[f[positions] for positions in common] for f in (f1, f2)]
 
 
 def move_functions(p1, p2):
     """
     Move any common Fs to the root
     """
-    f1, f2 = [{get_yield(u): u for u in p.layer(layer1.LAYER_ID).all
-               if u.tag == NodeTags.Foundational and u.ftag == EdgeTags.Function} for p in (p1, p2)]
-    for positions in f1.keys() & f2.keys():  # positions is a yield corresponding to a Function in both passages
-        for (p, unit) in ((p1, f1[positions]), (p2, f2[positions])):
+    for p, units in zip((p1, p2), function_moves(p1, p2)):
+        for unit in units:
             unit.fparent.remove(unit)  # Remove from current primary parent (but preserve remote parents)
             p.layer(layer1.LAYER_ID).heads[0].add(EdgeTags.Function, unit)  # Add to root
 
 
+class PassageView:
+    """
+    Overlay of a passage with some units moved to the root, without modifying the passage itself.
+    Edges and yields are taken through the view by constructions.extract_candidates, as if the units were moved.
+    """
+    def __init__(self, passage, units=()):
+        """
+        :param passage: Passage object to view
+        :param units: units to move to the root as Fs
+        """
+        self.passage = passage
+        self.root = passage.layer(layer1.LAYER_ID).heads[0]
+        self._removed = set()  # IDs of Edge objects removed from the passage
+        self._added = []  # new Edges from the root, not attached to the passage
+        self._affected = set()  # IDs of nodes whose yields change, namely primary ancestors of removed edges
+        self._terminals = {}
+        self._yields = {}
+        for unit in units:
+            self.move(unit)
+
+    def move(self, unit, tag=EdgeTags.Function):
+        """
+        Move a unit from its primary parent to the root, as in move_functions (preserving remote parents)
+        :param unit: layer1.FoundationalNode to move
+        :param tag: category of the new edge from the root
+        """
+        parent = unit.fparent
+        self._removed.add(id(next(e for e in parent if e.child is unit)))
+        self._added.append(core.Edge(self.passage, self.root, unit, tag))
+        nodes = [parent]
+        while nodes:
+            node = nodes.pop()
+            if id(node) not in self._affected:
+                self._affected.add(id(node))
+                nodes += [e.parent for e in node.incoming if not e.attrib.get("remote")]
+        self._terminals.clear()
+        self._yields.clear()
+
+    def outgoing(self, node):
+        edges = [e for e in node if id(e) not in self._removed] if self._removed else list(node)
+        return edges + self._added if node is self.root else edges
+
+    def get_terminals(self, node, punct=True):
+        """
+        :param node: Node to find the terminals under, by primary edges in the view
+        :param punct: whether to include punctuation Terminals
+        :return: list of layer0.Terminal objects sorted by position
+        """
+        if id(node) not in self._affected:
+            return node.get_terminals(punct=punct)
+        key = (id(node), punct)
+        terminals = self._terminals.get(key)
+        if terminals is None:
+            self._terminals[key] = []  # in case of a cycle
+            terminals = self._terminals[key] = sorted(
+                (t for e in self.outgoing(node) if not e.attrib.get("remote")
+                 for t in self.get_terminals(e.child, punct=punct)), key=attrgetter("position"))
+        return terminals
+
+    def get_yield(self, node, punct=True):
+        """
+        :param node: Node to find the terminal yield of, by primary edges in the view
+        :param punct: whether to include punctuation Terminals
+        :return: Yield of the terminals
+        """
+        if id(node) not in self._affected:
+            return get_node_yield(node, punct=punct)
+        key = (id(node), punct)
+        terminal_yield = self._yields.get(key)
+        if terminal_yield is None:
+            self._yields[key] = Yield()  # in case of a cycle
+            mask = 0
+            for e in self.outgoing(node):
+                if not e.attrib.get("remote"):
+                    mask |= self.get_yield(e.child, punct=punct)
+            terminal_yield = self._yields[key] = Yield(mask)
+        return terminal_yield
+
+
+def function_views(p1, p2):
+    """
+    Non-destructive version of move_functions: move any common Fs to the root in views of the passages
+    :return: pair of PassageView objects, for p1 and p2
+    """
+    return tuple(map(PassageView, (p1, p2), function_moves(p1, p2)))
+
+
+_NORMALIZED = weakref.WeakSet()  # copies returned by normalized, which evaluate does not normalize again
+
+
+def normalized(passage):
+    """
+    Normalize a copy of the passage for evaluation, leaving the passage itself unchanged.
+    evaluate(..., inplace=False) uses the copy as is, so it can be compared to many passages without normalizing again.
+    :param passage: Passage object to copy
+    :return: normalized Passage object
+    """
+    passage = convert.from_binary(convert.to_binary(passage))
+    normalization.normalize(passage)
+    _NORMALIZED.add(passage)
+    return passage
+
+
+def content_hash(passage):
+    """
+    :param passage: Passage object
+    :return: hex digest of the passage contents, equal for passages with the same nodes, edges and attributes
+    """
+    return hashlib.sha1(convert.to_binary(passage)).hexdigest()
+
+
+class IndexedReference:
+    """
+    Reference passage prepared for evaluation: normalized once, with its units found once for each set of common Fs
+    moved to the root (which depends on the guessed passage), and for each set of constructions evaluated.
+    """
+    def __init__(self, passage, normalize=True):
+        """
+        :param passage: reference Passage object (not modified)
+        :param normalize: whether to evaluate a normalized copy of the passage, with common Fs moved to the root
+        """
+        self.ID = passage.ID
+        self.normalize = normalize
+        self.passage = normalized(passage) if normalize else passage
+        self.functions = function_units(self.passage) if normalize else {}
+        self._yields = {}  # (construction names, yields of moved Fs) -> result of Evaluator.get_reference_yields
+
+    def get_yields(self, evaluator, guessed=None, r=None):
+        """
+        :param evaluator: Evaluator object to find units for, according to its constructions
+        :param guessed: normalized guessed Passage object, to find common Fs with
+        :param r: reference passage for fine-grained evaluation
+        :return: pair of PassageView of `guessed' to evaluate through (or None if not normalizing),
+                 and the result of Evaluator.get_reference_yields for this reference
+        """
+        view = None
+        moved = frozenset()
+        if self.normalize and guessed is not None:
+            units = function_units(guessed)
+            moved = frozenset(units.keys() & self.functions.keys())
+            view = PassageView(guessed, [units[y] for y in moved])
+        if r:
+            return view, evaluator.get_reference_yields(self.passage, r=r, view=self._view(moved))
+        key = tuple(map(str, evaluator.constructions)), moved
+        reference_yields = self._yields.get(key)
+        if reference_yields is None:
+            reference_yields = self._yields[key] = evaluator.get_reference_yields(self.passage, view=self._view(moved))
+        return view, reference_yields
+
+    def _view(self, moved):
+        return PassageView(self.passage, [self.functions[y] for y in moved]) if moved else None
+
+
+class ReferenceIndex:
+    """
+    Reference passages prepared for evaluation, to compare any number of guessed passages to without normalizing the
+    references or finding their units again, across evaluation types: pass it to `evaluate' as `reference_index'.
+    Passages are indexed by ID and content hash, so a passage that changed since it was indexed is indexed again.
+    """
+    def __init__(self, passages=(), normalize=True):
+        """
+        :param passages: iterable of reference Passage objects to index right away
+        :param normalize: whether evaluation will normalize passages (see `evaluate')
+        """
+        self.normalize = normalize
+        self.references = {}  # (passage ID, content hash) -> IndexedReference
+        for passage in passages:
+            self.get(passage)
+
+    @staticmethod
+    def key(passage):
+        return passage.ID, content_hash(passage)
+
+    def get(self, passage):
+        """
+        :param passage: reference Passage object
+        :return: IndexedReference object for the passage, added to the index if not already there
+        """
+        key = self.key(passage)
+        reference = self.references.get(key)
+        if reference is None:
+            reference = self.references[key] = IndexedReference(passage, normalize=self.normalize)
+        return reference
+
+    def save(self, filename):
+        """
+        Persist the index, including units found so far, to be loaded with ReferenceIndex.load
+        :param filename: file name to write to
+        """
+        with open(filename, "wb") as h:
+            pickle.dump(self, h)
+
+    @staticmethod
+    def load(filename):
+        """
+        :param filename: file name written by ReferenceIndex.save
+        :return: ReferenceIndex object
+        """
+        with open(filename, "rb") as h:
+            return pickle.load(h)
+
+    def __len__(self):
+        return len(self.references)
+
+    def __contains__(self, passage):
+        return self.key(passage) in self.references
+
+
 def get_text(p, positions):
     l0 = p.layer(layer0.LAYER_ID)
     return [l0.by_position(i).text for i in range(1, len(l0.all) + 1) if i in positions]
@@ -90,26 +319,50 @@ class Evaluator:
         self.errors = errors
 
     @staticmethod
-    def find_mutuals(m1, m2, eval_type, mutual_tags, counter=None):
+    def find_mutuals(m1, m2, eval_types, mutual_tags, counter=None):
+        """
+        Find the yields common to both passages, for all evaluation types at once.
+        :param m1: dict: yield -> list of Candidates in the guessed passage
+        :param m2: dict: yield -> list of Candidates in the reference passage
+        :param eval_types: evaluation types to find mutual yields for, out of EVAL_TYPES
+        :param mutual_tags: dict: eval_type -> dict to fill with yield -> tags matching for it
+        :param counter: ConfusionMatrix to count pairs of tags in
+        """
+        labeled = [eval_type for eval_type in eval_types if eval_type != UNLABELED]
         for y in m1.keys() & m2.keys():
-            if eval_type == UNLABELED:
-                mutual_tags[y] = ()
-            else:
+            if UNLABELED in eval_types:
+                mutual_tags[UNLABELED][y] = ()
+            if labeled:
                 tags = [set(t for c in m[y] for t in c.edge.tags) for m in (m1, m2)]
-                if eval_type == WEAK_LABELED:
-                    tags[0] = expand_equivalents(tags[0])
-                intersection = set.intersection(*tags)
-                if tags[0] == tags[1]:  # non-empty intersection
-                    mutual_tags[y] = intersection
+                for eval_type in labeled:
+                    guessed_tags = expand_equivalents(tags[0]) if eval_type == WEAK_LABELED else tags[0]
+                    if guessed_tags == tags[1]:  # non-empty intersection
+                        mutual_tags[eval_type][y] = guessed_tags & tags[1]
         if counter is not None:  # for confusion matrix / error counter
+            pairs = []
             for y in m1.keys() | m2.keys():  # common yields (keys), but perhaps different tags (values)
-                tags = [sorted(set(t for c in m.get(y, ()) if not c.is_unary_child or c.is_implicit() for t in c.edge.tags))
+                tags = [set(t for c in m.get(y, ()) if not c.is_unary_child or c.is_implicit() for t in c.edge.tags)
                         for m in (m1, m2)]  # the tags for the yield in each of the two passages
                 if "Arbitrary/Nonspecific" in tags[1]:
                     print("m2", m2)
-                counter[tuple("|".join(t) or "<UNMATCHED>" for t in tags)] += 1
+                pairs.append(tags)
+            counter.update(pairs)
 
-    def get_scores(self, p1, p2, eval_type, r=None):
+    def get_reference_yields(self, p2, r=None, view=None):
+        """
+        Find the units of the reference passage, to compare to any guessed passage
+        :param p2: reference passage object
+        :param r: reference passage for fine-grained evaluation
+        :param view: PassageView object to evaluate p2 through, or None to use the passage as it is
+        :returns: pair of reference yield tags for fine-grained evaluation, and dict: Construction ->
+                  dict: set of terminal indices (excluding punctuation) -> list of Candidates in p2 with that yield
+        """
+        passage_yields = create_passage_yields(r) if r else create_passage_yields(p2, view=view)
+        reference_yield_tags = passage_yields[ALL_EDGES.name] if passage_yields else None
+        return reference_yield_tags, create_passage_yields(p2, self.constructions, tags=False, reference=p2,
+                                                           reference_yield_tags=reference_yield_tags, view=view)
+
+    def get_scores(self, p1, p2, eval_type, r=None, views=None, reference_yields=None):
         """
         prints the relevant statistics and f-scores. eval_type can be 'unlabeled', 'labeled' or 'weak_labeled'.
         calculates a set of all the yields such that both passages have a unit with that yield.
@@ -121,41 +374,60 @@ class Evaluator:
         3. WEAK_LABELED: also requires weak tag match (if there are multiple units with the same yield,
                          requires one match)
         :param r: reference passage for fine-grained evaluation
+        :param views: pair of PassageView objects to evaluate p1 and p2 through, or None to use the passages as they are
+        :param reference_yields: result of get_reference_yields for p2, if already computed
         :returns: EvaluatorResults object if self.fscore is True, otherwise None
         """
-        mutual = OrderedDict()
-        counters = OrderedDict() if self.errors and eval_type == LABELED else None
-        passage_yields = create_passage_yields(r or p2)
-        reference_yield_tags = passage_yields[ALL_EDGES.name] if passage_yields else None
-        maps = [{} if p is None else create_passage_yields(p, self.constructions, tags=False, reference=p2,
-                                                           reference_yield_tags=reference_yield_tags) for p in (p1, p2)]
+        return self.get_all_scores(p1, p2, [eval_type], r=r, views=views, reference_yields=reference_yields)[eval_type]
+
+    def get_all_scores(self, p1, p2, eval_types=EVAL_TYPES, r=None, views=None, reference_yields=None):
+        """
+        Like get_scores, but for several evaluation types, finding the units in each passage and matching them only once
+        :param eval_types: evaluation types to use, out of EVAL_TYPES
+        :returns: OrderedDict: eval_type -> EvaluatorResults object
+        """
+        mutuals = OrderedDict((eval_type, OrderedDict()) for eval_type in eval_types)
+        counters = OrderedDict() if self.errors and LABELED in eval_types else None
+        views = views or (None, None)
+        reference_yield_tags, reference_map = reference_yields or self.get_reference_yields(p2, r=r, view=views[1])
+        maps = [{} if p1 is None else create_passage_yields(p1, self.constructions, tags=False, reference=p2,
+                                                            reference_yield_tags=reference_yield_tags, view=views[0]),
+                reference_map]
         if p1 is not None:
             ordered_constructions = [c for c in self.constructions if any(c in m for m in maps)]
             for m in maps[::-1]:
                 ordered_constructions += [c for c in m if c not in ordered_constructions]
             for construction in ordered_constructions:
                 yield_cands = [m.get(construction, {}) for m in maps]
-                self.find_mutuals(*yield_cands, eval_type=eval_type, mutual_tags=mutual.setdefault(construction, {}),
-                                  counter=None if counters is None else counters.setdefault(construction, Counter()))
+                self.find_mutuals(*yield_cands, eval_types=eval_types,
+                                  mutual_tags={t: mutual.setdefault(construction, {}) for t, mutual in mutuals.items()},
+                                  counter=None if counters is None else counters.setdefault(construction,
+                                                                                            ConfusionMatrix()))
 
-        only = [{construction: {terminal_yield: set.union(*(set(candidate.edge.tags) for candidate in candidates))
-                                for terminal_yield, candidates in candidates_per_yield.items()
-                                if terminal_yield not in mutual[construction]}
+        tags = [{construction: {terminal_yield: set.union(*(set(candidate.edge.tags) for candidate in candidates))
+                                for terminal_yield, candidates in candidates_per_yield.items()}
                  for construction, candidates_per_yield in m.items()} for m in maps]
-        res = EvaluatorResults((c, SummaryStatistics(len(mutual[c]), len(only[0].get(c, ())), len(only[1].get(c, ())),
-                                                     None if counters is None else counters.get(c))) for c in mutual)
-        if self.verbose:
-            print("Evaluation type: (" + eval_type + ")")
-            if self.units and p1 is not None:
-                print("==> Mutual Units:")
-                print_tags_and_text(p1, mutual)
-                print("==> Only in guessed:")
-                print_tags_and_text(p1, only[0])
-                print("==> Only in reference:")
-                print_tags_and_text(p2, only[1])
-            if self.fscore:
-                res.print()
-        return res
+        results = OrderedDict()
+        for eval_type, mutual in mutuals.items():
+            only = [{construction: {terminal_yield: yield_tags for terminal_yield, yield_tags in tags_per_yield.items()
+                                    if terminal_yield not in mutual[construction]}
+                     for construction, tags_per_yield in m.items()} for m in tags]
+            errors = counters if eval_type == LABELED else None
+            res = results[eval_type] = EvaluatorResults(
+                (c, SummaryStatistics(len(mutual[c]), len(only[0].get(c, ())), len(only[1].get(c, ())),
+                                      None if errors is None else errors.get(c))) for c in mutual)
+            if self.verbose:
+                print("Evaluation type: (" + eval_type + ")")
+                if self.units and p1 is not None:
+                    print("==> Mutual Units:")
+                    print_tags_and_text(p1, mutual)
+                    print("==> Only in guessed:")
+                    print_tags_and_text(p1, only[0])
+                    print("==> Only in reference:")
+                    print_tags_and_text(p2, only[1])
+                if self.fscore:
+                    res.print()
+        return results
 
 
 class Scores:
@@ -206,6 +478,15 @@ class Scores:
             if evaluator:
                 evaluator.print_confusion_matrix("Evaluation type: (" + eval_type + ")", *args, **kwargs)
 
+    def save_confusion_matrices(self, filename):
+        """
+        Write the confusion matrices of all evaluation types and constructions to one file, in NumPy's NPZ format,
+        as arrays named <eval_type>/<construction>/labels and <eval_type>/<construction>/counts
+        :param filename: file name to write to
+        """
+        np.savez_compressed(filename, **{name: array for eval_type, evaluator in self.evaluators.items()
+                                         for name, array in evaluator.confusion_arrays(eval_type + "/").items()})
+
     def fields(self, eval_type=LABELED, counts=False):
         e = self[eval_type]
         attrs = ("num_guessed", "num_ref", "num_matches") if counts else ("p", "r", "f1")
@@ -224,6 +505,144 @@ class Scores:
         return self.evaluators[eval_type]
 
 
+UNMATCHED = "<UNMATCHED>"
+LABELS = (UNMATCHED,) + tuple(sorted({v for k, v in EdgeTags.__dict__.items() if not k.startswith("_")}))
+
+
+class ConfusionMatrix:
+    """
+    Counts of (guessed, reference) label pairs over yields, as an integer NumPy array indexed by a label vocabulary.
+    The label of a yield in a passage is its sorted tags joined by "|", or UNMATCHED if no unit there has that yield.
+    Labels not in the vocabulary (combinations of tags) are added to it as they are encountered.
+    """
+    def __init__(self, labels=LABELS, counts=None):
+        """
+        :param labels: label vocabulary, indexing both axes of the array
+        :param counts: square integer array of counts, indexed by (guessed label, reference label)
+        """
+        self.labels = tuple(labels)
+        self.indices = {label: i for i, label in enumerate(self.labels)}
+        self.counts = np.zeros((len(self.labels),) * 2, dtype=np.int64) if counts is None else np.asarray(counts)
+
+    def index(self, label):
+        """
+        :param label: label string, or set of tags to create it from
+        :return: index of the label in the vocabulary, adding it if it is not there yet
+        """
+        if not isinstance(label, str):
+            label = "|".join(sorted(label)) or UNMATCHED
+        i = self.indices.get(label)
+        if i is None:
+            i = self.indices[label] = len(self.labels)
+            self.labels += (label,)
+            self.counts = np.pad(self.counts, (0, 1), mode="constant")
+        return i
+
+    def update(self, pairs):
+        """
+        Count label pairs
+        :param pairs: iterable of (guessed, reference) pairs, each a label string or set of tags
+        """
+        indices = np.array([(self.index(guessed), self.index(ref)) for guessed, ref in pairs], dtype=np.intp)
+        if len(indices):
+            np.add.at(self.counts, (indices[:, 0], indices[:, 1]), 1)
+
+    def aligned(self, labels):
+        """
+        :param labels: label vocabulary, including all labels of this matrix
+        :return: counts array re-indexed by the given vocabulary
+        """
+        if labels == self.labels:
+            return self.counts
+        positions = [labels.index(label) for label in self.labels]
+        counts = np.zeros((len(labels),) * 2, dtype=np.int64)
+        counts[np.ix_(positions, positions)] = self.counts
+        return counts
+
+    def __add__(self, other):
+        if other is None or other == 0:  # so that sum() works
+            return self
+        labels = self.labels + tuple(label for label in other.labels if label not in self.indices)
+        return ConfusionMatrix(labels, self.aligned(labels) + other.aligned(labels))
+
+    __radd__ = __add__
+
+    @classmethod
+    def aggregate(cls, matrices):
+        """
+        :param matrices: iterable of ConfusionMatrix objects (or None)
+        :return: new ConfusionMatrix with their counts summed
+        """
+        matrices = [m for m in matrices if m is not None]
+        labels = tuple(OrderedDict.fromkeys(label for m in matrices for label in m.labels)) or LABELS
+        total = np.zeros((len(labels),) * 2, dtype=np.int64)
+        for matrix in matrices:
+            total += matrix.aligned(labels)
+        return cls(labels, total)
+
+    def most_common(self):
+        """
+        :return: list of ((guessed label, reference label), count) for the non-zero counts, from most to least common
+        """
+        rows, cols = np.nonzero(self.counts)
+        counts = self.counts[rows, cols]
+        order = np.argsort(-counts, kind="stable")
+        return [((self.labels[rows[i]], self.labels[cols[i]]), int(counts[i])) for i in order]
+
+    def table(self):
+        """
+        :return: triple of guessed labels, reference labels and counts array, with only the non-zero rows and
+                 columns, each sorted by label
+        """
+        rows, cols = [sorted(np.flatnonzero(self.counts.any(axis=axis)), key=self.labels.__getitem__)
+                      for axis in (1, 0)]
+        return [self.labels[i] for i in rows], [self.labels[i] for i in cols], self.counts[np.ix_(rows, cols)]
+
+    def to_csv(self, file, sep=","):
+        """
+        Write the non-zero rows and columns as a table, with guessed labels as rows and reference labels as columns
+        :param file: file object to write to
+        :param sep: field separator
+        """
+        rows, cols, counts = self.table()
+        print("guessed\\ref", *cols, sep=sep, file=file)
+        for label, row in zip(rows, counts):
+            print(label, *row, sep=sep, file=file)
+
+    def save_npz(self, filename):
+        """
+        :param filename: file name to write the labels and counts to, in NumPy's NPZ format
+        """
+        np.savez_compressed(filename, labels=np.array(self.labels, dtype=str), counts=self.counts)
+
+    @classmethod
+    def load_npz(cls, filename):
+        """
+        :param filename: file name written by save_npz
+        :return: ConfusionMatrix object
+        """
+        with np.load(filename) as data:
+            return cls(data["labels"].tolist(), data["counts"])
+
+    def __getitem__(self, pair):
+        indices = [self.indices.get(label) for label in pair]
+        return 0 if None in indices else int(self.counts[tuple(indices)])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.counts))
+
+    def __bool__(self):
+        return bool(self.counts.any())
+
+    def __eq__(self, other):
+        if not isinstance(other, ConfusionMatrix):
+            return NotImplemented
+        labels = self.labels + tuple(label for label in other.labels if label not in self.indices)
+        return np.array_equal(self.aligned(labels), other.aligned(labels))
+
+    __hash__ = None
+
+
 class EvaluatorResults:
     def __init__(self, results, default=None):
         """
@@ -251,23 +670,33 @@ class EvaluatorResults:
                         print("\n")
                     print(construction)
                     print("%sConfusion Matrix:" % ("" if prefix is None else (prefix + ", ")), **kwargs)
-                    y_labels = sorted(set(x[0][1] for x in errors))
+                    x_labels, y_labels, counts = result.errors.table()
                     print("", *y_labels, sep=table_sep, **kwargs)
-                    for x, x_errors in groupby(sorted(errors), key=lambda x: x[0][0]):
-                        errors_by_y = Counter()
-                        for (_, y), f in x_errors:
-                            errors_by_y[y] += f
-                        print(x, *[errors_by_y.get(y, 0) for y in y_labels], sep=table_sep, **kwargs)
+                    for x, row in zip(x_labels, counts):
+                        print(x, *row, sep=table_sep, **kwargs)
                 elif sep:
                     print(sep.join(("guessed", "ref", "count")), **kwargs)
                     for error, freq in errors:
                         print(sep.join(error + (str(freq),)), **kwargs)
                 else:
+                    l1 = max(len(e1) for (e1, _), _ in errors)
+                    l2 = max(len(e2) for (_, e2), _ in errors)
                     for error, freq in errors:
-                        l1 = max(len(e1) for e1, _ in result.errors)
-                        l2 = max(len(e2) for _, e2 in result.errors)
                         print("%-*s %-*s %d" % (l1, error[0], l2, error[1], freq), **kwargs)
 
+    def confusion_arrays(self, prefix=""):
+        """
+        :param prefix: prefix for the array names
+        :return: dict of array name -> array, with the labels and counts of the confusion matrix of each construction,
+                 named <prefix><construction>/labels and <prefix><construction>/counts
+        """
+        arrays = {}
+        for construction, result in self.results.items():
+            if result.errors:
+                arrays[prefix + str(construction) + "/labels"] = np.array(result.errors.labels, dtype=str)
+                arrays[prefix + str(construction) + "/counts"] = result.errors.counts
+        return arrays
+
     @classmethod
     def aggregate(cls, results):
         """
@@ -293,7 +722,7 @@ class EvaluatorResults:
         return bool(self.results and any(self.results.values()))
 
     def __getitem__(self, construction):
-        return self.results.get(construction, SummaryStatistics(0, 0, 0, Counter()))
+        return self.results.get(construction, SummaryStatistics(0, 0, 0, ConfusionMatrix()))
 
 
 class SummaryStatistics:
@@ -321,18 +750,86 @@ class SummaryStatistics:
         """
         return SummaryStatistics(*map(sum, [map(attrgetter(attr), stats)
                                             for attr in ("num_matches", "num_only_guessed", "num_only_ref")]),
-                                 Counter({k: sum((s.errors or {}).get(k, 0) for s in stats)
-                                          for k in set.union(*[set(s.errors or ()) for s in stats])}))
+                                 ConfusionMatrix.aggregate(s.errors for s in stats))
 
     def __bool__(self):
         return bool(self.num_matches or self.num_only_guessed or self.num_only_ref or self.errors)
 
 
+class EvaluationCache:
+    """
+    Directory of evaluation results (Scores objects, with the output printed by evaluate) keyed by the content hashes
+    of the evaluated passages and by the evaluation options affecting them, so that evaluating an unchanged pair of
+    passages again just reads them.
+    """
+    VERSION = 2
+    OPTIONS = OrderedDict((("converter", None), ("constructions", DEFAULT), ("errors", False), ("normalize", True),
+                           ("eval_type", None)))  # evaluate arguments affecting the scores, with their defaults
+    OUTPUT_OPTIONS = OrderedDict((("verbose", False), ("fscore", True)))  # affecting only the output, if verbose
+
+    def __init__(self, directory):
+        """
+        :param directory: directory to store results in, created if missing
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, guessed, ref, ref_yield_tags=None, **kwargs):
+        """
+        :param guessed: guessed Passage object, before evaluation
+        :param ref: reference Passage object, before evaluation
+        :param ref_yield_tags: reference passage for fine-grained evaluation
+        :param kwargs: other keyword arguments to `evaluate'
+        :return: key for the result of evaluate(guessed, ref, ref_yield_tags=ref_yield_tags, **kwargs)
+        """
+        options = [kwargs.get(name, default) for name, default in self.OPTIONS.items()]
+        converter, constructions, errors, normalize, eval_type = options
+        output_options = [bool(kwargs.get(name, default)) for name, default in self.OUTPUT_OPTIONS.items()]
+        return hashlib.sha1(repr((self.VERSION, content_hash(guessed), content_hash(ref),
+                                  None if ref_yield_tags is None else content_hash(ref_yield_tags),
+                                  None if converter is None else getattr(converter, "__qualname__", repr(converter)),
+                                  [str(c) for c in get_by_names(constructions)], bool(errors), bool(normalize),
+                                  [eval_type] if isinstance(eval_type, str) else list(eval_type or EVAL_TYPES),
+                                  output_options if output_options[0] else None  # nothing is printed otherwise
+                                  )).encode()).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key):
+        """
+        :param key: key returned by EvaluationCache.key
+        :return: pair of Scores object and printed output stored for the key, or None if there is none
+        """
+        try:
+            with open(self._filename(key), "rb") as h:
+                return pickle.load(h)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, scores, output=""):
+        """
+        :param key: key returned by EvaluationCache.key
+        :param scores: Scores object to store
+        :param output: text printed by evaluate when computing the scores, to print again when they are read
+        """
+        filename = self._filename(key)
+        with open(filename + ".tmp", "wb") as h:
+            pickle.dump((scores, output), h)
+        os.replace(filename + ".tmp", filename)  # so that a partly written file is never read
+
+    def __contains__(self, key):
+        return os.path.exists(self._filename(key))
+
+
 def evaluate(guessed, ref, converter=None, verbose=False, constructions=DEFAULT,
-             units=False, fscore=True, errors=False, normalize=True, eval_type=None, ref_yield_tags=None, **kwargs):
+             units=False, fscore=True, errors=False, normalize=True, eval_type=None, ref_yield_tags=None, inplace=True,
+             reference_index=None, **kwargs):
     """
     Compare two passages and return requested diagnostics and scores, possibly printing them too.
-    NOTE: since normalize=True by default, this method is destructive: it modifies the given passages before evaluation.
+    NOTE: since normalize=True and inplace=True by default, this method is destructive: it modifies the given passages
+    before evaluation. With inplace=False, normalized copies (see `normalized') are evaluated instead, and common Fs are
+    moved only in views of them, so a passage returned by `normalized' may be reused as the reference for many passages.
     :param guessed: Passage object to evaluate
     :param ref: reference Passage object to compare to
     :param converter: optional function to apply to passages before evaluation
@@ -344,19 +841,37 @@ def evaluate(guessed, ref, converter=None, verbose=False, constructions=DEFAULT,
     :param normalize: flatten centers and move common functions to root before evaluation - modifies passages
     :param eval_type: specific evaluation type(s) to limit to
     :param ref_yield_tags: reference passage for fine-grained evaluation
+    :param inplace: whether to normalize the given passages themselves, rather than copies of them
+    :param reference_index: ReferenceIndex object to look `ref' up in (adding it if missing), to reuse its units.
+                            The given passages are not modified (as with inplace=False).
     :return: Scores object
     """
     del kwargs
     if converter is not None:
         guessed = converter(guessed)
         ref = converter(ref)
-    if normalize:  # FIXME clone passages to avoid modifying the original ones
-        for passage in (guessed, ref):
-            normalization.normalize(passage)  # flatten Cs inside Cs
-        move_functions(guessed, ref)  # move common Fs to be under the root, FIXME should be before normalize
+    evaluator = Evaluator(verbose, constructions, units, fscore, errors)
+    views = None
+    if reference_index is not None:
+        if normalize != reference_index.normalize:
+            raise ValueError("Reference index is for evaluation with normalize=%s" % reference_index.normalize)
+        indexed = reference_index.get(ref)
+        ref = indexed.passage
+        if normalize and guessed not in _NORMALIZED:
+            guessed = normalized(guessed)
+        view, reference_yields = indexed.get_yields(evaluator, guessed, r=ref_yield_tags)
+        views = view, None
+    else:
+        if normalize and inplace:
+            for passage in (guessed, ref):
+                normalization.normalize(passage)  # flatten Cs inside Cs
+            move_functions(guessed, ref)  # move common Fs to be under the root, FIXME should be before normalize
+        elif normalize:
+            guessed, ref = [p if p in _NORMALIZED else normalized(p) for p in (guessed, ref)]
+            views = function_views(guessed, ref)
+        reference_yields = evaluator.get_reference_yields(ref, r=ref_yield_tags, view=views and views[1])
 
     if isinstance(eval_type, str):
         eval_type = [eval_type]
-    evaluator = Evaluator(verbose, constructions, units, fscore, errors)
-    return Scores((evaluation_type, evaluator.get_scores(guessed, ref, evaluation_type, r=ref_yield_tags))
-                  for evaluation_type in (eval_type or EVAL_TYPES))
+    return Scores(evaluator.get_all_scores(guessed, ref, eval_type or EVAL_TYPES, r=ref_yield_tags, views=views,
+                                           reference_yields=reference_yields).items())
@@ -2,7 +2,8 @@
 import os
 import sys
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
 from contextlib import contextmanager
 from glob import glob
 from itertools import filterfalse, chain
@@ -10,7 +11,8 @@ from xml.etree.ElementTree import ParseError
 
 from tqdm import tqdm
 
-from ucca.convert import file2passage, passage2file, from_text, to_text, split2segments
+from ucca.convert import file2passage, file2passages, passage2file, from_text, to_text, split2segments, \
+    BINARY_EXTENSION, CORPUS_ARCHIVE_EXTENSION, CorpusArchive
 from ucca.core import Passage
 
 DEFAULT_LANG = "en"
@@ -21,9 +23,10 @@ DEFAULT_DELAY = 5
 class LazyLoadedPassages:
     """
     Iterable interface to Passage objects that loads files on-the-go and can be iterated more than once
+    If workers are requested, files are read (and split) in a process pool, up to `prefetch' files ahead
     """
     def __init__(self, files, sentences=False, paragraphs=False, converters=None, lang=DEFAULT_LANG,
-                 attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY):
+                 attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY, workers=0, prefetch=None, ordered=True):
         self.files = files
         self.sentences = sentences
         self.paragraphs = paragraphs
@@ -32,17 +35,31 @@ class LazyLoadedPassages:
         self.lang = lang
         self.attempts = attempts
         self.delay = delay
+        self.workers = workers
+        self.prefetch = prefetch or 2 * workers
+        self.ordered = ordered
+        self._default_converters = converters is None  # the default converters cannot be passed to workers
         self._files_iter = None
         self._split_iter = None
         self._file_handle = None
+        self._archives = None
+        self._pool = None
+        self._futures = None
 
     def __iter__(self):
+        self.close()
         self._files_iter = iter(self.files)
         self._split_iter = None
         self._file_handle = None
+        if self.workers:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._futures = deque()
+            self._prefetch()
         return self
 
     def __next__(self):
+        if self._pool is not None:
+            return self._next_prefetched()
         while True:
             passage = self._next_passage()
             if passage is not None:
@@ -68,7 +85,11 @@ class LazyLoadedPassages:
                     time.sleep(self.delay)
                     attempts -= 1
                 try:
-                    passage = file2passage(file)  # XML or binary format
+                    passages = file2passages(file)  # XML or binary format, XML may contain several passages
+                    passage = next(passages, None)
+                    if passage is None:  # no passages in the file
+                        return None
+                    self._split_iter = chain((passage,), passages)
                 except (IOError, ParseError) as e:  # Failed to read as passage file
                     base, ext = os.path.splitext(os.path.basename(file))
                     converter = self.converters.get(ext.lstrip("."))
@@ -94,6 +115,88 @@ class LazyLoadedPassages:
                 return None
         return passage
 
+    def _prefetch(self):
+        """Submit files to read to the pool, until `prefetch' files are being read"""
+        kwargs = dict(sentences=self.sentences, paragraphs=self.paragraphs, lang=self.lang, attempts=self.attempts,
+                      delay=self.delay)
+        while len(self._futures) < self.prefetch:
+            try:
+                file = next(self._files_iter)
+            except StopIteration:
+                break
+            if isinstance(file, Passage):  # Not really a file, so it is only split (if requested) here
+                future = Future()
+                future.set_result(_load_file(file, converters=self.converters, **kwargs))
+            else:
+                future = self._pool.submit(_load_file, file, **kwargs,
+                                           converters=None if self._default_converters else self.converters)
+            self._futures.append(future)
+
+    def _next_prefetched(self):
+        while True:
+            if self._split_iter is not None:  # Passages read from the last file
+                passage = next(self._split_iter, None)
+                if passage is not None:
+                    return passage
+                self._split_iter = None
+            if not self._futures:  # Finished iteration
+                self.close()
+                raise StopIteration
+            if self.ordered:
+                future = self._futures.popleft()
+            else:
+                future = next(iter(wait(self._futures, return_when=FIRST_COMPLETED).done))
+                self._futures.remove(future)
+            self._prefetch()  # Keep the workers busy while the passages are consumed
+            self._split_iter = iter(future.result())
+
+    def close(self):
+        """
+        Stop reading files in the process pool, if any
+        """
+        if self._pool is not None:
+            for future in self._futures:  # Not yet started, otherwise cannot be cancelled
+                future.cancel()
+            self._pool.shutdown(wait=False)
+            self._pool = self._futures = None
+            self._split_iter = None
+
+    def get(self, key):
+        """
+        Get a single passage by its position among all passages, or by its ID, without iterating over the rest.
+        If all files are corpus archives (and no splitting is requested), only the requested passage is read, using
+        the archives' indices; otherwise, passages are read in order until the requested one is found.
+        :param key: position (int) or passage ID (str)
+        :return: Passage object
+        """
+        by_id, requested = isinstance(key, str), key
+        if not self.split and all(isinstance(file, str) and is_corpus_archive(file) for file in self.files):
+            if self._archives is None:
+                self._archives = {}  # opened archives by file name, as files may be shuffled
+            archives = [self._archives.get(file) or self._archives.setdefault(file, CorpusArchive(file))
+                        for file in self.files]
+            if not by_id and key < 0:
+                key += sum(map(len, archives))
+            for archive in archives:
+                if by_id:
+                    if key in archive:
+                        return archive[key]
+                elif 0 <= key < len(archive):
+                    return archive[key]
+                else:
+                    key -= len(archive)
+        else:
+            passages = LazyLoadedPassages(self.files, sentences=self.sentences, paragraphs=self.paragraphs,
+                                          converters=self.converters, lang=self.lang, attempts=self.attempts,
+                                          delay=self.delay)
+            if not by_id and key < 0:
+                passages = list(passages)  # the number of passages must be known
+                key += len(passages)
+            for i, passage in enumerate(passages):
+                if (passage.ID == key) if by_id else (i == key):
+                    return passage
+        raise (KeyError if by_id else IndexError)("No passage %s: %s" % ("with ID" if by_id else "at position", requested))
+
     # The following three methods are implemented to support shuffle;
     # note files are shuffled but there is no shuffling within files, as it would not be efficient.
     # Note also the inconsistency because these access the files while __iter__ accesses individual passages.
@@ -110,6 +213,15 @@ class LazyLoadedPassages:
         return bool(self.files)
 
 
+def is_corpus_archive(filename):
+    return os.path.splitext(filename)[1].lower() == CORPUS_ARCHIVE_EXTENSION
+
+
+def _load_file(file, **kwargs):
+    """Read all passages from one file, in a worker process of LazyLoadedPassages"""
+    return list(LazyLoadedPassages([file], **kwargs))
+
+
 def resolve_patterns(filename_patterns):
     for pattern in [filename_patterns] if isinstance(filename_patterns, str) else filename_patterns:
         yield from sorted(glob(pattern)) or [pattern]
@@ -142,7 +254,7 @@ def gen_files(files_and_dirs):
 
 
 def read_files_and_dirs(files_and_dirs, sentences=False, paragraphs=False, converters=None, lang=DEFAULT_LANG,
-                        attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY):
+                        attempts=DEFAULT_ATTEMPTS, delay=DEFAULT_DELAY, workers=0, prefetch=None, ordered=True):
     """
     :param files_and_dirs: iterable of files and/or directories to look in
     :param sentences: whether to split to sentences
@@ -151,10 +263,14 @@ def read_files_and_dirs(files_and_dirs, sentences=False, paragraphs=False, conve
     :param lang: language to use for tokenization model
     :param attempts: number of times to try reading a file before giving up
     :param delay: number of seconds to wait before subsequent attempts to read a file
+    :param workers: number of processes to read files in parallel (0 to read them in the calling process)
+    :param prefetch: maximum number of files to read ahead when using workers (default: twice the number of workers)
+    :param ordered: whether to return passages in the order of the files when using workers (or as they are read)
     :return: lazy-loaded passages from all files given, plus any files directly under any directory given
     """
     return LazyLoadedPassages(list(gen_files(files_and_dirs)), sentences=sentences, paragraphs=paragraphs,
-                              converters=converters, lang=lang, attempts=attempts, delay=delay)
+                              converters=converters, lang=lang, attempts=attempts, delay=delay, workers=workers,
+                              prefetch=prefetch, ordered=ordered)
 
 
 def write_passage(passage, output_format=None, binary=False, outdir=".", prefix="", converter=None, verbose=True,
@@ -162,12 +278,13 @@ def write_passage(passage, output_format=None, binary=False, outdir=".", prefix=
     """
     Write a given UCCA passage in any format.
     :param passage: Passage object to write
-    :param output_format: filename suffix (if given "ucca", suffix will be ".pickle" or ".xml" depending on `binary')
+    :param output_format: filename suffix (if given "ucca", suffix will be ".pickle" or ".xml" depending on `binary');
+                          if given "ucb", the passage is saved in the compact binary format
     :param binary: save in pickle format with ".pickle" suffix
     :param outdir: output directory, should exist already
     :param prefix: string to prepend to output filename
-    :param converter: function to apply to passage before saving (if output_format is not "ucca"/"pickle"/"xml"),
-                      returning iterable of strings, each corresponding to an output line
+    :param converter: function to apply to passage before saving (if output_format is not "ucca"/"pickle"/"xml"/
+                      "ucb"), returning iterable of strings, each corresponding to an output line
     :param verbose: print "Writing passage" message
     :param append: if using converter, append to output file rather than creating a new file
     :param basename: use this instead of `passage.ID' for the output filename
@@ -179,7 +296,7 @@ def write_passage(passage, output_format=None, binary=False, outdir=".", prefix=
     if verbose:
         with external_write_mode():
             print("%s '%s'..." % ("Appending to" if append else "Writing passage", outfile))
-    if output_format is None or output_format in ("ucca", "pickle", "xml"):
+    if output_format is None or output_format in ("ucca", "pickle", "xml", BINARY_EXTENSION.lstrip(".")):
         passage2file(passage, outfile, binary=binary)
     else:
         with open(outfile, "a" if append else "w", encoding="utf-8") as f:
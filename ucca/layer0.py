@@ -8,6 +8,12 @@ Layer 0 has only one type of node, :class:`Terminal`. This is a subtype of
 
 """
 
+import hashlib
+import sys
+from collections import namedtuple
+
+import numpy as np
+
 from ucca import core
 
 LAYER_ID = '0'
@@ -46,22 +52,33 @@ class Terminal(core.Node):
 
     """
 
+    __slots__ = ("_position",)
+    _CACHE_SLOTS = __slots__
+
+    def _attrib_changed(self):
+        # The text and paragraph attributes are kept in the columns of the layer too
+        self.layer._columns = None
+
     @property
     def text(self):
-        return self.attrib['text']
+        return self._attrib['text']
 
     @property
     def position(self):
-        # the format of ID is LAYER_ID + ID separator + position
-        return int(self.ID[len(LAYER_ID) + len(core.Node.ID_SEPARATOR):])
+        try:
+            return self._position
+        except AttributeError:  # parsed once, as the ID is immutable
+            # the format of ID is LAYER_ID + ID separator + position
+            self._position = int(self.ID[len(LAYER_ID) + len(core.Node.ID_SEPARATOR):])
+            return self._position
 
     @property
     def para_pos(self):
-        return self.attrib['paragraph_position']
+        return self._attrib['paragraph_position']
 
     @property
     def paragraph(self):
-        return self.attrib['paragraph']
+        return self._attrib['paragraph']
 
     @property
     def tok(self):
@@ -104,6 +121,12 @@ class Terminal(core.Node):
                 and self.paragraph == other.paragraph
                 and self.para_pos == other.para_pos)
 
+    def _canonical_hash(self, edge_hashes, ordered=False):
+        """Hashes the fields compared by :meth:`equals` (see :func:`core.canonical_hashes`)."""
+        del edge_hashes, ordered
+        return hashlib.sha1(repr(tuple(map(core.canonical_value, (self.layer.ID, self.text, self.position, self.tag,
+                                                                  self.paragraph, self.para_pos)))).encode("utf-8")).digest()
+
     def __eq__(self, other):
         """Equals if both of the same Passage, Layer, position, tag & text."""
         return (isinstance(other, Terminal) and other.layer.ID == LAYER_ID
@@ -129,18 +152,83 @@ class Terminal(core.Node):
         raise NotImplementedError()
 
 
+Columns = namedtuple("Columns", ("position", "paragraph", "para_pos", "punct", "text"))
+
+
 class Layer0(core.Layer):
     """Represents the :class:`Terminal` objects layer.
 
+    Besides the Terminals themselves, the layer keeps their fields in
+    parallel arrays (see :class:`Columns`), for vectorized access to all
+    Terminals at once. The arrays are built when first accessed after the
+    Terminals have changed.
+
     Attributes:
         words: a tuple of only the words (not punctuation) Terminals, ordered
         pairs: a tuple of (position, terminal) tuples of all Terminals, ordered
+        columns: Columns of NumPy arrays of the positions, paragraphs,
+            paragraph positions and punctuation flags of all Terminals,
+            ordered, and a tuple of their (interned) texts
 
     """
 
+    _columns = None  # built lazily, and not pickled
+
     def __init__(self, root, attrib=None):
         super().__init__(ID=LAYER_ID, root=root, attrib=attrib)
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop("_columns", None)
+        return state
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            terminals = self._all
+            numeric = np.array([(t.position, t.paragraph, t.para_pos, t.tag == NodeTags.Punct) for t in terminals],
+                               dtype=int).reshape(-1, 4).T
+            self._columns = Columns(position=numeric[0], paragraph=numeric[1], para_pos=numeric[2],
+                                    punct=numeric[3].astype(bool), text=tuple(sys.intern(t.text) for t in terminals))
+        return self._columns
+
+    def positions(self, punct=True):
+        """Returns the positions of all Terminals, in order.
+
+        :param punct: whether to include punctuation Terminals, defaults to True
+
+        :return: a NumPy array of positions
+        """
+        columns = self.columns
+        return columns.position if punct else columns.position[~columns.punct]
+
+    def paragraph_ends(self):
+        """Returns the positions of the last Terminal in each paragraph, in order.
+
+        A paragraph ends where the next Terminal's paragraph is different,
+        or where its paragraph position starts over.
+
+        :return: a NumPy array of positions
+        """
+        columns = self.columns
+        if not len(columns.position):
+            return columns.position
+        ends = (columns.para_pos[1:] == 1) | (columns.paragraph[1:] != columns.paragraph[:-1])
+        return np.append(columns.position[:-1][ends], columns.position[-1])
+
+    def _add_node(self, node):
+        super()._add_node(node)
+        self._columns = None
+
+    def _remove_node(self, node):
+        super()._remove_node(node)
+        self._columns = None
+
+    def _change_node_tag(self, node, old_tag):
+        self._columns = None
+        for parent in node.parents:  # whether the Terminal is punctuation may change their span
+            parent._invalidate_spans()
+
     @property
     def words(self):
         return tuple(x for x in self._all if not x.punct)
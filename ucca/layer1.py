@@ -53,11 +53,24 @@ class EdgeTags:
 ATTRIB_KEYS = ('remote', 'implicit', 'uncertain', 'suggest')
 
 
+def terminal_mask(terminals):
+    """Returns the positions of the given terminals as a bitmask, where bit i is set if position i is included."""
+    mask = 0
+    for terminal in terminals:
+        mask |= 1 << terminal.position
+    return mask
+
+
 class MissingRelationError(core.UCCAError):
     """Exception raised when a required edge is not present."""
     pass
 
 
+class _CycleError(core.UCCAError):
+    """Raised internally when a cycle is found while caching the span of a :class:`FoundationalNode`."""
+    pass
+
+
 def _single_child_by_tag(node, tag, must=True):
     """Returns the Node which is connected with an Edge with the given tag.
 
@@ -115,6 +128,8 @@ class Linkage(core.Node):
 
     """
 
+    __slots__ = ()
+
     @property
     def relation(self):
         return _single_child_by_tag(self, EdgeTags.LinkRelation)
@@ -180,8 +195,14 @@ class FoundationalNode(core.Node):
             with this FNode
         discontiguous: whether this FNode has continuous Terminals or not
 
+    The sorted Terminals in the span of each FNode are cached, and the cache
+    is invalidated whenever Edges are added or removed under the FNode.
+
     """
 
+    __slots__ = ("_spans",)
+    _CACHE_SLOTS = __slots__
+
     @property
     def participants(self):
         return _multiple_children_by_tag(self, EdgeTags.Participant)
@@ -278,36 +299,115 @@ class FoundationalNode(core.Node):
         :return: a list of :class:`layer0`.Terminal objects
         """
         if visited is None:
-            return sorted(self.get_terminals(punct=punct, remotes=remotes, visited=set()),
-                          key=operator.attrgetter("position"))
+            return list(self._terminals(punct=punct, remotes=remotes))
         outgoing = {e for e in set(self) - visited if remotes or not e.attrib.get("remote")}
         return [t for e in outgoing for t in e.child.get_terminals(
             punct=punct, remotes=remotes, visited=visited | outgoing)]
 
+    def _terminals(self, punct=True, remotes=False):
+        """Returns a tuple of all terminals under the span of this FoundationalNode, sorted by position.
+
+        Computed once for each node under it and cached, unless there is a cycle.
+        """
+        try:
+            return self._cached_terminals(punct, remotes, in_progress=set())
+        except _CycleError:
+            return tuple(sorted(self.get_terminals(punct=punct, remotes=remotes, visited=set()),
+                                key=operator.attrgetter("position")))
+
+    def _cached_terminals(self, punct, remotes, in_progress):
+        try:
+            spans = self._spans
+        except AttributeError:  # not computed yet
+            spans = None
+        if spans is None:
+            spans = self._spans = {}
+        key = (punct, remotes)
+        terminals = spans.get(key)
+        if terminals is None:
+            if id(self) in in_progress:
+                raise _CycleError(self.ID)
+            in_progress.add(id(self))
+            terminals = spans[key] = tuple(sorted(
+                (t for e in self._outgoing if remotes or not e.attrib.get("remote")
+                 for t in (e.child._cached_terminals(punct, remotes, in_progress)
+                           if isinstance(e.child, FoundationalNode) else
+                           e.child.get_terminals(punct=punct, remotes=remotes))),
+                key=operator.attrgetter("position")))
+        return terminals
+
+    def get_terminal_mask(self, punct=True):
+        """Returns the positions of all terminals under the span of this FoundationalNode (excluding remotes) as a bitmask.
+
+        Bit i of the mask is set if the Terminal in position i is included. Computed once for each node under it and
+        cached along with the terminals, unless there is a cycle.
+
+        :param punct: whether to include punctuation Terminals, defaults to True
+
+        :return: a non-negative int
+
+        """
+        try:
+            return self._cached_mask(punct, in_progress=set())
+        except _CycleError:
+            return terminal_mask(self.get_terminals(punct=punct, visited=set()))
+
+    def _cached_mask(self, punct, in_progress):
+        try:
+            spans = self._spans
+        except AttributeError:  # not computed yet
+            spans = None
+        if spans is None:
+            spans = self._spans = {}
+        key = ("mask", punct)
+        mask = spans.get(key)
+        if mask is None:
+            if id(self) in in_progress:
+                raise _CycleError(self.ID)
+            in_progress.add(id(self))
+            mask = 0
+            for e in self._outgoing:
+                if not e.attrib.get("remote"):
+                    mask |= e.child._cached_mask(punct, in_progress) if isinstance(e.child, FoundationalNode) else \
+                        terminal_mask(e.child.get_terminals(punct=punct))
+            spans[key] = mask
+        return mask
+
+    def _invalidate_spans(self):
+        # Nodes are cached only after all nodes under them, so once a node with nothing cached is reached,
+        # there is nothing cached above it either
+        self._spans = None
+        nodes = self.parents
+        while nodes:
+            node = nodes.pop()
+            if getattr(node, "_spans", None):
+                node._spans = None
+                nodes += node.parents
+
     @property
     def start_position(self):
         try:
-            return self.get_terminals()[0].position
+            return self._terminals()[0].position
         except IndexError:  # implicit unit or having no Terminals
             return -1
 
     @property
     def end_position(self):
         try:
-            return self.get_terminals()[-1].position
+            return self._terminals()[-1].position
         except IndexError:  # implicit unit or having no Terminals
             return -1
 
     @property
     def discontiguous(self):
-        terms = self.get_terminals()
+        terms = self._terminals()
         return any(terms[i].position + 1 != terms[i + 1].position
                    for i in range(len(terms) - 1))
 
     def get_sequences(self):
         if self.attrib.get('implicit'):
             return []
-        pos = sorted([x.position for x in self.get_terminals()])
+        pos = [x.position for x in self._terminals()]
 
         # all terminals which end a sequence, including the last one
         seq_closers = [pos[i] for i in range(len(pos) - 1)
@@ -320,7 +420,7 @@ class FoundationalNode(core.Node):
 
     def to_text(self):
         """Returns the text in the span of self, separated by spaces."""
-        return ' '.join(t.text for t in self.get_terminals())
+        return ' '.join(t.text for t in self._terminals())
 
     def is_scene(self):
         return self.state is not None or self.process is not None
@@ -376,6 +476,8 @@ class PunctNode(FoundationalNode):
 
     """
 
+    __slots__ = ()
+
     def add(self, edge_tag, node, *, edge_attrib=None):
         if node.layer.ID != layer0.LAYER_ID:
             raise ValueError("Non-terminal child (%s) for %s node (%s)" % (node.ID, NodeTags.Punctuation, self.ID))
@@ -398,6 +500,12 @@ class PunctNode(FoundationalNode):
         """
         return self.children if punct else ()
 
+    def _cached_terminals(self, punct, remotes, in_progress):
+        return tuple(self.get_terminals(punct))
+
+    def _cached_mask(self, punct, in_progress):
+        return terminal_mask(self.get_terminals(punct))
+
     def __str__(self):
         return self.to_text()
 
@@ -428,11 +536,9 @@ class Layer1(core.Layer):
 
     def next_id(self):
         """Returns the next available ID string for this layer."""
-        for n in itertools.count(start=len(self._all) + 1):
+        for n in itertools.count(start=len(self._all_nodes) + 1):  # the count does not require sorting the nodes
             id_str = "{}{}{}".format(LAYER_ID, core.Node.ID_SEPARATOR, n)
-            try:
-                self._root.by_id(id_str)
-            except KeyError:
+            if id_str not in self._root._nodes:  # by_id would format an error message listing all IDs
                 return id_str
 
     def add_fnode_multiple(self, parent, edge_categories, *, implicit=False, edge_attrib=None):
@@ -565,6 +671,8 @@ class Layer1(core.Layer):
 
     def _update_edge(self, edge):
         """Adds the Edge to the Layer, and updates top scenes and linkers."""
+        if self._root._builder is not None:
+            return  # updated once by _finalize instead
         self._update_top_scene(edge.parent)
         self._update_top_scene(edge.child)
         for lkg in [x for x in edge.parent.parents
@@ -574,12 +682,40 @@ class Layer1(core.Layer):
                     if x.tag == NodeTags.Linkage]:
             self._update_top_linkage(lkg)
 
+    def _finalize(self):
+        """Finds all top-level scenes and linkages at once, after building the Passage in bulk."""
+        covered = {}  # id(node) -> whether node is a scene or is within one (the head FNode is never within one)
+
+        def _is_covered(node):
+            path = []
+            value = False
+            while node is not None and node is not self._head_fnode:
+                value = covered.get(id(node))
+                if value is not None:
+                    break
+                path.append(node)
+                value = node.is_scene()
+                if value:
+                    break
+                node = node.fparent
+            for path_node in path:
+                covered[id(path_node)] = value
+            return value
+
+        self._scenes = [node for node in self._all if node.tag == NodeTags.Foundational and
+                        node.is_scene() and not _is_covered(node.fparent)]
+        scene_ids = {id(node) for node in self._scenes}
+        self._linkages = [node for node in self._all if node.tag == NodeTags.Linkage and
+                          all(id(fnode) in scene_ids for fnode in node.arguments)]
+
     def _add_edge(self, edge):
         super()._add_edge(edge)
+        edge.parent._invalidate_spans()
         self._update_edge(edge)
 
     def _remove_edge(self, edge):
         super()._remove_edge(edge)
+        edge.parent._invalidate_spans()
         self._update_edge(edge)
 
     def _change_edge_tag(self, edge, old_tag):
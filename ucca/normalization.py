@@ -1,4 +1,4 @@
-from ucca import layer0, layer1
+from ucca import core, layer0, layer1
 from ucca.layer0 import NodeTags as L0Tags
 from ucca.layer1 import EdgeTags as ETags, NodeTags as L1Tags
 
@@ -31,8 +31,25 @@ def fparent(node_or_edge):
             return node_or_edge.parents[0] if node_or_edge.parents else None
 
 
+def ancestor_ids(node):
+    """
+    :param node: Node to start from
+    :return: set of ids of node and of all nodes it is reachable from (following remote edges too), i.e., of the nodes
+             whose iter() would yield it; found by walking up from node, which is usually much shorter than down
+    """
+    ids = {id(node)}
+    waiting = [node]
+    while waiting:
+        for edge in waiting.pop()._incoming:
+            parent = edge.parent
+            if id(parent) not in ids:
+                ids.add(id(parent))
+                waiting.append(parent)
+    return ids
+
+
 def remove_unmarked_implicits(node):
-    while node is not None and not node.children and not node.attrib.get("implicit"):
+    while node is not None and not len(node) and not node.attrib.get("implicit"):
         parent = fparent(node)
         if parent is None:
             break
@@ -68,7 +85,7 @@ def copy_edge(edge, parent=None, child=None, tag=None, attrib=None):
         categories = [(tag,)]
     if attrib is None:
         attrib = edge.attrib
-    if parent in child.iter():
+    if id(child) in ancestor_ids(parent):
         # raise ValueError("Created cycle (%s->%s) when trying to normalize '%s'" % (
         #     "->".join(n.ID for n in child.iter() if parent in n.iter()), child.ID, parent))
         return False
@@ -137,10 +154,11 @@ def separate_scenes(node, l1, top_level=False):
 
 def lowest_common_ancestor(*nodes):
     parents = [nodes[0]] if nodes else []
+    ancestors = [ancestor_ids(n) for n in nodes[1:]]
     while parents:
         for parent in parents:
-            if parent.tag == L1Tags.Foundational and (not parent.terminals or nodes[1:]) \
-                    and all(n in parent.iter() for n in nodes[1:]):
+            if parent.tag == L1Tags.Foundational and (nodes[1:] or not parent.terminals) \
+                    and all(id(parent) in ids for ids in ancestors):
                 return parent
         parents = [p for n in parents for p in n.parents]
     return None
@@ -327,30 +345,47 @@ def normalize_node(node, l1, extra):
 def normalize(passage, extra=False):
     l0 = passage.layer(layer0.LAYER_ID)
     l1 = passage.layer(layer1.LAYER_ID)
+    with core.PassageBuilder(passage):  # Update the top-level scenes and linkages only once, when done
+        _normalize(l0, l1, extra)
+
+
+def _normalize(l0, l1, extra):
     reattach_punct(l0, l1)
     heads = list(l1.heads)
-    stack = [heads]
-    visited = set()
+    # Each frame is [edges, index, prefix]: when returning to a frame, its edges are scanned again from the start, to
+    # find any edges added while normalizing the descendants. If the edges before index are still exactly prefix, and
+    # they were all found visited when last scanned, scanning them again would change nothing, so resume from index.
+    stack = [[heads, 0, []]]
+    visited = {}  # id(node) -> node, keeping the nodes referenced so that their ids are not reused
     path = []
     path_set = set()
     while stack:
-        for edge in stack[-1]:
+        frame = stack[-1]
+        edges, start, prefix = frame
+        if start and edges[:start] != prefix:
+            start = 0
+        index = start
+        while index < len(edges):
+            edge = edges[index]
             try:
                 node = edge.child
             except AttributeError:
                 node = edge
-            if node in path_set:
+            if id(node) in path_set:
                 destroy(edge)
-            elif node not in visited:
-                visited.add(node)
+                start = None  # not all edges scanned were found visited, so scan them again next time
+            elif id(node) not in visited:
+                frame[1:] = (0, []) if start is None else (index, edges[:index])
+                visited[id(node)] = node
                 path.append(node)
-                path_set.add(node)
-                stack.append(node)
+                path_set.add(id(node))
+                stack.append([node._outgoing, 0, []])
                 normalize_node(node, l1, extra)
                 break
+            index += 1
         else:
             if path:
-                path_set.remove(path.pop())
+                path_set.remove(id(path.pop()))
             stack.pop()
     reattach_punct(l0, l1)
     if extra:
@@ -0,0 +1,104 @@
+"""Statistical significance of the difference between the evaluation scores of two systems on the same passages.
+
+Both tests resample per-passage unit counts (rather than re-running evaluation), vectorized with NumPy,
+so that thousands of samples over a large corpus take seconds.
+"""
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+from ucca.evaluation import LABELED
+
+COUNT_ATTRS = ("num_matches", "num_guessed", "num_ref")
+EPSILON = 1e-12  # tolerance when comparing sampled differences to the observed one
+
+Significance = namedtuple("Significance", ("f1", "other_f1", "difference", "p_value", "samples"))
+
+
+def passage_counts(scores, eval_type=LABELED):
+    """
+    :param scores: iterable of evaluation.Scores objects, one per passage
+    :param eval_type: evaluation type to take the counts of
+    :return: NumPy array of shape (passages, 3), with the number of matching, guessed and reference units in each
+             passage, over the default constructions (primary and remote), as in Scores.average_f1
+    """
+    return np.array([[getattr(s[eval_type].aggregate_default(), attr) for attr in COUNT_ATTRS] for s in scores],
+                    dtype=np.int64).reshape(-1, len(COUNT_ATTRS))
+
+
+def f1(counts):
+    """
+    :param counts: array whose last axis has the number of matching, guessed and reference units
+    :return: array of F1 scores, computed as in evaluation.SummaryStatistics
+    """
+    matches, guessed, ref = np.moveaxis(np.asarray(counts, dtype=float), -1, 0)
+    total = guessed + ref
+    return np.where(total == 0, 1.0, 2 * matches / np.where(total == 0, 1, total))
+
+
+def _check(counts1, counts2):
+    counts1, counts2 = (np.asarray(c, dtype=float).reshape(-1, len(COUNT_ATTRS)) for c in (counts1, counts2))
+    if counts1.shape != counts2.shape:
+        raise ValueError("Number of passages does not match: %d != %d" % (len(counts1), len(counts2)))
+    return counts1, counts2
+
+
+def _batches(samples, batch_size):
+    for start in range(0, samples, batch_size):
+        yield min(batch_size, samples - start)
+
+
+def paired_bootstrap(counts1, counts2, samples=10000, seed=None, batch_size=100):
+    """
+    Paired bootstrap test: resample passages with replacement, and count how often the difference in F1 between the
+    systems deviates from the observed difference by at least the observed difference itself (two-sided).
+    :param counts1: per-passage counts of the first system, as returned by passage_counts
+    :param counts2: per-passage counts of the second system, on the same passages in the same order
+    :param samples: number of bootstrap samples
+    :param seed: random seed
+    :param batch_size: number of samples to compute at once
+    :return: Significance tuple
+    """
+    counts1, counts2 = _check(counts1, counts2)
+    both = np.concatenate((counts1, counts2), axis=1)
+    scores = f1(counts1.sum(axis=0)), f1(counts2.sum(axis=0))
+    observed = scores[0] - scores[1]
+    rng = np.random.default_rng(seed)
+    n = len(both)
+    exceeding = 0
+    for size in _batches(samples, batch_size) if n else ():
+        indices = rng.integers(n, size=(size, n)) + n * np.arange(size)[:, None]  # passages drawn for each sample
+        sums = np.bincount(indices.ravel(), minlength=size * n).reshape(size, n).astype(float) @ both
+        differences = f1(sums[:, :len(COUNT_ATTRS)]) - f1(sums[:, len(COUNT_ATTRS):])
+        exceeding += np.count_nonzero(np.abs(differences - observed) >= abs(observed) - EPSILON)
+    return Significance(float(scores[0]), float(scores[1]), float(observed),
+                        float((exceeding + 1) / (samples + 1)) if n else 1.0, samples)
+
+
+def approximate_randomization(counts1, counts2, samples=10000, seed=None, batch_size=100):
+    """
+    Approximate randomization test: swap the outputs of the two systems on each passage with probability 1/2, and
+    count how often the absolute difference in F1 is at least the observed one.
+    :param counts1: per-passage counts of the first system, as returned by passage_counts
+    :param counts2: per-passage counts of the second system, on the same passages in the same order
+    :param samples: number of random shuffles
+    :param seed: random seed
+    :param batch_size: number of shuffles to compute at once
+    :return: Significance tuple
+    """
+    counts1, counts2 = _check(counts1, counts2)
+    totals = counts1.sum(axis=0), counts2.sum(axis=0)
+    scores = f1(totals[0]), f1(totals[1])
+    observed = scores[0] - scores[1]
+    differences_by_passage = counts2 - counts1
+    rng = np.random.default_rng(seed)
+    exceeding = 0
+    for size in _batches(samples, batch_size):
+        shifts = (rng.random((size, len(counts1))) < 0.5).astype(float) @ differences_by_passage
+        differences = f1(totals[0] + shifts) - f1(totals[1] - shifts)
+        exceeding += np.count_nonzero(np.abs(differences) >= abs(observed) - EPSILON)
+    return Significance(float(scores[0]), float(scores[1]), float(observed), float((exceeding + 1) / (samples + 1)),
+                        samples)
+
+
+TESTS = OrderedDict((("bootstrap", paired_bootstrap), ("randomization", approximate_randomization)))
@@ -1,9 +1,11 @@
+import pickle
 from collections import OrderedDict
 
 import pytest
 
-from ucca import textutil
-from ucca.constructions import CATEGORIES_NAME, DEFAULT, CONSTRUCTIONS, extract_candidates
+from ucca import textutil, layer0, layer1
+from ucca.constructions import CATEGORIES_NAME, DEFAULT, CONSTRUCTIONS, ALL_EDGES, extract_candidates, \
+    create_category_construction, get_node_yield, positions, Yield
 from .conftest import PASSAGES, loaded, loaded_valid, multi_sent, crossing, discontiguous, l1_passage, empty
 
 """Tests the constructions module functions and classes."""
@@ -45,3 +47,33 @@ def test_extract_all(create, expected):
 def test_extract(create, constructions, monkeypatch):
     monkeypatch.setattr(textutil, "get_nlp", assert_spacy_not_loaded)
     extract_and_check(create(), constructions=constructions)
+
+
+@pytest.mark.parametrize("construction", CONSTRUCTIONS + (ALL_EDGES, create_category_construction("A")), ids=str)
+def test_pickle_construction(construction):
+    copy = pickle.loads(pickle.dumps(construction))
+    assert copy == construction and type(copy) is type(construction)
+    assert copy.description == construction.description and copy.default == construction.default
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+@pytest.mark.parametrize("punct", (True, False), ids=("punct", ""))
+def test_node_yield(create, punct):
+    p = create()
+    for node in p.layer(layer0.LAYER_ID).all + p.layer(layer1.LAYER_ID).all:
+        terminal_yield = get_node_yield(node, punct=punct)
+        expected = sorted({t.position for t in node.get_terminals(punct=punct)})
+        assert list(terminal_yield) == expected and len(terminal_yield) == len(expected)
+        assert terminal_yield == positions(node.get_terminals(punct=punct))
+        assert all(i in terminal_yield for i in expected) and -1 not in terminal_yield
+        for child in node.children:
+            child_yield = get_node_yield(child, punct=punct)
+            assert child_yield.issubset(terminal_yield) or any(e.attrib.get("remote") for e in child.incoming)
+
+
+def test_yield():
+    y1, y2, y3 = Yield(0b0110), Yield(0b0010), Yield(0b1000)
+    assert list(y1) == [1, 2] and 2 in y1 and 3 not in y1 and len(y1) == 2 and repr(y1) == "Yield([1, 2])"
+    assert y2.issubset(y1) and y1.issuperset(y2) and not y1.issubset(y2)
+    assert y1.overlaps(y2) and not y1.overlaps(y3) and not Yield() and list(Yield()) == []
+    assert {y1: 1}[Yield(0b0110)] == 1 and pickle.loads(pickle.dumps(y1)) == y1
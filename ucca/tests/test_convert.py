@@ -1,7 +1,10 @@
+import io
 import xml.etree.ElementTree as ETree
 
-from ucca import layer0, layer1, convert, textutil
-from .conftest import loaded, load_xml
+import pytest
+
+from ucca import core, layer0, layer1, convert, textutil
+from .conftest import loaded, load_xml, PASSAGES
 
 """Tests convert module correctness and API."""
 
@@ -165,6 +168,78 @@ def test_from_standard():
     assert passage.equals(ref, ordered=True)
 
 
+@pytest.mark.parametrize("chunk_size", (7, convert.STREAM_CHUNK_SIZE))
+def test_iter_standard(monkeypatch, chunk_size):
+    monkeypatch.setattr(convert, "STREAM_CHUNK_SIZE", chunk_size)
+    passages = [create() for create in PASSAGES] + [convert.from_standard(load_xml("test_files/standard3.xml"))]
+    xml = "\n".join('<?xml version="1.0" encoding="utf-8"?>\n' + ETree.tostring(convert.to_standard(p)).decode()
+                     for p in passages)
+    streamed = list(convert.iter_standard(io.StringIO(xml)))
+    assert len(streamed) == len(passages)
+    for passage, other in zip(passages, streamed):
+        assert passage.ID == other.ID
+        assert passage.equals(other, ordered=True)
+        assert ETree.tostring(convert.to_standard(passage)) == ETree.tostring(convert.to_standard(other))
+        assert [n.ID for n in passage.layer(layer1.LAYER_ID).top_scenes] == \
+            [n.ID for n in other.layer(layer1.LAYER_ID).top_scenes]
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+@pytest.mark.parametrize("indent", (True, False), ids=("indent", "no_indent"))
+def test_write_standard(tmpdir, create, indent):
+    passage = create()
+    for terminal in passage.layer(layer0.LAYER_ID).all[:1]:
+        terminal.attrib["text"] = 'a<b>&"c\'\n\t\u00e9'
+    xml = ETree.tostring(convert.to_standard(passage)).decode()
+    out = io.StringIO()
+    convert.write_standard(passage, out, indent=indent)
+    assert out.getvalue() == (textutil.indent_xml(xml) if indent else xml)
+    filename = str(tmpdir.join("passage.xml"))
+    convert.passage2file(passage, filename, indent=indent)
+    copy = convert.file2passage(filename)
+    assert passage.equals(copy, ordered=True)
+    assert ETree.tostring(convert.to_standard(copy)).decode() == xml
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_binary(tmpdir, create):
+    passage = create()
+    passage.layer(layer0.LAYER_ID).extra["doc"] = [["x"]]
+    for edge in passage.layer(layer1.LAYER_ID).heads[0]:
+        edge.extra["remark"] = "\u00e9"
+        edge.categories[0].extra["n"] = 1
+    copy = convert.from_binary(convert.to_binary(passage))
+    assert passage.equals(copy, ordered=True)
+    assert ETree.tostring(convert.to_standard(copy)) == ETree.tostring(convert.to_standard(passage))
+    assert [[c.extra for c in e] for e in copy.layer(layer1.LAYER_ID).heads[0]] == \
+        [[c.extra for c in e] for e in passage.layer(layer1.LAYER_ID).heads[0]]
+    filename = str(tmpdir.join("passage" + convert.BINARY_EXTENSION))
+    convert.passage2file(passage, filename)
+    assert passage.equals(convert.file2passage(filename), ordered=True)
+    columns = passage.layer(layer0.LAYER_ID).columns
+    for start, stop in ((0, None), (1, 3)):
+        read = convert.binary2terminals(filename, start, stop)
+        for field, expected in zip(read, columns):
+            assert list(field) == list(expected[start:stop])
+
+
+def test_binary_no_text(tmpdir):
+    passage = core.Passage("1")
+    l0 = layer0.Layer0(passage)
+    layer1.Layer1(passage)
+    l0.add_terminal(text="a", punct=False)
+    l0.add_terminal(text=None, punct=True)
+    filename = str(tmpdir.join("passage" + convert.BINARY_EXTENSION))
+    convert.passage2file(passage, filename)
+    assert [t.text for t in convert.file2passage(filename).layer(layer0.LAYER_ID).all] == ["a", None]
+    assert convert.binary2terminals(filename).text == ("a", None)
+
+
+def test_binary_invalid():
+    with pytest.raises(core.UCCAError):
+        convert.from_binary(b"<root/>" + bytes(100))
+
+
 def test_from_text():
     sample = ["Hello . again", "nice", " ? ! end", ""]
     passage = next(convert.from_text(sample))
@@ -1,5 +1,7 @@
 """Testing code for the ucca package, unit-testing only."""
 
+import pickle
+
 import pytest
 
 from ucca import core, layer0, layer1
@@ -177,3 +179,118 @@ def test_iteration():
     assert list(node21.iter(duplicates=True)) == [node21, node11, node12, node13, node11]
     assert list(node21.iter()) == [node21, node11, node12, node13]
     assert list(node22.iter(method="bfs", duplicates=True)) == [node22, node11, node12, node13, node13, node11]
+
+
+def test_ordering():
+    p = core.Passage("1")
+    l1 = core.Layer("1", p)
+    nodes = {i: core.Node(ID="1.%d" % i, root=p, tag=str(i)) for i in (3, 10, 1, 2)}
+    assert [x.ID for x in l1.all] == ["1.1", "1.2", "1.3", "1.10"]
+    nodes[10].add("test", nodes[2])
+    nodes[1].add("test", nodes[10])
+    nodes[1].add("test", nodes[3])
+    assert [x.ID for x in l1.heads] == ["1.1"]
+    assert [x.ID for x in nodes[1].children] == ["1.3", "1.10"]
+    nodes[1].remove(nodes[10])
+    assert [x.ID for x in l1.heads] == ["1.1", "1.10"]
+    l1.orderkey = lambda x: -int(x.ID.split(".")[1])
+    assert [x.ID for x in l1.all] == ["1.10", "1.3", "1.2", "1.1"]
+    assert [x.ID for x in l1.heads] == ["1.10", "1.1"]
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_pickle(create):
+    p1 = create()
+    p2 = pickle.loads(pickle.dumps(p1))
+    assert p1.equals(p2, ordered=True)
+    for lid in (layer0.LAYER_ID, layer1.LAYER_ID):
+        assert [x.ID for x in p1.layer(lid).all] == [x.ID for x in p2.layer(lid).all]
+        assert [x.ID for x in p1.layer(lid).heads] == [x.ID for x in p2.layer(lid).heads]
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_builder(create):
+    p1 = create()
+    p2 = core.Passage(p1.ID)
+    with core.PassageBuilder(p2) as builder:
+        layer0.Layer0(p2)
+        layer1.Layer1(p2)
+        for node in sorted(p1.nodes.values(), key=core.id_orderkey):
+            if node.ID not in p2.nodes:
+                type(node)(ID=node.ID, root=p2, tag=node.tag, attrib=node.attrib.copy())
+        with core.PassageBuilder(p2):  # nested contexts are merged
+            builder.add_edges((p2.by_id(edge.parent.ID), p2.by_id(edge.child.ID), map(tuple, edge.categories),
+                               edge.attrib.copy()) for node in p1.nodes.values() for edge in node)
+        assert p2.layer(layer1.LAYER_ID).top_scenes == []
+    assert p1.equals(p2, ordered=True)
+    for lid in (layer0.LAYER_ID, layer1.LAYER_ID):
+        assert [x.ID for x in p1.layer(lid).heads] == [x.ID for x in p2.layer(lid).heads]
+    l1, l2 = [p.layer(layer1.LAYER_ID) for p in (p1, p2)]
+    assert [x.ID for x in l1.top_scenes] == [x.ID for x in l2.top_scenes]
+    assert [x.ID for x in l1.top_linkages] == [x.ID for x in l2.top_linkages]
+    p2.frozen = True
+    with pytest.raises(core.FrozenPassageError):
+        with core.PassageBuilder(p2):
+            pass
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_slots(create):
+    p = create()
+    for node in p.nodes.values():
+        assert not hasattr(node, "__dict__")
+        for edge in node:
+            assert not hasattr(edge, "__dict__")
+            for category in edge:
+                assert not hasattr(category, "__dict__")
+    node = p.layer(layer1.LAYER_ID).heads[0]
+    state = node.__getstate__()  # the dictionary pickled before __slots__ were used
+    assert {"_tag", "_root", "_ID", "_attrib", "_outgoing", "_incoming", "_orderkey", "extra"} == set(state)
+    node.extra["x"] = 1
+    copy = pickle.loads(pickle.dumps(p))
+    assert copy.layer(layer1.LAYER_ID).heads[0].extra["x"] == 1
+
+
+@pytest.mark.parametrize("create", PASSAGES)
+def test_fingerprint(create):
+    p1 = create()
+    p2 = pickle.loads(pickle.dumps(p1))
+    p2._ID = p1.ID + "_copy"  # the ID is not part of the fingerprint
+    assert p1.fingerprint() == p2.fingerprint()
+    assert p1.fingerprint(ordered=True) == p2.fingerprint(ordered=True)
+    assert not p1.missing_nodes(p2) and not p2.missing_nodes(p1)
+    nodes = [n for n in p2.layer(layer1.LAYER_ID).all if n.outgoing]
+    if not nodes:
+        return  # no edge to change
+    node = nodes[0]
+    edge = node.outgoing[0]
+    edge.tag = layer1.EdgeTags.Adverbial if edge.tag != layer1.EdgeTags.Adverbial else layer1.EdgeTags.Elaborator
+    assert p1.fingerprint() != p2.fingerprint()
+    assert not (p1.equals(p2) or p2.equals(p1))
+    missing = p2.missing_nodes(p1)
+    assert node in missing
+    assert all(n.ID != edge.child.ID for n in missing)
+    assert [e.ID for e in node.missing_edges(p1.by_id(node.ID))] == [edge.ID]
+
+
+def test_fingerprint_attribute_values():
+    p1, p2 = basic(), basic()
+    p1.by_id("1.3").attrib["node"] = True
+    p2.by_id("1.3").attrib["node"] = 1.0
+    p1.attrib["extra"] = {"a": 1, "b": [1.0]}
+    p2.attrib["extra"] = {"b": [True], "a": 1.0}
+    assert p1.equals(p2) and p2.equals(p1)
+    assert p1.fingerprint() == p2.fingerprint()
+    p2.by_id("1.3").attrib["node"] = 1.5
+    assert not p1.equals(p2) and p1.fingerprint() != p2.fingerprint()
+    assert core.canonical_value(float("inf")) == float("inf")  # not an integer
+
+
+def test_canonical_hashes():
+    p = basic()
+    node11, node12, node13 = (p.by_id("1." + str(i)) for i in range(1, 4))
+    hashes = core.canonical_hashes(p.nodes.values())
+    assert len(hashes) == len(p.nodes)
+    assert hashes[id(node11)] != hashes[id(node13)]  # different tags
+    assert core.canonical_hashes([node12], ignore_node=lambda n: n is not node12)[id(node12)] == \
+        core.canonical_hashes([node12], ignore_edge=lambda e: True)[id(node12)]
@@ -6,7 +6,7 @@ from itertools import repeat
 import pytest
 
 from ucca import core, layer0, layer1, convert
-from ucca.evaluation import evaluate, LABELED, UNLABELED, WEAK_LABELED
+from ucca.evaluation import evaluate, normalized, ConfusionMatrix, EvaluationCache, ReferenceIndex, Scores, UNMATCHED, EVAL_TYPES, LABELED, UNLABELED, WEAK_LABELED
 from ucca.validation import validate
 from .conftest import PASSAGES, load_xml
 
@@ -298,7 +298,7 @@ def test_evaluate_self(create, units, errors, normalize):
     check_primary_remote(scores, 1.0)
 
 
-@pytest.mark.parametrize("create1, create2, f1", (
+EVALUATE_PAIRS = (
                                  (passage1, passage2, {(LABELED, PRIMARY): 0.5, (LABELED, REMOTE): 0.4, (LABELED, IMPLICIT): 1,
                                                        (UNLABELED, PRIMARY): 0.75, (UNLABELED, REMOTE): 0.8, (UNLABELED, IMPLICIT): 1,
                                                        (WEAK_LABELED, PRIMARY): 7/12, (WEAK_LABELED, REMOTE): 0.8, (WEAK_LABELED, IMPLICIT): 1}),
@@ -323,7 +323,10 @@ def test_evaluate_self(create, units, errors, normalize):
                                  ({(LABELED, PRIMARY): 2/(11/5+13/5), (LABELED, REMOTE): 0, (LABELED, IMPLICIT): 0,
                                    (UNLABELED, PRIMARY): 2/(1+13/11), (UNLABELED, REMOTE): 0, (UNLABELED, IMPLICIT): 0,
                                    (WEAK_LABELED, PRIMARY): 0.5, (WEAK_LABELED, REMOTE): 0, (WEAK_LABELED, IMPLICIT): 0},),
-                         ))
+                         )
+
+
+@pytest.mark.parametrize("create1, create2, f1", EVALUATE_PAIRS)
 def test_evaluate(create1, create2, f1, units=False, errors=False):
     p1 = create1()
     p2 = create2()
@@ -334,3 +337,99 @@ def test_evaluate(create1, create2, f1, units=False, errors=False):
         if not before:
             assert not after
     check_primary_remote(scores, f1)
+
+
+def counts(scores):
+    return {(eval_type, str(construction)): (stats.num_matches, stats.num_only_guessed, stats.num_only_ref, stats.errors)
+            for eval_type, results in scores.evaluators.items() for construction, stats in results.results.items()}
+
+
+@pytest.mark.parametrize("create1, create2", [(create, create) for create in PASSAGES + (function1, function2)] +
+                         [pair[:2] for pair in EVALUATE_PAIRS])
+def test_evaluate_not_inplace(create1, create2):
+    passages = [create1(), create2()]
+    before = [convert.ET.tostring(convert.to_standard(p)) for p in passages]
+    ref = normalized(passages[1])
+    assert ref.extra == passages[1].extra  # nothing added that would be serialized
+    for guessed in passages[0], passages[0]:  # reusing the normalized reference
+        scores = evaluate(guessed, ref, errors=True, inplace=False)
+        assert [convert.ET.tostring(convert.to_standard(p)) for p in passages] == before
+    assert counts(scores) == counts(evaluate(*passages, errors=True))
+
+
+@pytest.mark.parametrize("normalize", (True, False), ids=("normalize", ""))
+def test_reference_index(tmpdir, normalize):
+    pairs = [pair[:2] for pair in EVALUATE_PAIRS]
+    refs = [create2() for _, create2 in pairs]
+    before = [convert.ET.tostring(convert.to_standard(p)) for p in refs]
+    index = ReferenceIndex(refs, normalize=normalize)
+    filename = str(tmpdir.join("index.pickle"))
+    index.save(filename)
+    for reference_index in index, ReferenceIndex.load(filename):
+        for (create1, create2), ref in zip(pairs, refs):
+            for _ in range(2):
+                scores = evaluate(create1(), ref, errors=True, normalize=normalize, reference_index=reference_index)
+                assert counts(scores) == counts(evaluate(create1(), create2(), errors=True, normalize=normalize))
+        assert len(reference_index) == len(refs)
+        assert all(ref in reference_index for ref in refs)
+    assert [convert.ET.tostring(convert.to_standard(p)) for p in refs] == before
+    refs[0].attrib["changed"] = True
+    assert refs[0] not in index
+    with pytest.raises(ValueError):
+        evaluate(refs[1], refs[1], normalize=not normalize, reference_index=index)
+
+
+@pytest.mark.parametrize("create1, create2", [pair[:2] for pair in EVALUATE_PAIRS])
+def test_evaluate_eval_types(create1, create2):
+    scores = counts(evaluate(create1(), create2(), errors=True))
+    for eval_type in EVAL_TYPES:
+        assert counts(evaluate(create1(), create2(), errors=True, eval_type=eval_type)) == \
+               {k: v for k, v in scores.items() if k[0] == eval_type}
+
+
+def test_confusion_matrix(tmpdir):
+    m1, m2 = ConfusionMatrix(), ConfusionMatrix()
+    m1.update([({"A"}, {"A"}), ({"A"}, {"A"}), (set(), {"H"}), ({"S", "A"}, {"P"})])
+    m2.update([({"A"}, {"A"}), ({"D"}, ())])
+    assert m1["A", "A"] == 2 and m1[UNMATCHED, "H"] == 1 and m1["A|S", "P"] == 1 and m1["H", "A"] == 0
+    assert len(m1) == 3 and not ConfusionMatrix() and m1
+    total = ConfusionMatrix.aggregate([m1, None, m2])
+    assert total == m1 + m2 == sum([m1, m2]) and total != m1
+    assert total.most_common()[0] == (("A", "A"), 3) and sum(c for _, c in total.most_common()) == 6
+    rows, cols, counts = total.table()
+    assert rows == [UNMATCHED, "A", "A|S", "D"] and cols == [UNMATCHED, "A", "H", "P"] and counts.sum() == 6
+    buf = StringIO()
+    total.to_csv(buf)
+    assert buf.getvalue().splitlines()[:3] == ["guessed\\ref,<UNMATCHED>,A,H,P", "<UNMATCHED>,0,0,1,0", "A,0,3,0,0"]
+    filename = str(tmpdir.join("errors.npz"))
+    total.save_npz(filename)
+    assert ConfusionMatrix.load_npz(filename) == total
+
+
+def test_confusion_matrix_aggregate():
+    pairs = [pair[:2] for pair in EVALUATE_PAIRS]
+    scores = [evaluate(create1(), create2(), errors=True, eval_type=LABELED) for create1, create2 in pairs]
+    summary = Scores.aggregate(scores)
+    errors = summary[LABELED][PRIMARY].errors
+    assert sum(c for _, c in errors.most_common()) == sum(
+        sum(c for _, c in s[LABELED][PRIMARY].errors.most_common()) for s in scores)
+    for (guessed, ref), count in errors.most_common():
+        assert count == sum(s[LABELED][PRIMARY].errors[guessed, ref] for s in scores)
+
+
+def test_evaluation_cache(tmpdir):
+    cache = EvaluationCache(str(tmpdir.join("cache")))
+    for create1, create2 in [pair[:2] for pair in EVALUATE_PAIRS]:
+        key = cache.key(create1(), create2(), errors=True)
+        assert key == cache.key(create1(), create2(), errors=True, fscore=False, units=True)
+        assert key != cache.key(create1(), create2(), errors=True, verbose=True)  # output is stored too
+        assert len({key, cache.key(create1(), create2()), cache.key(create1(), create2(), errors=True, normalize=False),
+                    cache.key(create1(), create2(), errors=True, eval_type=LABELED),
+                    cache.key(create2(), create1(), errors=True)}) == 5
+        assert key not in cache and cache.get(key) is None
+        scores = evaluate(create1(), create2(), errors=True)
+        cache.put(key, scores, "output")
+        assert key in cache and counts(cache.get(key)[0]) == counts(scores) and cache.get(key)[1] == "output"
+        changed = create1()
+        changed.attrib["changed"] = True
+        assert cache.key(changed, create2(), errors=True) not in cache
@@ -81,6 +81,57 @@ def test_load_multiple_passages():
     _test_passages(passages)
 
 
+def test_load_concatenated_passages(tmpdir):
+    """Test lazy-loading passages from a file with several standard XML root elements"""
+    with open("test_files/standard3.xml", encoding="utf-8") as f:
+        xml = f.read()
+    filename = str(tmpdir.join("concatenated.xml"))
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(3 * xml)
+    passages = list(ioutil.read_files_and_dirs([filename, "test_files/standard3.xml"]))
+    assert len(passages) == 4
+    _test_passages(passages)
+    assert all(p.equals(passages[-1]) for p in passages)
+
+
+@pytest.mark.parametrize("ordered", (True, False), ids=("ordered", "unordered"))
+def test_load_passages_workers(ordered):
+    """Test lazy-loading passages in a process pool"""
+    files = ["test_files/standard3.xml", multi_sent(), "test_files/implicit1.xml", "test_files/implicit2.xml"]
+    expected = list(ioutil.LazyLoadedPassages(files))
+    passages = ioutil.LazyLoadedPassages(files, workers=2, prefetch=1, ordered=ordered)
+    for _ in range(2):  # can be iterated more than once
+        loaded_passages = list(passages)
+        if not ordered:
+            loaded_passages.sort(key=lambda p: [p.ID for p in expected].index(p.ID))
+        assert [p.ID for p in loaded_passages] == [p.ID for p in expected]
+        assert all(p.equals(q) for p, q in zip(loaded_passages, expected))
+    next(iter(passages))
+    passages.close()
+
+
+def test_corpus_archive(tmpdir):
+    """Test lazy-loading passages from corpus archives, sequentially and by position or ID"""
+    passages = [loaded(), multi_sent(), discontiguous(), l1_passage()]
+    for i, passage in enumerate(passages):
+        passage._ID = "p%d" % i
+    filenames = [str(tmpdir.join("corpus%d" % i + convert.CORPUS_ARCHIVE_EXTENSION)) for i in range(2)]
+    assert convert.write_corpus_archive(passages[:3], filenames[0]) == 3
+    assert convert.write_corpus_archive(iter(passages[3:]), filenames[1]) == 1
+    with convert.CorpusArchive(filenames[0]) as archive:
+        assert len(archive) == 3
+        assert archive.ids == ["p0", "p1", "p2"]
+        assert archive[1].equals(passages[1]) and archive["p2"].equals(passages[2])
+    lazy = ioutil.read_files_and_dirs(filenames)
+    assert [p.ID for p in lazy] == ["p0", "p1", "p2", "p3"]
+    assert all(p.equals(q) for p, q in zip(passages, lazy))
+    assert lazy.get(3).equals(passages[3]) and lazy.get(-4).equals(passages[0]) and lazy.get("p1").equals(passages[1])
+    with pytest.raises(IndexError):
+        lazy.get(4)
+    with pytest.raises(KeyError):
+        lazy.get("p4")
+
+
 def test_shuffle_passages():
     """Test lazy-loading passages and shuffling them"""
     files = 3 * ["test_files/standard3.xml"]
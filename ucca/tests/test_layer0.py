@@ -63,3 +63,24 @@ def test_layer0():
     assert [t.para_pos for t in l0.all] == [1, 1, 2]
     assert l0.words == (t1, t3)
     assert p.copy(layer0.LAYER_ID).equals(p)
+
+
+def test_columns():
+    p = core.Passage("1")
+    l0 = layer0.Layer0(p)
+    assert l0.positions().tolist() == l0.paragraph_ends().tolist() == []
+    l0.add_terminal(text="1", punct=False)
+    l0.add_terminal(text="2", punct=True)
+    l0.add_terminal(text="3", punct=False, paragraph=2)
+    assert l0.positions().tolist() == [1, 2, 3]
+    assert l0.positions(punct=False).tolist() == [1, 3]
+    assert l0.paragraph_ends().tolist() == [2, 3]
+    assert l0.columns.text == ("1", "2", "3")
+    l0.add_terminal(text="4", punct=False, paragraph=2)
+    l0.by_position(1).tag = layer0.NodeTags.Punct
+    assert l0.columns.punct.tolist() == [True, True, False, False]
+    assert l0.paragraph_ends().tolist() == [2, 4]
+    l0.by_position(4)._attrib["paragraph"] = 3
+    l0.by_position(3)._attrib["text"] = "three"
+    assert l0.paragraph_ends().tolist() == [2, 3, 4]
+    assert l0.columns.text == ("1", "2", "three", "4")
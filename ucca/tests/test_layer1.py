@@ -135,3 +135,29 @@ def test_discontiguous():
     assert ps3.get_sequences() == [(15, 17)]
     assert a3.get_sequences() == [(16, 17)]
     assert not p3.get_sequences()
+
+
+def test_cached_terminals():
+    p = l1_passage()
+    l0 = p.layer("0")
+    l1 = p.layer("1")
+
+    terms = l0.all
+    head = l1.heads[0]
+    link1, ps1, ps2, link2, ps3, punct2 = head.children
+    p1, a1, punct1 = [x.child for x in ps1 if not x.attrib.get("remote")]
+
+    assert head.get_terminals() == terms
+    assert ps1.get_terminals(punct=False, remotes=True) == terms[1:9] + terms[14:15]
+    ps1.remove(a1)  # invalidates ps1 and head, but not a1
+    assert ps1.get_terminals() == terms[1:5] + terms[9:10]
+    assert head.get_terminals() == terms[:5] + terms[9:]
+    assert a1.get_terminals() == terms[5:9]
+    ps2.add(layer1.EdgeTags.Participant, a1)
+    assert ps2.start_position == 6
+    assert head.get_terminals() == terms
+    [remote] = [x for x in ps1 if x.attrib.get("remote")]
+    remote.attrib["remote"] = False
+    assert ps1.get_terminals(punct=False) == terms[1:5] + terms[14:15]
+    terms[1].tag = "Punctuation"
+    assert ps1.get_terminals(punct=False) == terms[2:5] + terms[14:15]
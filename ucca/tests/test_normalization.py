@@ -1,8 +1,12 @@
+import os
+from glob import glob
+from io import StringIO
+
 import pytest
 
-from ucca import layer1
+from ucca import convert, layer1
 from ucca.normalization import normalize, COORDINATED_MAIN_REL
-from .conftest import create_passage, attach_terminals
+from .conftest import create_passage, attach_terminals, load_xml
 
 """Tests normalization module correctness and API."""
 
@@ -390,3 +394,24 @@ def test_normalize(unnormalized, normalized):
 ))
 def test_normalize_extra(unnormalized, normalized):
     normalize_and_compare(unnormalized, normalized, extra=True)
+
+
+def load_test_file(filename):
+    try:
+        return convert.file2passage(filename)
+    except IOError:  # Site XML
+        return convert.from_site(load_xml(filename))
+
+
+@pytest.mark.parametrize("filename", sorted(glob("test_files/*.xml")))
+@pytest.mark.parametrize("extra", (False, True), ids=("default", "extra"))
+def test_normalize_files(filename, extra):
+    """Normalizing the test files must give exactly the stored output, as normalized by the original implementation"""
+    passage = load_test_file(filename)
+    normalize(passage, extra=extra)
+    out = StringIO()
+    convert.write_standard(passage, out)
+    basename, ext = os.path.splitext(os.path.basename(filename))
+    with open(os.path.join("test_files", "normalized", basename + ("_extra" if extra else "") + ext),
+              encoding="utf-8") as f:
+        assert out.getvalue() == f.read()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from ucca.evaluation import evaluate, Scores, LABELED, UNLABELED
+from ucca.significance import passage_counts, f1, TESTS
+from .conftest import PASSAGES
+
+"""Tests the significance module functions."""
+
+
+@pytest.mark.parametrize("eval_type", (LABELED, UNLABELED))
+def test_passage_counts(eval_type):
+    scores = [evaluate(create(), create(), normalize=False) for create in PASSAGES]
+    counts = passage_counts(scores, eval_type=eval_type)
+    assert counts.shape == (len(PASSAGES), 3)
+    assert f1(counts.sum(axis=0)) == pytest.approx(Scores.aggregate(scores).average_f1(eval_type))
+    assert f1(counts) == pytest.approx([s.average_f1(eval_type) for s in scores])
+
+
+def random_counts(n, seed=0):
+    rng = np.random.default_rng(seed)
+    guessed, ref = rng.integers(5, 30, n), rng.integers(5, 30, n)
+    return np.stack((np.minimum(guessed, ref) // 2, guessed, ref), axis=1)
+
+
+@pytest.mark.parametrize("test", TESTS.values(), ids=list(TESTS))
+def test_significance(test):
+    counts = random_counts(200)
+    better = counts + [[5, 0, 0]]
+    same = test(counts, counts, samples=200, seed=1)
+    assert same.difference == 0 and same.p_value == 1
+    different = test(better, counts, samples=1000, seed=1)
+    assert different.difference > 0 and different.p_value < 0.01
+    assert different == test(better, counts, samples=1000, seed=1)
+    assert different.f1 == pytest.approx(f1(better.sum(axis=0)))
+    with pytest.raises(ValueError):
+        test(counts, counts[1:])
@@ -0,0 +1,122 @@
+import datetime
+import os
+import sqlite3
+from xml.etree.ElementTree import tostring
+
+import pytest
+
+from ucca import convert
+from ucca_db import api
+from .conftest import PASSAGES
+
+"""Tests the ucca_db API: connection pooling with an sqlite stand-in, and queries with a local PostgreSQL server
+(given by the UCCA_DB_TEST_HOST and UCCA_DB_TEST_NAME environment variables, otherwise skipped)."""
+
+TEST_HOST_ENV_VAR = "UCCA_DB_TEST_HOST"
+TEST_NAME_ENV_VAR = "UCCA_DB_TEST_NAME"
+TEST_SCHEMA = "ucca_db_test"
+
+
+@pytest.fixture
+def sqlite_pool(monkeypatch, tmp_path):
+    connected = []
+
+    def connect(host_name, db_name):
+        connected.append((host_name, db_name))
+        return sqlite3.connect(str(tmp_path / (db_name + ".sqlite")), check_same_thread=False)
+
+    pool = api.ConnectionPool(connect=connect, search_path=None, server_side_cursors=False)
+    pool.connected = connected
+    monkeypatch.setattr(api, "CONNECTIONS", pool)
+    yield pool
+    pool.close()
+
+
+def test_connection_reuse(sqlite_pool):
+    c = api.get_cursor("localhost", "work")
+    c.execute("CREATE TABLE xmls (id INTEGER PRIMARY KEY, xml TEXT)")
+    c.executemany("INSERT INTO xmls (xml) VALUES (?)", [("<a/>",), ("<b/>",)])
+    api.get_connection("work", "localhost").commit()
+    for _ in range(3):
+        assert [x for x, in api.iter_rows("localhost", "work", "SELECT xml FROM xmls ORDER BY id")] == ["<a/>", "<b/>"]
+    assert sqlite_pool.connected == [("localhost", "work")]
+    api.get_cursor("localhost", "other")
+    assert sqlite_pool.connected == [("localhost", "work"), ("localhost", "other")]
+
+
+def test_iter_rows_error(sqlite_pool):
+    with pytest.raises(sqlite3.OperationalError):
+        list(api.iter_rows("localhost", "work", "SELECT xml FROM missing"))
+    assert list(api.iter_rows("localhost", "work", "SELECT 1")) == [(1,)]  # the connection can still be used
+
+
+@pytest.fixture
+def postgres_pool(monkeypatch):
+    psycopg2 = pytest.importorskip("psycopg2")
+    if TEST_HOST_ENV_VAR not in os.environ:
+        pytest.skip("%s is not set" % TEST_HOST_ENV_VAR)
+    host_name, db_name = os.environ[TEST_HOST_ENV_VAR], os.environ.get(TEST_NAME_ENV_VAR, "postgres")
+    con = psycopg2.connect(host=host_name, database=db_name)
+    with con.cursor() as c:
+        c.execute("DROP SCHEMA IF EXISTS %s CASCADE; CREATE SCHEMA %s; SET search_path TO %s" % (3 * (TEST_SCHEMA,)))
+        c.execute("CREATE TABLE users (id SERIAL PRIMARY KEY, username TEXT)")
+        c.execute("CREATE TABLE passages (id INTEGER PRIMARY KEY, passage TEXT, source TEXT)")
+        c.execute("CREATE TABLE xmls (id SERIAL PRIMARY KEY, reviewOf INTEGER, xml TEXT, paid INTEGER, prid INTEGER, "
+                  "uid INTEGER, comment TEXT, status INTEGER, ts TIMESTAMP)")
+        c.executemany("INSERT INTO users (username) VALUES (%s)", [("alice",), ("bob",), ("carol",)])
+    con.commit()
+    pool = api.ConnectionPool(search_path=TEST_SCHEMA)
+    monkeypatch.setattr(api, "CONNECTIONS", pool)
+    yield host_name, db_name
+    pool.close()
+    with con.cursor() as c:
+        c.execute("DROP SCHEMA %s CASCADE" % TEST_SCHEMA)
+    con.commit()
+    con.close()
+
+
+def site_xml(create):
+    return tostring(convert.to_site(create())).decode()
+
+
+def test_get_xml_trees(postgres_pool):
+    host_name, db_name = postgres_pool
+    xmls = {}  # (paid, username) -> most recent XML
+    start = datetime.datetime(2020, 1, 1)
+    for i, (paid, username, create) in enumerate([(1, "alice", PASSAGES[0]), (1, "bob", PASSAGES[1]),
+                                                  (1, "alice", PASSAGES[2]), (2, "alice", PASSAGES[3]),
+                                                  (2, "bob", PASSAGES[0])]):
+        xmls[paid, username] = site_xml(create)
+        with api.get_cursor(host_name, db_name) as c:
+            c.execute("INSERT INTO xmls (reviewOf, xml, paid, prid, uid, comment, status, ts) "
+                      "SELECT -1, %s, %s, 1, id, '', 1, %s FROM users WHERE username=%s RETURNING id",
+                      (xmls[paid, username], paid, start + datetime.timedelta(days=i), username))
+        api.get_connection(db_name, host_name).commit()
+    assert [tostring(x).decode() for x in api.get_xml_trees(host_name, db_name, 1, ["bob", "alice"])] == \
+        [xmls[1, "bob"], xmls[1, "alice"]]
+    with pytest.raises(Exception):
+        api.get_xml_trees(host_name, db_name, 1, ["alice", "carol"])
+    assert len(api.get_xml_trees(host_name, db_name, 1, ["carol", "alice"], graceful=True)) == 1
+    with pytest.raises(Exception):
+        api.get_xml_trees(host_name, db_name, 1, ["dave"])  # no such user
+    assert [tostring(x).decode() for x in api.get_xmls_by_username(host_name, db_name, "alice")] == \
+        [xmls[1, "alice"], xmls[2, "alice"]]
+    assert [tostring(x).decode() for x in api.get_by_xids(host_name, db_name, ["5", "2"])] == \
+        [xmls[2, "bob"], xmls[1, "bob"]]
+    xid = api.write_to_db(host_name, db_name, site_xml(PASSAGES[1]), 2, 1, "carol")
+    assert [tostring(x).decode() for x in api.get_by_xids(host_name, db_name, [xid])] == [site_xml(PASSAGES[1])]
+
+
+def test_transaction(postgres_pool):
+    host_name, db_name = postgres_pool
+    with pytest.raises(Exception):
+        with api.transaction(host_name, db_name):
+            api.write_to_db(host_name, db_name, site_xml(PASSAGES[0]), 1, 1, "alice")
+            api.write_to_db(host_name, db_name, site_xml(PASSAGES[1]), 2, 1, "dave")  # no such user
+    assert list(api.iter_rows(host_name, db_name, "SELECT id FROM xmls")) == []  # nothing left half-written
+    with api.transaction(host_name, db_name):
+        xids = [api.write_to_db(host_name, db_name, site_xml(create), i, 1, "alice")
+                for i, create in enumerate(PASSAGES[:2], start=1)]
+    assert [tostring(x).decode() for x in api.get_by_xids(host_name, db_name, xids)] == \
+        [site_xml(create) for create in PASSAGES[:2]]
+    assert api.get_connection(db_name, host_name).autocommit
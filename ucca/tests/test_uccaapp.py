@@ -0,0 +1,392 @@
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from socketserver import ThreadingMixIn
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from ucca import convert, layer1, normalization
+from uccaapp import api
+from uccaapp.api import ServerAccessor, ResponseCache
+from uccaapp.create_annotation_tasks import AnnotationTaskCreator
+from uccaapp.download_task import TaskDownloader
+from uccaapp.upload_task import TaskUploader
+from .conftest import PASSAGES
+
+"""Tests the UCCA-App API client against a local stub of the REST API."""
+
+
+ALIASES = {"user_tasks": "tasks"}  # the same entities are accessed by both prefixes
+STATUSES = {"draft": "ONGOING", "submit": "SUBMITTED"}  # set by actions on tasks
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.entities = {}  # prefix -> {id: entity}
+        self.failures = {}  # path -> list of status codes to return before succeeding
+        self.requests = []  # (method, path)
+        self.connections = set()  # client addresses, one per connection
+
+    @property
+    def address(self):
+        return "http://%s:%d" % self.server_address
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, data=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length).decode("utf-8")) if length else None
+        server = self.server
+        path = self.path[len("/api/v1/"):]
+        with server.lock:
+            server.requests.append((method, path))
+            server.connections.add(self.client_address)
+            failures = server.failures.get(path)
+            status = failures.pop(0) if failures else None
+        if status:
+            return self.respond(status, dict(detail="Failure"))
+        match = re.match(r"(\w+)/(?:(\w+)/?)?(\w+)?$", path)
+        if not match:
+            return self.respond(404, dict(detail="Not found"))
+        prefix, _id, action = match.groups()
+        prefix = ALIASES.get(prefix, prefix)
+        with server.lock:
+            entities = server.entities.setdefault(prefix, {})
+            for i, token in enumerate((data or {}).get("tokens") or (), start=1):
+                token.setdefault("id", i)  # assigned by the server when a tokenization task is created
+            if method == "POST" and _id is None:
+                out = dict(data, id=len(entities) + 1)
+                entities[out["id"]] = out
+            elif _id is not None and int(_id) in entities:
+                out = entities[int(_id)]
+                if method == "PUT":
+                    out.update(data)
+                    if action:
+                        out["status"] = STATUSES.get(action, action.upper())
+            else:
+                return self.respond(404, dict(detail="Not found"))
+        self.respond(200, out)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+CATEGORIES = [dict(id=i, name=name, parent=None) for i, name in enumerate(sorted(
+    {re.sub(r"(?<=[a-z])(?=[A-Z])", " ", k) for k in layer1.EdgeTags.__dict__ if not k.startswith("_")} |
+    {convert.UNANALYZABLE, convert.UNCERTAIN}), start=1)]
+LAYER = dict(id=1, name="UCCA", categories=CATEGORIES, parent=None)
+
+
+def user_task(passage, task_id):
+    task = convert.to_json(passage, return_dict=True, all_categories=CATEGORIES)
+    task.update(id=task_id, type="ANNOTATION", user=dict(id=1), passage=dict(id=task_id, external_id=passage.ID),
+                project=dict(id=1, layer=LAYER), user_comment="", created_at="", updated_at="")
+    return task
+
+
+def accessor_for(server, cls=ServerAccessor, **kwargs):
+    accessor = cls(server_address=server.address, email=None, password=None, auth_token="token", **kwargs)
+    accessor.retry_backoff = 0
+    return accessor
+
+
+def test_connection_reuse(server):
+    accessor = accessor_for(server, workers=1)
+    for i in range(5):
+        assert accessor.create_task(type="TOKENIZATION")["id"] == i + 1
+    assert [t["id"] for t in accessor.get_many(range(1, 6), prefix="tasks")] == [1, 2, 3, 4, 5]
+    assert len(server.requests) == 10
+    assert len(server.connections) == 1
+
+
+@pytest.mark.parametrize("workers", (1, 4))
+def test_map(server, workers):
+    accessor = accessor_for(server, workers=workers)
+    created = list(accessor.create_many([dict(type="TOKENIZATION", user_comment=str(i)) for i in range(20)],
+                                        prefix="tasks"))
+    assert sorted(t["id"] for t in created) == list(range(1, 21))
+    assert [t["user_comment"] for t in created] == [str(i) for i in range(20)]  # in order
+    ids = [t["id"] for t in created]
+    assert list(accessor.map(lambda i: accessor.get_task(i)["id"], ids)) == ids
+    assert len(server.connections) <= workers
+
+
+@pytest.mark.parametrize("statuses", ([503], [429, 500], [502, 504]))
+def test_retry(server, statuses):
+    accessor = accessor_for(server)
+    accessor.create_task(type="TOKENIZATION")
+    server.failures["tasks/1"] = list(statuses)
+    assert accessor.get_task(1)["id"] == 1
+    assert server.requests.count(("GET", "tasks/1")) == len(statuses) + 1
+
+
+def test_no_retry(server):
+    accessor = accessor_for(server)
+    server.failures["tasks/1"] = [503, 503, 503, 503]
+    with pytest.raises(requests.exceptions.HTTPError):
+        accessor.get_task(1)  # gives up after the maximum number of attempts
+    assert len(server.requests) == 3
+    with pytest.raises(requests.exceptions.HTTPError):
+        accessor.get_task(2)  # not found: not retried
+    assert len(server.requests) == 4
+
+
+def test_retry_wait(server):
+    accessor = accessor_for(server)
+    accessor.retry_backoff = 1
+    assert all(0 <= accessor.retry_wait(attempt) <= 2 ** attempt for attempt in range(3) for _ in range(10))
+    response = requests.Response()
+    response.headers["Retry-After"] = "3"
+    assert accessor.retry_wait(0, response) == 3
+
+
+@pytest.mark.parametrize("method, error, attempts", (
+        ("get", requests.exceptions.ReadTimeout(), 3),
+        ("post", requests.exceptions.ReadTimeout(), 1),  # may have been applied by the server
+        ("post", requests.exceptions.ConnectionError(MaxRetryError(None, "tasks/", NewConnectionError(None, ""))), 3),
+))
+def test_retry_error(server, monkeypatch, method, error, attempts):
+    accessor = accessor_for(server)
+    sent = []
+
+    def request(*args, **kwargs):
+        sent.append(args)
+        raise error
+
+    monkeypatch.setattr(accessor.session, "request", request)
+    with pytest.raises(type(error)):
+        accessor.request(method, "tasks/")
+    assert len(sent) == attempts
+
+
+def test_retry_wait_reset(server, monkeypatch):
+    accessor = accessor_for(server)
+    failed = requests.Response()
+    failed.status_code = 503
+    failed.headers["Retry-After"] = "30"
+    succeeded = requests.Response()
+    succeeded.status_code = 200
+    outcomes = [failed, requests.exceptions.ConnectionError(), succeeded]
+
+    def request(*args, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    waits = []
+    monkeypatch.setattr(accessor.session, "request", request)
+    monkeypatch.setattr(api, "sleep", waits.append)
+    assert accessor.request("get", "tasks/1") is succeeded
+    assert waits == [30, 0]  # Retry-After applies only to the response that had it
+
+
+def test_create_tasks_failure(server, tmp_path):
+    server.entities.update(users={1: dict(id=1)}, tasks={i: dict(id=i, type="TOKENIZATION", project=dict(id=1),
+                                                                 passage=dict(id=i)) for i in range(1, 11)})
+    filename = str(tmp_path / "lines.txt")
+    with open(filename, "w", encoding="utf-8") as f:
+        for i in range(1, 11):
+            print(1, i, file=f)
+    creator = accessor_for(server, AnnotationTaskCreator, workers=3)
+    log = str(tmp_path / "log.txt")
+    server.failures["tasks/"] = [400]  # the first task to be created fails, while others are in flight
+    with pytest.raises(requests.exceptions.HTTPError):
+        creator.create_tasks(filename, log=log)
+    created = [t["id"] for t in server.entities["tasks"].values() if t["type"] == "ANNOTATION"]
+    with open(log, encoding="utf-8") as f:
+        assert sorted(int(line) for line in f) == sorted(created)  # every created task is logged
+    assert created  # by the workers that were not the first to fail
+
+
+@pytest.mark.parametrize("jobs", (None, 2))
+def test_download_tasks(server, tmp_path, jobs):
+    tasks = [user_task(create(), i) for i, create in enumerate(PASSAGES[:4], start=1)]
+    server.entities["tasks"] = {task["id"]: task for task in tasks}
+    downloader = accessor_for(server, TaskDownloader, workers=2)
+    log = str(tmp_path / "log.txt")
+    kwargs = dict(out_dir=str(tmp_path), prefix="", log=log, jobs=jobs, normalize=True, verbose=False)
+    downloaded = list(downloader.download_tasks(["1", "2"], **kwargs))
+    assert [task_id for _, task_id, _ in downloaded] == ["1", "2"]
+    downloaded = list(downloader.download_tasks(["1", "2", "3", "4"], resume=True, **kwargs))
+    assert [task_id for _, task_id, _ in downloaded] == ["3", "4"]  # already in the log
+    assert sorted(path for method, path in server.requests) == ["user_tasks/%d" % i for i in range(1, 5)]
+    with open(log, encoding="utf-8") as f:
+        assert [line.split("\t")[1] for line in f] == ["1", "2", "3", "4"]
+    for task in tasks:
+        passage = next(iter(convert.from_json(task)))
+        normalization.normalize(passage)
+        expected = StringIO()
+        convert.write_standard(passage, expected)
+        with open(os.path.join(str(tmp_path), passage.ID + ".xml"), encoding="utf-8") as f:
+            assert f.read() == expected.getvalue()
+
+
+def test_download_tasks_write_failure(server, tmp_path, monkeypatch):
+    server.entities["tasks"] = {1: user_task(PASSAGES[0](), 1), 2: user_task(PASSAGES[1](), 2)}
+    server.entities["tasks"][2]["user_comment"] = "with spaces"
+    downloader = accessor_for(server, TaskDownloader)
+    log = str(tmp_path / "log.txt")
+    kwargs = dict(out_dir=str(tmp_path), prefix="", log=log, verbose=False)
+    with monkeypatch.context() as m:
+        m.setattr("uccaapp.download_task.write_passage", lambda *args, **kwargs: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            list(downloader.download_tasks(["1", "2"], **kwargs))
+    assert TaskDownloader.read_log(log) == set()  # not written, so not skipped when resuming
+    assert [task_id for _, task_id, _ in downloader.download_tasks(["1", "2"], resume=True, **kwargs)] == ["1", "2"]
+    assert TaskDownloader.read_log(log) == {"1", "2"}
+
+
+def passage_files(tmp_path):
+    filenames = []
+    for create in PASSAGES[:-1]:  # not empty
+        passage = create()
+        passage._ID = create.__name__
+        filenames.append(str(tmp_path / (passage.ID + ".xml")))
+        convert.passage2file(passage, filenames[-1])
+    return filenames
+
+
+def uploader_for(server, **kwargs):
+    server.entities.update(sources={1: dict(id=1)}, projects={1: dict(id=1, layer=dict(id=1))}, layers={1: LAYER})
+    return accessor_for(server, TaskUploader, user_id=1, source_id=1, project_id=1, **kwargs)
+
+
+def test_upload_tasks(server, tmp_path):
+    filenames = passage_files(tmp_path)
+    uploader = uploader_for(server, workers=3)
+    log = str(tmp_path / "log.txt")
+    assert len(list(uploader.upload_tasks(filenames[:2], log=log))) == 2
+    tasks = list(uploader.upload_tasks(filenames, log=log, resume=True))
+    assert len(tasks) == len(filenames) - 2  # already in the log
+    assert len(server.entities["passages"]) == len(filenames)
+    with open(log, encoding="utf-8") as f:
+        lines = [line.split() for line in f]
+    assert sorted(fields[0] for fields in lines) == sorted(create.__name__ for create in PASSAGES[:-1])
+    for passage_id, _, tok_id, ann_id in lines:
+        tok_task, ann_task = (server.entities["tasks"][int(i)] for i in (tok_id, ann_id))
+        assert tok_task["type"] == "TOKENIZATION" and tok_task["status"] == "SUBMITTED"
+        assert ann_task["type"] == "ANNOTATION" and ann_task["status"] == "SUBMITTED"
+        assert ann_task["parent"]["id"] == tok_task["id"]
+        assert ann_task["manager_comment"] == tok_task["manager_comment"] == passage_id
+        assert ann_task["annotation_units"]
+
+
+def test_upload_tasks_no_upload(server, tmp_path):
+    filenames = passage_files(tmp_path)
+    uploader = uploader_for(server)
+    requests_before = len(server.requests)
+    log = str(tmp_path / "log.txt")
+    tasks = list(uploader.upload_tasks(filenames, log=log, upload=False))
+    assert [t["manager_comment"] for t in tasks] == [create.__name__ for create in PASSAGES[:-1]]
+    assert all(t["type"] == "ANNOTATION" and t["parent"]["type"] == "TOKENIZATION" for t in tasks)
+    assert len(server.requests) == requests_before  # nothing sent
+    assert not os.path.exists(log)
+
+
+def test_cache(server):
+    server.entities.update(users={1: dict(id=1)}, tasks={i: dict(id=i, type="TOKENIZATION", project=dict(id=1), passage=dict(id=i))
+                                                            for i in range(1, 4)})
+    creator = accessor_for(server, AnnotationTaskCreator, cache=True)
+    lines = [(1, i % 3 + 1) for i in range(30)]
+    tasks = [creator.build_task(*line) for line in lines]
+    assert [t["parent"]["id"] for t in tasks] == [task_id for _, task_id in lines]
+    assert len(server.requests) == 4  # one user and three tasks
+    tasks[0]["parent"]["status"] = "CHANGED"  # returned entities are copies
+    assert "status" not in creator.get_task(1)
+    creator.update_task(id=1, status="ONGOING")
+    assert creator.get_task(1)["status"] == "ONGOING"  # invalidated by the update
+    creator.submit_task(id=2, type="TOKENIZATION")
+    assert creator.get_task(2)["status"] == "SUBMITTED"
+    assert creator.get_user_task(3)["id"] == 3  # not cached
+    assert creator.get_user_task(3)["id"] == 3
+    assert server.requests[4:] == [("PUT", "tasks/1/"), ("GET", "tasks/1"), ("PUT", "user_tasks/2/submit"),
+                                   ("GET", "tasks/2"), ("GET", "user_tasks/3"), ("GET", "user_tasks/3")]
+    creator.create_task(**tasks[0])
+    assert creator.get_task(1)["id"] == 1  # invalidated by creating its child
+    assert server.requests[10:] == [("POST", "tasks/"), ("GET", "tasks/1")]
+    uncached = accessor_for(server)  # not cached by default
+    uncached.get_task(3)
+    uncached.get_task(3)
+    assert len(server.requests) == 14
+
+
+def test_cache_expiry(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(api, "time", lambda: now[0])
+    filename = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(size=2, ttl=10, filename=filename)
+    for i in range(3):
+        cache.put("tasks", i, dict(id=i))
+    assert list(cache.entries) == [("tasks", "1"), ("tasks", "2")]  # least recently used evicted from memory
+    assert cache.get("tasks", 0) == dict(id=0)  # but kept in the file
+    now[0] += 11
+    assert cache.get("tasks", 1) is None
+    cache.put("tasks", 1, dict(id=1))
+    cache.invalidate("tasks", 0)
+    cache.close()
+    reopened = ResponseCache(ttl=10, filename=filename)
+    assert reopened.db.execute("SELECT id FROM entities").fetchall() == [("1",)]  # expired rows purged
+    assert reopened.get("tasks", 0) is None
+    assert reopened.get("tasks", 1) == dict(id=1)
+    assert (reopened.hits, reopened.misses) == (1, 1)
+    reopened.invalidate("tasks")
+    assert reopened.get("tasks", 1) is None and reopened.get("tasks", 2) is None
+    reopened.close()
+
+
+def test_upload_tasks_failure(server, tmp_path):
+    filenames = passage_files(tmp_path)
+    uploader = uploader_for(server, workers=3)
+    log = str(tmp_path / "log.txt")
+    server.failures["passages/"] = [400]  # the first passage to be created fails, while others are in flight
+    with pytest.raises(ValueError):
+        list(uploader.upload_tasks(filenames, log=log))
+    submitted = [t["manager_comment"] for t in server.entities["tasks"].values()
+                 if t["type"] == "ANNOTATION" and t.get("status") == "SUBMITTED"]
+    assert TaskUploader.read_log(log) == set(submitted)  # every uploaded passage is logged
+    assert len(submitted) == len(filenames) - 1
+    list(uploader.upload_tasks(filenames, log=log, resume=True))
+    submitted = [t["manager_comment"] for t in server.entities["tasks"].values()
+                 if t["type"] == "ANNOTATION" and t.get("status") == "SUBMITTED"]
+    assert sorted(submitted) == sorted(create.__name__ for create in PASSAGES[:-1])  # no duplicates
+    assert len(server.entities["passages"]) == len(filenames)
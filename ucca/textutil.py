@@ -352,12 +352,13 @@ def break2paragraphs(passage, return_terminals=False, *args, **kwargs):
     :return: a list of positions in the Passage, each denotes a closing Terminal of a paragraph.
     """
     del args, kwargs
-    terminals = sorted(extract_terminals(passage), key=attrgetter("position"))
-    if not terminals:
-        return []
-    return [list(p) for _, p in groupby(terminals, key=attrgetter("paragraph"))] if return_terminals else \
-        [t1.position for t1, t2 in zip(terminals[:-1], terminals[1:])
-         if t2.para_pos == 1 or t1.paragraph != t2.paragraph] + [terminals[-1].position]
+    l0 = passage.layer(layer0.LAYER_ID)
+    if return_terminals:
+        terminals = l0.all
+        starts = np.flatnonzero(np.diff(l0.columns.paragraph)) + 1
+        return [terminals[start:end] for start, end in zip([0] + starts.tolist(), starts.tolist() + [len(terminals)])
+                if start < end]
+    return l0.paragraph_ends().tolist()
 
 
 def indent_xml(xml_as_string):
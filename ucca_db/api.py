@@ -1,7 +1,9 @@
 import sys
+import threading
+from contextlib import contextmanager
+from itertools import count
 
 import datetime
-import psycopg2
 from tqdm import tqdm
 from xml.etree.ElementTree import tostring, fromstring as fromstring_xml
 
@@ -9,7 +11,72 @@ from ucca import convert
 from ucca.ioutil import external_write_mode
 
 UNK_LINKAGE_TYPE = 'UNK'
-CONNECTION = None
+SEARCH_PATH = "oabend"
+ITERSIZE = 100  # number of rows fetched at a time by server-side cursors
+
+
+def connect_postgres(host_name, db_name):
+    import psycopg2
+    con = psycopg2.connect(host=host_name, database=db_name)
+    con.autocommit = True  # so that the kept connection does not stay idle in a transaction, holding locks;
+    # writes are still grouped by transaction()
+    return con
+
+
+class ConnectionPool:
+    """
+    Open connections, one per (host, database) pair, reused by all queries rather than connecting for each one.
+    The search path is set once per connection, when it is opened.
+    """
+    def __init__(self, connect=connect_postgres, search_path=SEARCH_PATH, server_side_cursors=True):
+        """
+        :param connect: function taking host_name and db_name, returning a new DB-API connection
+        :param search_path: schema to set the search path to on new connections, or None to leave it as is
+        :param server_side_cursors: whether connections support named (server-side) cursors held across
+                                    transactions, as psycopg2 does
+        """
+        self.connect = connect
+        self.search_path = search_path
+        self.server_side_cursors = server_side_cursors
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.names = count()
+
+    def get(self, host_name, db_name):
+        """Returns the open connection to the db and host, connecting only if there is none"""
+        key = (host_name, db_name)
+        with self.lock:
+            con = self.connections.get(key)
+            if con is None or getattr(con, "closed", False):
+                con = self.connections[key] = self.connect(host_name, db_name)
+                if self.search_path:
+                    c = con.cursor()
+                    c.execute("SET search_path TO " + self.search_path)
+                    c.close()
+                    con.commit()  # so that a later rollback does not undo it
+        return con
+
+    def cursor(self, host_name, db_name, server_side=False):
+        """
+        Returns a cursor of the open connection to the db and host.
+        With server_side, it is a named cursor, keeping the result on the server and fetching ITERSIZE rows at a time
+        when iterated, rather than all rows on execute.
+        """
+        con = self.get(host_name, db_name)
+        if not (server_side and self.server_side_cursors):
+            return con.cursor()
+        c = con.cursor("ucca_db_%d" % next(self.names), withhold=True)  # required with autocommit
+        c.itersize = ITERSIZE
+        return c
+
+    def close(self):
+        with self.lock:
+            for con in self.connections.values():
+                con.close()
+            self.connections.clear()
+
+
+CONNECTIONS = ConnectionPool()
 
 
 def fromstring(text):
@@ -24,16 +91,51 @@ def fromstring(text):
     return fromstring_xml(text)
 
 
-#######################################################################################
-# Returns the most recent xmls from db with a passage id pid and usernames
-# (a list). The xmls are ordered in the same way as the list usernames.
-#######################################################################################
+def iter_rows(host_name, db_name, query, args=()):
+    """
+    Runs the query with a server-side cursor, yielding its result rows as they are fetched rather than all at once.
+    The transaction is rolled back on error, so that the pooled connection can still be used.
+    """
+    con = CONNECTIONS.get(host_name, db_name)
+    c = CONNECTIONS.cursor(host_name, db_name, server_side=True)
+    try:
+        c.execute(query, args)
+        yield from c
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        c.close()
+
+
+@contextmanager
+def transaction(host_name, db_name):
+    """
+    Groups the writes in the block into one transaction on the pooled connection, committed when the block ends,
+    or rolled back if it raises, so that nothing is left half-written.
+    A block within another one is part of the outer transaction.
+    """
+    con = CONNECTIONS.get(host_name, db_name)
+    if not con.autocommit:  # already in a transaction
+        yield con
+        return
+    con.autocommit = False
+    try:
+        yield con
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        con.autocommit = True
+
+
 def get_xmls_by_username(host_name, db_name, username):
-    c = get_cursor(host_name, db_name)
+    """Returns the most recent xml of the user for each passage they annotated, in order of passage ID."""
     uid = get_uid(host_name, db_name, username)
-    c.execute("SELECT xml FROM xmls WHERE uid=%s AND ts IN (SELECT MAX(ts) from xmls GROUP BY paid)", (uid,))
-    for queryset in c.fetchall():
-        yield fromstring(queryset[0])
+    for raw_xml, in iter_rows(host_name, db_name,
+                              "SELECT DISTINCT ON (paid) xml FROM xmls WHERE uid=%s ORDER BY paid, ts DESC", (uid,)):
+        yield fromstring(raw_xml)
 
 
 def get_xml_trees(host_name, db_name, pid, usernames=None, graceful=False):
@@ -41,41 +143,44 @@ def get_xml_trees(host_name, db_name, pid, usernames=None, graceful=False):
         Optional:
         graceful: True if no excpetions are to be raised
         excpetion raised if a user did not submit an annotation for the passage
-        returns a list of xml roots elements
+        returns a list of xml roots elements, the most recent one of each user, in the same order as usernames
+        (users with no annotation are skipped if graceful)
         """
     c = get_cursor(host_name, db_name)
     xmls = []
     if usernames is None:
-        c.execute("SELECT xml FROM xmls WHERE paid=%s ORDER BY ts DESC", (pid,))
+        c.execute("SELECT xml FROM xmls WHERE paid=%s ORDER BY ts DESC LIMIT 1", (pid,))
         queryset = c.fetchone()
         if queryset is not None:
             xmls.append(fromstring(queryset[0]))
     else:
+        usernames = [str(username) for username in usernames]  # precaution for cases bad input e.g. 101
+        uids = get_uids(host_name, db_name, usernames)
+        raw_xmls = dict(iter_rows(host_name, db_name, "SELECT DISTINCT ON (uid) uid, xml FROM xmls "
+                                                      "WHERE paid=%s AND uid = ANY(%s) ORDER BY uid, ts DESC",
+                                  (pid, sorted(set(uids.values())))))
         for username in usernames:
-            username = str(username)  # precaution for cases bad input e.g. 101
-            cur_uid = get_uid(host_name, db_name, username)
-            c.execute("SELECT xml FROM xmls WHERE paid=%s AND uid=%s ORDER BY ts DESC", (pid, cur_uid))
-            raw_xml = c.fetchone()
-            if not raw_xml and not graceful:
+            raw_xml = raw_xmls.get(uids[username])
+            if raw_xml is not None:
+                xmls.append(fromstring(raw_xml))
+            elif not graceful:
                 raise Exception("The user " + username +
                                 " did not submit an annotation for this passage")
-            else:
-                xmls.append(fromstring(raw_xml[0]))
     return xmls
 
 
 def get_by_xids(host_name, db_name, xids, **kwargs):
     """Returns the passages that correspond to xids (which is a list of them)"""
     del kwargs
-    c = get_cursor(host_name, db_name)
+    raw_xmls = dict(iter_rows(host_name, db_name, "SELECT id, xml FROM xmls WHERE id = ANY(%s)",
+                              (sorted({int(xid) for xid in xids}),)))
     xmls = []
     for xid in xids:
-        c.execute("SELECT xml FROM xmls WHERE id=%s", (int(xid),))
-        queryset = c.fetchone()
-        if queryset is None:
-            raise Exception("The xid " + xid + " does not exist")
+        raw_xml = raw_xmls.get(int(xid))
+        if raw_xml is None:
+            raise Exception("The xid " + str(xid) + " does not exist")
         else:
-            xmls.append(fromstring(queryset[0]))
+            xmls.append(fromstring(raw_xml))
     return xmls
 
 
@@ -120,23 +225,32 @@ def get_uid(host_name, db_name, username):
     return int(cur_uid[0])
 
 
-def write_to_db(host_name, db_name, xml, new_pid, new_prid, username, status=1):
-    con = get_connection(db_name, host_name)
-    c = con.cursor()
-    c.execute("SET search_path TO oabend")
+def get_uids(host_name, db_name, usernames):
+    """Returns a dict from each of the given usernames to its uid, with one query for all of them."""
+    c = get_cursor(host_name, db_name)
+    c.execute("SELECT username, id FROM users WHERE username = ANY(%s)", (list(usernames),))
+    uids = {username: int(uid) for username, uid in c.fetchall()}
+    for username in usernames:
+        if username not in uids:
+            raise Exception("The user " + username + " does not exist")
+    return uids
 
-    c.execute("SELECT id FROM users WHERE username=%s", (username,))
-    cur_uid = c.fetchone()
-    if cur_uid is None:
-        raise Exception("The user " + username + " does not exist")
-    else:
-        cur_uid = cur_uid[0]
-    now = datetime.datetime.now()
-    c.execute("INSERT INTO xmls (reviewOf, xml, paid, prid, uid, comment, status, ts) "
-              "VALUES (-1, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
-              (xml, new_pid, new_prid, cur_uid, '', status, now))
-    queryset = c.fetchone()
-    con.commit()
+
+def write_to_db(host_name, db_name, xml, new_pid, new_prid, username, status=1):
+    """Inserts the xml, committed at the end of the enclosing transaction() block, if any, or else right away."""
+    with transaction(host_name, db_name) as con:
+        c = con.cursor()
+        c.execute("SELECT id FROM users WHERE username=%s", (username,))
+        cur_uid = c.fetchone()
+        if cur_uid is None:
+            raise Exception("The user " + username + " does not exist")
+        else:
+            cur_uid = cur_uid[0]
+        now = datetime.datetime.now()
+        c.execute("INSERT INTO xmls (reviewOf, xml, paid, prid, uid, comment, status, ts) "
+                  "VALUES (-1, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                  (xml, new_pid, new_prid, cur_uid, '', status, now))
+        queryset = c.fetchone()
     return None if queryset is None else queryset[0]
 
 
@@ -197,38 +311,29 @@ def print_passages_to_file(host_name, db_name, paids, write_xml=False, write_sit
     <average length of a scene>). It also returns a distribution of the categories.
     write_xml: determines whether to write it to a file, named <prefix><the number of the xml>.xml
     skip_first: the index of the passage where it should start looking (the ones before are skipped)
+    Passages are printed in order of their ID.
     """
-    c = get_cursor(host_name, db_name)
-
-    for paid in paids:
-        if paid < start_index:  # skipping training passages
+    paids = sorted({paid for paid in paids if paid >= start_index})  # skipping training passages
+    for paid, source, xid, raw_xml, uid, ts in iter_rows(
+            host_name, db_name, "SELECT DISTINCT ON (x.paid) x.paid, p.source, x.id, x.xml, x.uid, x.ts "
+                                "FROM xmls x JOIN passages p ON p.id = x.paid "
+                                "WHERE x.paid = ANY(%s) ORDER BY x.paid, x.ts DESC", (paids,)):
+        print('\t'.join([str(paid), str(uid), str(source), str(xid), str(ts)]))
+
+        if write_site_xml:
+            f = open(prefix + str(paid) + '_site.xml', 'w', encoding='utf-8')
+            f.write(raw_xml + '\n')
+            f.close()
+        # noinspection PyBroadException
+        try:
+            ucca_dag = convert.from_site(fromstring(raw_xml))
+        except Exception:
+            sys.stderr.write("Skipped xid,paid " + str((xid, paid)) + "\n")
             continue
-        c.execute("SELECT passage,source FROM passages WHERE id=%s", (paid,))
-        r = c.fetchone()
-        if r is not None:
-            source = r[1]
-            c.execute("SELECT id, xml,uid,ts FROM xmls WHERE paid=%s ORDER BY ts DESC", (paid,))
-            r = c.fetchone()
-            if r is not None:
-                xid = r[0]
-                uid = r[2]
-                ts = r[3]
-                print('\t'.join([str(paid), str(uid), str(source), str(xid), str(ts)]))
-
-                if write_site_xml:
-                    f = open(prefix + str(paid) + '_site.xml', 'w', encoding='utf-8')
-                    f.write(r[1] + '\n')
-                    f.close()
-                # noinspection PyBroadException
-                try:
-                    ucca_dag = convert.from_site(fromstring(r[1]))
-                except Exception:
-                    sys.stderr.write("Skipped xid,paid " + str((xid, paid)) + "\n")
-                    continue
-                if write_xml:
-                    f = open(prefix + str(paid) + '.xml', 'w')
-                    f.write(tostring(convert.to_standard(ucca_dag)).decode())
-                    f.close()
+        if write_xml:
+            f = open(prefix + str(paid) + '.xml', 'w')
+            f.write(tostring(convert.to_standard(ucca_dag)).decode())
+            f.close()
 
 
 def get_predicates(host_name, db_name, only_complex=True):
@@ -250,14 +355,13 @@ def get_predicates(host_name, db_name, only_complex=True):
                 non_function_u = e.child
         return True if non_function_count > 1 else _complex(non_function_u)
 
-    c = get_cursor(host_name, db_name)
     # uid = get_uid(host_name, db_name, username)
-    # get all the completed xmls
-    c.execute("SELECT id, xml FROM xmls WHERE status=%s AND reviewOf<>%s ORDER BY ts DESC", (1, -1))
-    predicates = c.fetchall()
+    # get all the completed xmls, streamed rather than all loaded at once
+    predicates = iter_rows(host_name, db_name, "SELECT id, xml FROM xmls WHERE status=%s AND reviewOf<>%s "
+                                               "ORDER BY ts DESC", (1, -1))
 
     with open('preds', 'w') as f:
-        for r in tqdm(predicates):
+        for r in tqdm(predicates, unit=" xmls"):
             # noinspection PyBroadException
             try:
                 ucca_dag = convert.from_site(fromstring(r[1]))
@@ -279,18 +383,13 @@ def get_predicates(host_name, db_name, only_complex=True):
 
 
 def get_cursor(host_name, db_name):
-    """ create a cursor to the search path """
-    con = get_connection(db_name, host_name)
-    c = con.cursor()
-    c.execute("SET search_path TO oabend")
-    return c
+    """ create a cursor to the search path, on the pooled connection """
+    return CONNECTIONS.cursor(host_name, db_name)
 
 
 def get_connection(db_name, host_name):
-    """ connects to the db and host, returns a connection object """
-    global CONNECTION
-    CONNECTION = psycopg2.connect(host=host_name, database=db_name)
-    return CONNECTION
+    """ returns the pooled connection object to the db and host, connecting only the first time """
+    return CONNECTIONS.get(host_name, db_name)
 
 
 def main(argv):
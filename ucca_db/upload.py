@@ -3,7 +3,7 @@ from xml.etree.ElementTree import tostring
 
 from ucca import convert
 from ucca.ioutil import get_passages_with_progress_bar
-from ucca_db.api import CONNECTION, write_to_db
+from ucca_db.api import CONNECTIONS, write_to_db
 
 desc = "Upload passages to old UCCA annotation app"
 
@@ -32,8 +32,7 @@ def main(args):
             print(passage.ID, out, file=f)
             if args.verbose:
                 print("Uploaded passage %s with xid=%s" % (passage.ID, out))
-    if CONNECTION is not None:
-        CONNECTION.commit()
+    CONNECTIONS.close()
     print("Wrote '%s'" % args.out)
 
 
@@ -1,9 +1,16 @@
 import json
 import logging
 import os
-from time import sleep
+import random
+import sqlite3
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
 
 """
 API code for accessing v1.0 of the UCCAApp server
@@ -19,14 +26,123 @@ PROJECT_ID_ENV_VAR = "UCCA_APP_PROJECT_ID"
 SOURCE_ID_ENV_VAR = "UCCA_APP_SOURCE_ID"
 USER_ID_ENV_VAR = "UCCA_APP_USER_ID"
 MAX_RETRIES = 3
-RETRY_WAIT_DURATION = 60
+RETRY_WAIT_DURATION = 60  # maximum seconds to wait before retrying
+RETRY_BACKOFF = 2  # seconds to wait before the first retry (at most), doubled for each further retry
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"get", "head", "options", "put", "delete"}  # retried even if the server may have applied them
+DEFAULT_WORKERS = 8
+CACHED_PREFIXES = ("users", "sources", "projects", "layers", "categories", "tasks")  # rarely changed by others
+DEFAULT_CACHE_SIZE = 10000  # maximum number of entities kept in memory
+DEFAULT_CACHE_TTL = 600  # seconds until a cached entity is fetched from the server again
+
+
+class ResponseCache:
+    """
+    Entities returned by the server, keyed by prefix and ID: an in-memory LRU cache, optionally backed by an sqlite
+    file so that they are kept across runs. Entries expire after a given time, since others may change them too.
+    Entities are stored as JSON text, so every lookup returns a fresh copy that the caller may modify.
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, filename=None):
+        """
+        :param size: maximum number of entities kept in memory
+        :param ttl: seconds an entity is valid for after it is stored, or None for no expiry
+        :param filename: sqlite file to store entities in too, created if missing
+        """
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # (prefix, ID) -> (time stored, JSON text), least recently used first
+        self.lock = threading.Lock()  # Lookups are made from the threads of ServerAccessor.map
+        self.hits = self.misses = 0
+        self.db = None
+        if filename:
+            self.db = sqlite3.connect(filename, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS entities "
+                            "(prefix TEXT, id TEXT, stored REAL, data TEXT, PRIMARY KEY (prefix, id))")
+            if ttl is not None:  # so that the file does not keep growing
+                self.db.execute("DELETE FROM entities WHERE stored < ?", (time() - ttl,))
+            self.db.commit()
+
+    def _expired(self, stored):
+        return self.ttl is not None and time() - stored > self.ttl
+
+    def get(self, prefix, _id):
+        """
+        :return: the entity stored for the prefix and ID, or None if there is none or it has expired
+        """
+        key = (prefix, str(_id))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                entry = self.db.execute("SELECT stored, data FROM entities WHERE prefix = ? AND id = ?",
+                                        key).fetchone()
+                if entry is not None:
+                    self._put(key, tuple(entry))
+            if entry is None or self._expired(entry[0]):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[1])
+
+    def _put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def put(self, prefix, _id, data):
+        key = (prefix, str(_id))
+        entry = (time(), json.dumps(data))
+        with self.lock:
+            self._put(key, entry)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)", key + entry)
+                self.db.commit()
+
+    def invalidate(self, prefix, _id=None):
+        """
+        Remove an entity from the cache, or all entities with the prefix if no ID is given
+        """
+        with self.lock:
+            for key in [(prefix, str(_id))] if _id is not None else [k for k in self.entries if k[0] == prefix]:
+                self.entries.pop(key, None)
+            if self.db is not None:
+                if _id is None:
+                    self.db.execute("DELETE FROM entities WHERE prefix = ?", (prefix,))
+                else:
+                    self.db.execute("DELETE FROM entities WHERE prefix = ? AND id = ?", (prefix, str(_id)))
+                self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
 
 
 class ServerAccessor:
-    def __init__(self, server_address, email, password, auth_token=None, verbose=False, **kwargs):
+    def __init__(self, server_address, email, password, auth_token=None, verbose=False, workers=DEFAULT_WORKERS,
+                 cache=False, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL, cache_file=None, **kwargs):
+        """
+        :param workers: maximum number of concurrent requests made by map(), and of connections kept alive for reuse
+        :param cache: whether to cache entities with prefix in CACHED_PREFIXES, or a cache object to use, having the
+                      same methods as ResponseCache (in which case cache_size, cache_ttl and cache_file are ignored).
+                      Cached entities changed by other clients are only fetched again once they expire.
+        :param cache_size: maximum number of entities kept in memory by the cache
+        :param cache_ttl: seconds until a cached entity is fetched from the server again
+        :param cache_file: sqlite file to keep cached entities in across runs (implies cache)
+        """
         logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
         server_address = server_address or os.environ.get(SERVER_ADDRESS_ENV_VAR, DEFAULT_SERVER)
         self.prefix = server_address + API_PREFIX
+        self.workers = workers
+        self.retry_backoff = RETRY_BACKOFF
+        self.cache = (ResponseCache(cache_size, cache_ttl, cache_file) if cache is True or cache_file and not cache
+                      else cache) or None
+        self.session = requests.Session()  # Keeps connections alive, so that they are reused by later requests
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.headers = {}  # Needed for self.request (login)
         try:
             token = auth_token or os.environ.get(AUTH_TOKEN_ENV_VAR) or self.login(
@@ -65,6 +181,14 @@ class ServerAccessor:
         argparser.add_argument("--auth-token", help="authorization token (required only if email or password missing), "
                                                     "otherwise set by " + AUTH_TOKEN_ENV_VAR)
         argparser.add_argument("-v", "--verbose", action="store_true", help="detailed output")
+        argparser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="maximum number of concurrent "
+                                                                                    "requests to the server")
+        argparser.add_argument("--cache", action="store_true", help="cache users, projects, layers, categories and "
+                                                                    "tasks got from the server (see --cache-ttl)")
+        argparser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="seconds until a cached "
+                                                                                          "entity is fetched again")
+        argparser.add_argument("--cache-file", help="sqlite file to keep cached entities in across runs (implies "
+                                                    "--cache)")
 
     @staticmethod
     def add_source_id_argument(argparser):
@@ -79,19 +203,80 @@ class ServerAccessor:
         argparser.add_argument("--user-id", type=int, help="user id, otherwise set by " + USER_ID_ENV_VAR)
 
     def request(self, method, url_suffix, **kwargs):
-        response = None
-        for _ in range(MAX_RETRIES):
-            response = requests.request(method, self.prefix + str(url_suffix), headers=self.headers, **kwargs)
-            if response.status_code != 500:
-                break
-            sleep(RETRY_WAIT_DURATION)
+        """
+        Send a request using the pooled session, retrying with exponential backoff on connection errors and on
+        responses with status in RETRY_STATUS_CODES.
+        Other methods than IDEMPOTENT_METHODS (e.g. POST, creating an entity) are retried after an error only if it
+        was raised on connecting, before the request was sent, so that the server does not apply them twice.
+        """
+        for attempt in range(MAX_RETRIES):
+            last = attempt == MAX_RETRIES - 1
+            response = None
+            try:
+                response = self.session.request(method, self.prefix + str(url_suffix), headers=self.headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if last or not (method.lower() in IDEMPOTENT_METHODS or self.connect_failed(e)):
+                    raise
+                logging.warning("%s %s failed (%s), retrying" % (method.upper(), url_suffix, e))
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last:
+                    break
+                logging.warning("%s %s returned %d, retrying" % (method.upper(), url_suffix, response.status_code))
+            sleep(self.retry_wait(attempt, response))
 
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            raise requests.exceptions.HTTPError(response.text) from e
+            raise requests.exceptions.HTTPError(response.text, response=response) from e
         return response
 
+    @staticmethod
+    def connect_failed(e):
+        """
+        :param e: exception raised by the session on sending a request
+        :return: whether it was raised on connecting to the server, so that the request was not sent
+        """
+        cause = e.args[0] if e.args else None
+        return isinstance(cause, MaxRetryError) and isinstance(cause.reason, (NewConnectionError, ConnectTimeoutError))
+
+    def retry_wait(self, attempt, response=None):
+        """
+        :param attempt: number of the attempt that failed, starting from 0
+        :param response: the failed response, if any, whose Retry-After header is respected
+        :return: seconds to wait, chosen uniformly at random ("full jitter") so that concurrent retries are spread
+        """
+        try:
+            return min(RETRY_WAIT_DURATION, float(response.headers["Retry-After"]))
+        except (AttributeError, KeyError, ValueError):
+            return random.uniform(0, min(RETRY_WAIT_DURATION, self.retry_backoff * 2 ** attempt))
+
+    def map(self, fn, *iterables, workers=None):
+        """
+        Like the builtin map, but calls fn concurrently in a pool of threads sharing the session's connections.
+        At most twice as many calls as workers are pending at any time, so that long iterables are consumed lazily.
+        :param fn: function to call, typically a method of this object sending a request
+        :param iterables: arguments to fn, as in the builtin map
+        :param workers: number of threads, defaults to the number given on initialization
+        :return: generator of results of fn, in order
+        """
+        workers = workers or self.workers
+        if workers <= 1:
+            yield from map(fn, *iterables)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for args in zip(*iterables):
+                pending.append(executor.submit(fn, *args))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
     def login(self, email, password):
         return self.request("post", "login", json=dict(email=email, password=password)).json()
 
@@ -102,6 +287,7 @@ class ServerAccessor:
     def update(self, data, prefix):
         logging.debug("Updating %s %s: %s" % (self.type(data), prefix, json.dumps(data)))
         out = self.request("put", prefix + "/%s/" % data["id"], json=data).json()
+        self.invalidate(data["id"], prefix)
         logging.debug("Updated %s %s: %s" % (data.get("type", ""), prefix, json.dumps(out)))
         return out
 
@@ -112,11 +298,32 @@ class ServerAccessor:
         return out
 
     def get(self, _id, prefix):
+        cached = self.cache is not None and prefix in CACHED_PREFIXES
+        if cached:
+            out = self.cache.get(prefix, _id)
+            if out is not None:
+                logging.debug("Got %s %s from cache" % (prefix, _id))
+                return out
         logging.debug("Getting %s %s" % (prefix, _id))
         out = self.request("get", "%s/%s" % (prefix, _id)).json()
         logging.debug("Got %s: %s" % (prefix, json.dumps(out)))
+        if cached:
+            self.cache.put(prefix, _id, out)
         return out
 
+    def invalidate(self, _id, prefix):
+        """Remove an entity from the cache after changing it, so that the next get() fetches it from the server"""
+        if self.cache is not None:
+            self.cache.invalidate(prefix, _id)
+
+    def get_many(self, ids, prefix):
+        """Get the entities with the given IDs concurrently, returning a generator of them in order"""
+        return self.map(lambda _id: self.get(_id, prefix), ids)
+
+    def create_many(self, data, prefix):
+        """Create the given entities concurrently, returning a generator of the created entities in order"""
+        return self.map(lambda d: self.create(d, prefix), data)
+
     def submit_task(self, submit=True, **kwargs):
         logging.debug("Submitting %s task: %s" % (self.type(kwargs), json.dumps(kwargs)))
         out = None
@@ -126,6 +333,7 @@ class ServerAccessor:
         if submit:
             out = self.request("put", "user_tasks/%s/submit" % kwargs["id"], json=kwargs).json()
             logging.debug("Submitted %s task: %s" % (self.type(kwargs), json.dumps(out)))
+        self.invalidate(kwargs["id"], prefix="tasks")  # user_tasks are the same tasks, with annotation
         return out
 
     def get_source(self, source_id):
@@ -150,7 +358,10 @@ class ServerAccessor:
         return self.get(task_id, prefix="tasks")
 
     def create_task(self, **kwargs):
-        return self.create(kwargs, prefix="tasks")
+        out = self.create(kwargs, prefix="tasks")
+        if kwargs.get("parent"):  # its children changed
+            self.invalidate(kwargs["parent"]["id"], prefix="tasks")
+        return out
 
     def update_task(self, **kwargs):
         return self.update(kwargs, prefix="tasks")
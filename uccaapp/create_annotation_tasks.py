@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import argparse
 import sys
+import threading
 
 from tqdm import tqdm
 
@@ -9,6 +10,8 @@ from uccaapp.api import ServerAccessor
 desc = """Create new annotation/review tasks for a specific user, given parent tokenization tasks (for creating 
 annotation tasks) or parent annotation tasks (for creating review tasks) """
 
+LOG_LOCK = threading.Lock()  # log lines are written by the threads creating tasks
+
 
 class AnnotationTaskCreator(ServerAccessor):
     def __init__(self, project_id=None, **kwargs):
@@ -20,15 +23,27 @@ class AnnotationTaskCreator(ServerAccessor):
             self.set_project(project_id)
 
     def create_tasks(self, filename, log=None, **kwargs):
+        """
+        Create tasks concurrently, each written to the log as soon as it is created, even if another one fails first,
+        so that the log lists exactly the created tasks
+        """
         log_h = open(log, "w", encoding="utf-8") if log else None
         lines = list(self.read_lines(filename))
-        for user_id, task_id in tqdm(lines, unit="task", desc="Creating tasks"):
-            task = self.create_task(**self.build_task(user_id, task_id, **kwargs))
+
+        def _create(line):
+            task = self.create_task(**self.build_task(*line, **kwargs))
+            if log:
+                with LOG_LOCK:
+                    print(task["id"], file=log_h, sep="\t", flush=True)
+            return task
+
+        try:
+            for _ in tqdm(self.map(_create, lines), total=len(lines), unit="task", desc="Creating tasks"):
+                pass
+        finally:
             if log:
-                print(task["id"], file=log_h, sep="\t", flush=True)
+                log_h.close()
         print("Uploaded %d tasks successfully." % len(lines), file=sys.stderr)
-        if log:
-            log_h.close()
 
     def build_task(self, user_id, task_id, review=False, manager_comment=None, strict=False, **kwargs):
         del kwargs
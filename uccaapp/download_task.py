@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from tqdm import tqdm
 
@@ -13,21 +16,93 @@ from uccaapp.api import ServerAccessor
 desc = """Download task from UCCA-App and convert to a passage in standard format"""
 
 
+def convert_task(task, normalize=False, by_external_id=False, strict=False, validate=False):
+    """
+    Convert a downloaded user task to a passage. Does not access the server, so that it may run in another process.
+    :param task: user task JSON dict
+    :param normalize: whether to normalize the passage
+    :param by_external_id: whether to set the passage ID by the external ID
+    :param strict: whether to raise ValueError on failure to read or normalize the task
+    :param validate: whether to validate the passage
+    :return: tuple of (task, passage or None on failure, failure messages, validation errors)
+    """
+    passage = None
+    failures = []
+    errors = []
+    try:
+        passage = next(iter(from_json(task, by_external_id=by_external_id)))
+    except ValueError as e:
+        if strict:
+            raise ValueError("Failed reading json for task %s:\n%s" % (task["id"], json.dumps(task))) from e
+        failures.append("Failed reading json")
+    if normalize and passage is not None:
+        try:
+            normalization.normalize(passage)
+        except AssertionError as e:
+            if strict:
+                raise ValueError("Failed normalizing task %s:\n%s" % (task["id"], json.dumps(task))) from e
+            failures.append("Failed normalizing task: %s" % e)
+    if validate and passage is not None:
+        errors = list(validation.validate(passage, linkage=False))
+    return task, passage, failures, errors
+
+
+def convert_tasks(tasks, jobs=None, **kwargs):
+    """
+    Convert user tasks to passages, in a pool of processes if jobs is given
+    :param tasks: iterable of user task JSON dicts, consumed lazily
+    :param jobs: number of processes (None or 0 to convert in this process when results are requested)
+    :param kwargs: passed to convert_task
+    :return: generator of convert_task results, in order
+    """
+    if not jobs:
+        for task in tasks:
+            yield convert_task(task, **kwargs)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(convert_task, task, **kwargs))
+            if len(pending) >= 2 * jobs:  # read ahead as long as workers may be idle, but no further
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 class TaskDownloader(ServerAccessor):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-    def download_tasks(self, task_ids, by_filename=False, validate=None, log=None, **kwargs):
+    def download_tasks(self, task_ids, by_filename=False, validate=None, log=None, jobs=None, resume=False,
+                       normalize=False, by_external_id=False, strict=False, write_valid_only=False, **kwargs):
+        """
+        Download tasks and convert them to passages in a pipeline: tasks are fetched ahead by a pool of threads (see
+        ServerAccessor.map), converted, normalized and validated by a pool of processes (if jobs is given), and
+        written by this one, all at the same time
+        :param jobs: number of processes to convert tasks in (None or 0 to convert in this process)
+        :param resume: skip tasks already listed in the log file, and append to it instead of overwriting it
+        :return: generator of (passage, task ID, user ID) tuples, in the order of task_ids
+        """
         if by_filename:
             task_ids_from_file = []
             for filename in task_ids:
                 with open(filename, 'r') as f:
                     task_ids_from_file += list(filter(None, map(str.strip, f)))
             task_ids = task_ids_from_file
+        if resume and log and os.path.exists(log):
+            done = self.read_log(log)
+            print("Skipping %d tasks already downloaded" % sum(1 for task_id in task_ids if str(task_id) in done),
+                  file=sys.stderr)
+            task_ids = [task_id for task_id in task_ids if str(task_id) not in done]
         validate_h = open(validate, "w", encoding="utf-8") if validate else None
-        log_h = open(log, "w", encoding="utf-8") if log else None
-        for task_id in tqdm(task_ids, unit=" tasks", desc="Downloading"):
-            yield self.download_task(task_id, validate=validate_h, log=log_h, **kwargs)
+        log_h = open(log, "a" if resume else "w", encoding="utf-8") if log else None
+        tasks = self.map(self.get_user_task, task_ids)
+        converted = convert_tasks(tasks, jobs=jobs, normalize=normalize, by_external_id=by_external_id, strict=strict,
+                                  validate=bool(validate) or write_valid_only)
+        for task_id, (task, *conversion) in tqdm(zip(task_ids, converted), total=len(task_ids), unit=" tasks",
+                                                 desc="Downloading"):
+            yield self.write_task(task_id, task, *conversion, validate=validate_h, log=log_h,
+                                  write_valid_only=write_valid_only, **kwargs)
         if validate:
             validate_h.close()
         if log:
@@ -37,36 +112,48 @@ class TaskDownloader(ServerAccessor):
                       prefix=None, by_external_id=False, verbose=False, write_valid_only=False, strict=False, **kwargs):
         del kwargs
         task = self.get_user_task(task_id)
+        _, passage, failures, errors = convert_task(task, normalize=normalize, by_external_id=by_external_id,
+                                                    strict=strict, validate=bool(validate) or write_valid_only)
+        return self.write_task(task_id, task, passage, failures, errors, write=write, validate=validate, binary=binary,
+                               log=log, out_dir=out_dir, prefix=prefix, verbose=verbose,
+                               write_valid_only=write_valid_only)
+
+    @staticmethod
+    def write_task(task_id, task, passage, failures, errors, write=True, validate=None, binary=None, log=None,
+                   out_dir=None, prefix=None, verbose=False, write_valid_only=False, **kwargs):
+        """
+        Report and write a converted task
+        :param failures: messages about failure to read or normalize the task, as returned by convert_task
+        :param errors: validation errors, as returned by convert_task
+        :return: tuple of (passage, task ID, user ID)
+        """
+        del kwargs
         user_id = task["user"]["id"]
-        passage = None
-        try:
-            passage = next(iter(from_json(task, by_external_id=by_external_id)))
-        except ValueError as e:
-            if strict:
-                raise ValueError("Failed reading json for task %s:\n%s" % (task_id, json.dumps(task))) from e
-            print("", task_id, user_id, "Failed reading json", file=validate or sys.stderr, sep="\t", flush=True)
-        if normalize and passage is not None:
-            try:
-                normalization.normalize(passage)
-            except AssertionError as e:
-                if strict:
-                    raise ValueError("Failed normalizing task %s:\n%s" % (task_id, json.dumps(task))) from e
-                print(passage.ID, task_id, user_id, "Failed normalizing task: %s" % e, file=validate or sys.stderr,
-                      sep="\t", flush=True)
-        if log:
-            print(passage.ID, task_id, user_id, task["user_comment"], task["created_at"], task["updated_at"],
-                  file=log, sep="\t", flush=True)
+        for failure in failures:
+            print(passage.ID if passage else "", task_id, user_id, failure, file=validate or sys.stderr, sep="\t",
+                  flush=True)
         ret = passage, task_id, user_id
-        if validate or write_valid_only:
-            for error in validation.validate(passage, linkage=False):
-                if validate:
-                    print(passage.ID, task_id, user_id, error, file=validate, sep="\t", flush=True)
-                if write_valid_only:
-                    return ret
-        if write:
+        if passage is None:
+            return ret
+        if validate:
+            for error in errors:
+                print(passage.ID, task_id, user_id, error, file=validate, sep="\t", flush=True)
+        if write and not (write_valid_only and errors):
             write_passage(passage, binary=binary, outdir=out_dir, prefix=prefix, verbose=verbose)
+        if log:  # only once the passage is written, since tasks in the log are skipped by --resume
+            print(passage.ID, task_id, user_id, task["user_comment"], task["created_at"], task["updated_at"],
+                  file=log, sep="\t", flush=True)
         return ret
 
+    @staticmethod
+    def read_log(filename):
+        """
+        :param filename: log file written by download_tasks
+        :return: set of the IDs of the tasks in it
+        """
+        with open(filename, encoding="utf-8") as f:
+            return {fields[1] for fields in (line.rstrip("\n").split("\t") for line in f) if len(fields) > 1}
+
     @staticmethod
     def add_arguments(argparser):
         argparser.add_argument("task_ids", nargs="+", help="IDs of tasks to download and convert")
@@ -77,6 +164,9 @@ class TaskDownloader(ServerAccessor):
         argparser.add_argument("-N", "--normalize", action="store_true", help="normalize downloaded passages")
         argparser.add_argument("--strict", action="store_true", help="fail on reading or normalization error")
         argparser.add_argument("-l", "--log", help="filename to write log of downloaded passages to")
+        argparser.add_argument("--resume", action="store_true", help="skip tasks already in the log file, and "
+                                                                     "append to it")
+        argparser.add_argument("-j", "--jobs", type=int, help="number of processes to convert tasks in parallel")
         ServerAccessor.add_arguments(argparser)
 
     @staticmethod
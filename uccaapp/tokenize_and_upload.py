@@ -1,9 +1,11 @@
 import os.path
 import sys
+import time
 from argparse import ArgumentParser
 
 from ucca.convert import from_text, to_json
 from uccaapp.api import ServerAccessor
+from uccaapp.upload_task import TaskUploader
 
 desc = """
 Read input file as one line per paragraph, where paragraphs are separated by multiple newlines and an optional
@@ -22,34 +24,58 @@ class TokenizerUploader(ServerAccessor):
         self.set_project(project_id)
         self.set_user(user_id)
 
-    def tokenize_and_upload(self, filename, log=None, lang=None, **kwargs):
+    def tokenize_and_upload(self, filename, log=None, lang=None, resume=False, **kwargs):
+        """
+        Upload passages concurrently: up to --workers passages are in flight at a time, each going through the upload
+        steps in order (see upload_passage). Each passage is written to the log as soon as its own upload steps finish
+        (see TaskUploader.upload_tasks).
+        :param resume: skip passages already listed in the log file, and append to it instead of overwriting it
+        """
         del kwargs
-        log_h = open(log, "w", encoding="utf-8") if log else None
+        done = TaskUploader.read_log(log) if resume and log and os.path.exists(log) else set()
+        log_h = open(log, "a" if resume else "w", encoding="utf-8") if log else None
         prefix = os.path.splitext(os.path.basename(filename))[0].replace(" ", "_")
-        with open(filename, encoding="utf-8") as f:
-            for passage, text in from_text(f, passage_id=prefix, lang=lang, return_text=True):
-                passage_out = self.create_passage(text=text, type="PUBLIC", source=self.source)
-                task_in = dict(type="TOKENIZATION", status="SUBMITTED", project=self.project,
-                               user=self.user, passage=passage_out, manager_comment=passage.ID,
-                               user_comment="", parent=None, is_demo=False, is_active=True)
-                tok_task_out = self.create_task(**task_in)
-                tok_user_task_in = dict(tok_task_out)
-                tok_user_task_in.update(to_json(passage, return_dict=True, tok_task=True))
-                self.submit_task(**tok_user_task_in)
-                task_in.update(parent=tok_task_out, type="ANNOTATION")
-                ann_user_task_out = self.create_task(**task_in)
-                print("Uploaded passage " + filename + " successfully.", file=sys.stderr)
-                if log:
-                    print(passage.ID, passage_out["id"], tok_task_out["id"], ann_user_task_out["id"],
-                          file=log_h, sep="\t", flush=True)
+        start = time.time()
+        uploaded = 0
+        try:
+            with open(filename, encoding="utf-8") as f:
+                passages = ((p, text) for p, text in from_text(f, passage_id=prefix, lang=lang, return_text=True)
+                            if p.ID not in done)
+                for _ in self.map(lambda pt: self.upload_passage(*pt, log=log_h), passages):
+                    print("Uploaded passage " + filename + " successfully.", file=sys.stderr)
+                    uploaded += 1
+        finally:
+            if log:
+                log_h.close()
+        TaskUploader.print_throughput(uploaded, time.time() - start, skipped=len(done))
+
+    def upload_passage(self, passage, text, log=None):
+        """
+        Upload a passage and create its tasks, one step after the other (each depends on the previous one)
+        :param log: file to write a line to once the passage is uploaded
+        :return: tuple of (created passage, tokenization task, annotation task)
+        """
+        passage_out = self.create_passage(text=text, type="PUBLIC", source=self.source)
+        task_in = dict(type="TOKENIZATION", status="SUBMITTED", project=self.project,
+                       user=self.user, passage=passage_out, manager_comment=passage.ID,
+                       user_comment="", parent=None, is_demo=False, is_active=True)
+        tok_task_out = self.create_task(**task_in)
+        tok_user_task_in = dict(tok_task_out)
+        tok_user_task_in.update(to_json(passage, return_dict=True, tok_task=True))
+        self.submit_task(**tok_user_task_in)
+        task_in.update(parent=tok_task_out, type="ANNOTATION")
+        ann_user_task_out = self.create_task(**task_in)
         if log:
-            log_h.close()
+            TaskUploader.write_log(passage, passage_out, tok_task_out, ann_user_task_out, log=log)
+        return passage_out, tok_task_out, ann_user_task_out
 
     @staticmethod
     def add_arguments(argparser):
         argparser.add_argument("filename", help="text file with one line paragraph, where paragraphs are separated "
                                                 "by multiple newlines and an optional <DELIMITER>")
         argparser.add_argument("-l", "--log", help="filename to write log of uploaded passages to")
+        argparser.add_argument("--resume", action="store_true", help="skip passages already in the log file, and "
+                                                                     "append to it")
         argparser.add_argument("--lang", choices=["ru", "en", "fr", "de"], default="ru",
                                help="language two-letter code, for tokenizer")
         ServerAccessor.add_project_id_argument(argparser)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import argparse
 import logging
+import os
 import sys
+import threading
+import time
 
 from requests.exceptions import HTTPError
 import json
@@ -10,6 +13,8 @@ from ucca.convert import to_json, to_text
 from ucca.ioutil import get_passages_with_progress_bar
 from uccaapp.api import ServerAccessor
 
+LOG_LOCK = threading.Lock()  # log lines are written by the threads uploading passages
+
 try:
     from simplejson.scanner import JSONDecodeError
 except ImportError:
@@ -35,9 +40,20 @@ class TaskUploader(ServerAccessor):
         self.set_project(project_id)
         self.set_user(user_id)
         
-    def upload_tasks(self, filenames, log=None, submit=True, existing_ids=None, **kwargs):
+    def upload_tasks(self, filenames, log=None, submit=True, existing_ids=None, upload=True, resume=False, **kwargs):
+        """
+        Upload passages concurrently: up to --workers passages are in flight at a time, each going through the upload
+        steps in order (see upload_task). Each passage is written to the log as soon as its own upload steps finish,
+        even if another one fails first, so that exactly the uploaded passages are skipped by --resume.
+        :param upload: whether to upload anything, otherwise only convert the passages, and write no log
+        :param resume: skip passages already listed in the log file, and append to it instead of overwriting it
+        :return: generator of submitted annotation tasks, in the order of the passages
+        """
         del kwargs
-        log_h = open(log, "w", encoding="utf-8") if log else None
+        if not upload:  # nothing is created, so there are no IDs to log
+            log = None
+        done = self.read_log(log) if resume and log and os.path.exists(log) else set()
+        log_h = open(log, "a" if resume else "w", encoding="utf-8") if log else None
         if existing_ids:
             with open(existing_ids, "r", encoding="utf-8") as ids_h:
                 ids = {old_passage_id: (passage_id, tok_id, ann_id)
@@ -45,22 +61,43 @@ class TaskUploader(ServerAccessor):
                        in map(str.split, ids_h)}
         else:
             ids = None
+        passages = (p for p in get_passages_with_progress_bar(filenames, desc="Uploading") if p.ID not in done)
+        start = time.time()
+        uploaded = 0
+        def _upload(passage):
+            outputs = self.upload_steps(passage, submit=submit, ids=ids, upload=upload)
+            if log:
+                self.write_log(passage, *outputs, log=log_h)
+            return outputs[-1]
+
         try:
-            for passage in get_passages_with_progress_bar(filenames, desc="Uploading"):
-                logging.debug("Uploading passage %s" % passage.ID)
-                task = self.upload_task(passage, log=log_h, submit=submit, ids=ids)
-                logging.debug("Submitted task %d" % task["id"])
+            for task in self.map(_upload, passages):
+                if upload:
+                    logging.debug("Submitted task %d" % task["id"])
+                uploaded += 1
                 yield task
         except HTTPError as e:
             try:
                 raise ValueError((e.response.json() if e.response else json.loads(e.args[0]))["detail"]) from e
             except JSONDecodeError:
                 raise ValueError(e.response.text) from e
-            finally:
-                if log:
-                    log_h.close()
+        finally:
+            if log:
+                log_h.close()
+            self.print_throughput(uploaded, time.time() - start, skipped=len(done))
 
     def upload_task(self, passage, log=None, submit=True, ids=None, upload=True):
+        *outputs, ann_user_task_out = self.upload_steps(passage, submit=submit, ids=ids, upload=upload)
+        if log and upload:
+            self.write_log(passage, *outputs, ann_user_task_out, log=log)
+        return ann_user_task_out
+
+    def upload_steps(self, passage, submit=True, ids=None, upload=True):
+        """
+        Upload a passage and create its tasks, one step after the other (each depends on the previous one)
+        :return: tuple of (created passage, tokenization task, submitted annotation task)
+        """
+        logging.debug("Uploading passage %s" % passage.ID)
         if ids:
             passage_id, tok_id, ann_id = ids[passage.ID]
             passage_out = self.get_passage(passage_id)
@@ -72,24 +109,45 @@ class TaskUploader(ServerAccessor):
             task_in = dict(type="TOKENIZATION", status="ONGOING", project=self.project, user=self.user,
                            passage=passage_out, manager_comment=passage.ID, user_comment=passage.ID, parent=None,
                            is_demo=False, is_active=True)
-            tok_task_out = self.create_task(**task_in) if upload else task_in
+            tok_task_out = self.create_task(**task_in) if upload else dict(task_in)
             tok_user_task_in = dict(tok_task_out)
             tok_user_task_in.update(to_json(passage, return_dict=True, tok_task=True))
             tok_user_task_out = self.submit_task(**tok_user_task_in) if upload else tok_user_task_in
             task_in.update(parent=tok_task_out, type="ANNOTATION")
             ann_user_task_in = self.create_task(**task_in) if upload else task_in
-        ann_user_task_in.update(
-            to_json(passage, return_dict=True, tok_task=tok_user_task_out, all_categories=self.layer["categories"]))
+        if upload or ids:  # the annotation refers to the tokens by the IDs the server gave them
+            ann_user_task_in.update(
+                to_json(passage, return_dict=True, tok_task=tok_user_task_out, all_categories=self.layer["categories"]))
         ann_user_task_out = self.submit_task(**ann_user_task_in, submit=submit) if upload else ann_user_task_in
-        if log:
-            print(passage.ID, passage_out["id"], tok_task_out["id"], ann_user_task_out["id"],
-                  file=log, sep="\t", flush=True)
-        return ann_user_task_out
+        return passage_out, tok_task_out, ann_user_task_out
+
+    @staticmethod
+    def write_log(passage, passage_out, tok_task_out, ann_user_task_out, log):
+        with LOG_LOCK:
+            print(passage.ID, passage_out["id"], tok_task_out["id"], ann_user_task_out["id"], file=log, sep="\t",
+                  flush=True)
+
+    @staticmethod
+    def print_throughput(uploaded, elapsed, skipped=0):
+        print("Uploaded %d passages in %.1fs (%.2f passages/s)%s" % (
+            uploaded, elapsed, uploaded / elapsed if elapsed else 0,
+            ", skipped %d already uploaded" % skipped if skipped else ""), file=sys.stderr)
+
+    @staticmethod
+    def read_log(filename):
+        """
+        :param filename: log file written by upload_tasks
+        :return: set of the IDs of the passages in it
+        """
+        with open(filename, encoding="utf-8") as f:
+            return {fields[0] for fields in map(str.split, f) if fields}
 
     @staticmethod
     def add_arguments(argparser):
         argparser.add_argument("filenames", nargs="+", help="passage file names to convert and upload")
         argparser.add_argument("-l", "--log", help="filename to write log of uploaded passages to")
+        argparser.add_argument("--resume", action="store_true", help="skip passages already in the log file, and "
+                                                                     "append to it")
         argparser.add_argument("--no-submit", action="store_false", dest="submit", help="do not submit annotation task")
         argparser.add_argument("--existing-ids", help="use existing task IDs from file (output of --log); no creation")
         argparser.add_argument("-n", "--no-upload", action="store_false", dest="upload", help="do not upload anything")